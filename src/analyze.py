@@ -0,0 +1,345 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import search
+from bitboard import Position
+from geometry import WIDTH, MIRROR_COLUMNS
+from stats import SearchStats
+from transposition import TranspositionTable
+
+# Transposition table of an analysis process, set by _init_worker
+_worker = {}
+# Fields of a result that a duplicate position copies from the first one
+ANALYSIS_FIELDS = ("move", "score", "depth", "nodes")
+
+
+def parse_record(line):
+    """Reads one position from a line of input
+
+    A line is either a JSON object with the moves in "moves" and any other
+    fields to copy to the result, or a bare move string. Moves are the
+    columns 0-6 played from the empty board, as a string or a list.
+
+    Args:
+        line (str): line without the line break
+
+    Returns:
+        dict: the record, its moves as a string under "moves"
+    """
+    if line.startswith("{"):
+        record = json.loads(line)
+        moves = record.get("moves", "")
+        if not isinstance(moves, str):
+            moves = "".join(str(col) for col in moves)
+        record["moves"] = moves
+        return record
+    return {"moves": line.strip()}
+
+
+def read_records(file, offset=0):
+    """Streams the positions of an input file
+
+    Args:
+        file: input file opened in binary mode
+        offset (int): byte offset to start reading from
+
+    Yields:
+        tuple: byte offset after the line and the record, records of blank lines are skipped
+    """
+    file.seek(offset)
+    for line in file:
+        offset += len(line)
+        text = line.decode("utf-8").strip()
+        if text:
+            yield offset, parse_record(text)
+
+
+def position_from_moves(moves):
+    """Plays a move string from the empty board, checking that every move is legal
+
+    Args:
+        moves (str): columns 0-6 played from the empty board
+
+    Returns:
+        Position: the position after the moves
+    """
+    position = Position()
+    for char in moves:
+        if not char.isdigit() or not 0 <= int(char) < WIDTH:
+            raise ValueError(f"invalid column {char!r}")
+        col = int(char)
+        if not position.can_play(col):
+            raise ValueError(f"column {col} is full")
+        if position.is_winning_move(col):
+            raise ValueError("the game is over before the last move")
+        position.play(col)
+    return position
+
+
+def _init_worker(table_mb):
+    """Creates the transposition table of an analysis process
+
+    Args:
+        table_mb (float): memory budget of the table
+    """
+    _worker["table"] = TranspositionTable(table_mb)
+
+
+def analyze_record(record, depth=None, max_nodes=search.INF):
+    """Searches one position
+
+    The table of the process is cleared before every position, so results
+    do not depend on which process analysed which positions before.
+
+    Args:
+        record (dict): record from parse_record
+        depth (int): depth of the last iteration, None for no limit
+        max_nodes (int): node budget of the search
+
+    Returns:
+        dict: the record with the best column, its score from the view of the
+            player to move, the completed depth and the searched nodes, or with
+            an error message if the moves are not a legal unfinished game
+    """
+    result = dict(record)
+    try:
+        position = position_from_moves(record["moves"])
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    if "table" not in _worker:
+        _init_worker(4)
+    table = _worker["table"]
+    table.clear()
+    stats = SearchStats()
+    column, completed, score = search.deepen(position, -search.INF, search.INF, True, table,
+                                             search.INF, max_depth=depth, stats=stats,
+                                             max_nodes=max_nodes)
+    result.update({"move": column, "score": score, "depth": completed, "nodes": stats.nodes})
+    return result
+
+
+class _Ready:
+    """Result of a record analysed in the calling process, read like an AsyncResult"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        """Returns the result"""
+        return self.value
+
+
+def _canonical_key(record):
+    """Finds the key shared by the position of a record and its mirror image
+
+    Args:
+        record (dict): record from parse_record
+
+    Returns:
+        tuple: canonical key and True if the position is the mirrored one,
+            None and False if the moves are not a legal unfinished game
+    """
+    try:
+        return position_from_moves(record["moves"]).canonical_key()
+    except ValueError:
+        return None, False
+
+
+def _copy_result(record, analysed, mirrored):
+    """Builds the result of a record from the analysis of the same position
+
+    Args:
+        record (dict): record of the duplicate position
+        analysed (dict): result of the first record of the position
+        mirrored (bool): True if the duplicate is the mirror image of that position
+
+    Returns:
+        dict: the record with the analysis fields of the first result
+    """
+    result = dict(record)
+    for field in ANALYSIS_FIELDS:
+        if field in analysed:
+            result[field] = analysed[field]
+    if mirrored and result.get("move") is not None:
+        result["move"] = MIRROR_COLUMNS[result["move"]]
+    return result
+
+
+def analyze_stream(items, depth=None, max_nodes=search.INF, workers=1, window=None,
+                   table_mb=4, cache_size=100000):
+    """Analyses a stream of records in a pool of processes
+
+    At most `window` records are in flight at a time, so memory does not
+    grow with the input. Results come out in the order of the input.
+    Positions are searched once per position and its mirror image: a
+    repeated or mirrored position among the last `cache_size` distinct ones
+    copies the result of the first, with the move mirrored if needed.
+
+    Args:
+        items (iterable): pairs of a value passed through untouched and a record
+        depth (int): depth of the last iteration, None for no limit
+        max_nodes (int): node budget of every search
+        workers (int): number of processes
+        window (int): maximum number of records being analysed, 4 per process if not given
+        table_mb (float): memory budget of the table of every process
+        cache_size (int): number of distinct positions remembered for deduplication
+
+    Yields:
+        tuple: the passed through value and the result of analyze_record
+    """
+    pool = None
+    if workers <= 1:
+        _init_worker(table_mb)
+        window = 1
+    else:
+        window = window or 4 * workers
+        pool = multiprocessing.Pool(workers, _init_worker, (table_mb,))
+    analysed = collections.OrderedDict()
+    pending = collections.deque()
+    try:
+        for key, record in items:
+            canonical, mirrored = _canonical_key(record)
+            first = analysed.get(canonical) if canonical is not None else None
+            if first is not None:
+                analysed.move_to_end(canonical)
+                pending.append((key, record, first[0], first[1] != mirrored))
+            else:
+                if pool is None:
+                    result = _Ready(analyze_record(record, depth, max_nodes))
+                else:
+                    result = pool.apply_async(analyze_record, (record, depth, max_nodes))
+                pending.append((key, None, result, False))
+                if canonical is not None:
+                    analysed[canonical] = (result, mirrored)
+                    if len(analysed) > cache_size:
+                        analysed.popitem(last=False)
+            while len(pending) >= window:
+                yield _finish(pending.popleft())
+        while pending:
+            yield _finish(pending.popleft())
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def _finish(item):
+    """Waits for the result of a pending record
+
+    Args:
+        item (tuple): passed through value, the record if it is a duplicate,
+            the result of the first record of the position and whether the
+            duplicate is mirrored
+
+    Returns:
+        tuple: the passed through value and the result
+    """
+    key, duplicate, result, mirrored = item
+    if duplicate is None:
+        return key, result.get()
+    return key, _copy_result(duplicate, result.get(), mirrored)
+
+
+def load_checkpoint(path):
+    """Reads the offsets where an interrupted analysis continues
+
+    Args:
+        path (str): checkpoint file
+
+    Returns:
+        dict: input and output byte offsets and the number of results written
+    """
+    if path is None or not os.path.exists(path):
+        return {"input": 0, "output": 0, "count": 0}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_checkpoint(path, checkpoint):
+    """Replaces the checkpoint file atomically
+
+    Args:
+        path (str): checkpoint file
+        checkpoint (dict): offsets to store
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def run_analysis(input_path, output_path, depth=None, max_nodes=search.INF, workers=1,
+                 checkpoint_path=None, checkpoint_every=100, table_mb=4):
+    """Analyses every position of a file into a JSON lines file
+
+    With a checkpoint file the analysis can be interrupted and started
+    again: it continues from the stored input offset and drops results
+    written after the last checkpoint. An output file that is missing or
+    shorter than the checkpoint is refused with a ValueError.
+
+    Args:
+        input_path (str): file of JSON lines or move strings
+        output_path (str): file the results are written to, one JSON object per line
+        depth (int): depth of the last iteration, None for no limit
+        max_nodes (int): node budget of every search
+        workers (int): number of processes
+        checkpoint_path (str): checkpoint file, None to always start from the beginning
+        checkpoint_every (int): results written between checkpoints
+        table_mb (float): memory budget of the table of every process, it is
+            cleared for every position so small tables are faster
+
+    Returns:
+        int: total number of results in the output file
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    mode = "wb"
+    if checkpoint["output"]:
+        size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if size < checkpoint["output"]:
+            # Truncating to the offset would pad the missing results with zero bytes
+            raise ValueError(f"{output_path} has {size} bytes, fewer than the "
+                             f"{checkpoint['output']} of checkpoint {checkpoint_path}")
+        mode = "r+b"
+    with open(input_path, "rb") as source, open(output_path, mode) as output:
+        output.seek(checkpoint["output"])
+        output.truncate()
+        count = checkpoint["count"]
+        records = read_records(source, checkpoint["input"])
+        for offset, result in analyze_stream(records, depth, max_nodes, workers,
+                                             table_mb=table_mb):
+            output.write(json.dumps(result).encode("utf-8") + b"\n")
+            count += 1
+            if checkpoint_path is not None and count % checkpoint_every == 0:
+                output.flush()
+                os.fsync(output.fileno())
+                save_checkpoint(checkpoint_path, {"input": offset, "output": output.tell(),
+                                                  "count": count})
+        output.flush()
+        if checkpoint_path is not None:
+            os.fsync(output.fileno())
+            save_checkpoint(checkpoint_path, {"input": source.tell(), "output": output.tell(),
+                                              "count": count})
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse the positions of a file")
+    parser.add_argument("input", help="JSON lines with a moves field or one move string per line")
+    parser.add_argument("output", help="file for the results as JSON lines")
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--nodes", type=int, help="node budget instead of a fixed depth")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--checkpoint", help="checkpoint file for resuming the analysis")
+    parser.add_argument("--table-mb", type=float, default=4)
+    arguments = parser.parse_args()
+    if arguments.nodes is not None:
+        search_depth, node_budget = None, arguments.nodes
+    else:
+        search_depth, node_budget = arguments.depth, search.INF
+    total = run_analysis(arguments.input, arguments.output, search_depth, node_budget,
+                         arguments.workers, arguments.checkpoint, table_mb=arguments.table_mb)
+    print(f"{total} positions analysed into {arguments.output}")
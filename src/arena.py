@@ -0,0 +1,342 @@
+import argparse
+import importlib.util
+import math
+import multiprocessing
+import os
+import random
+import time
+import search
+from bitboard import Position
+from book import load_book
+from engine import Engine
+from mcts import MctsEngine
+from solver import SOLVER_EMPTY_CELLS
+
+# Opening book of an arena process, loaded on first use
+_process_book = {}
+
+# Random games tried for every opening before random_openings gives up
+OPENING_ATTEMPTS = 1000
+
+
+class EngineConfig:
+    """Settings of one engine in the arena
+
+    An engine searches either to a fixed depth or until its time limit. The
+    evaluation is "incremental" for the running scores of the position or
+    "batch" for the NumPy evaluator. The book and the endgame solver can be
+    switched off to measure what they are worth. The "mcts" algorithm always
+    searches until the time limit and only uses the time limit.
+    """
+
+    def __init__(self, name, depth=None, time_limit=1.0, evaluation="incremental", book=True,
+                 solver_threshold=SOLVER_EMPTY_CELLS, table_mb=16, algorithm="alphabeta"):
+        """
+        Args:
+            name (str): name shown in the results
+            depth (int): fixed search depth, None to search until the time limit
+            time_limit (float): seconds per move when no depth is given
+            evaluation (str): "incremental" or "batch"
+            book (bool): True to play book moves
+            solver_threshold (int): largest number of empty cells solved exactly, 0 to not solve
+            table_mb (float): memory budget of the transposition table
+            algorithm (str): "alphabeta" for Engine or "mcts" for MctsEngine
+        """
+        if evaluation not in ("incremental", "batch"):
+            raise ValueError(f"unknown evaluation {evaluation}")
+        if evaluation == "batch" and importlib.util.find_spec("numpy") is None:
+            raise ValueError("evaluation=batch needs NumPy, install it with "
+                             "'poetry install --extras batch' or 'pip install numpy'")
+        if algorithm not in ("alphabeta", "mcts"):
+            raise ValueError(f"unknown algorithm {algorithm}")
+        self.algorithm = algorithm
+        self.name = name
+        self.depth = depth
+        self.time_limit = time_limit
+        self.evaluation = evaluation
+        self.book = book
+        self.solver_threshold = solver_threshold
+        self.table_mb = table_mb
+
+    @classmethod
+    def parse(cls, name, text):
+        """Creates a configuration from a "key=value,key=value" string
+
+        Args:
+            name (str): name of the engine
+            text (str): settings, for example "depth=6,book=0"
+
+        Returns:
+            EngineConfig: the configuration
+        """
+        types = {"depth": int, "time_limit": float, "evaluation": str,
+                 "book": lambda value: value not in ("0", "false", "no"),
+                 "solver_threshold": int, "table_mb": float, "algorithm": str}
+        settings = {}
+        for item in filter(None, text.split(",")):
+            key, value = item.split("=", 1)
+            key = key.strip().replace("-", "_")
+            if key not in types:
+                raise ValueError(f"unknown engine setting {key}")
+            settings[key] = types[key](value.strip())
+        return cls(name, **settings)
+
+    def create_engine(self, book=None):
+        """Creates the engine that plays one game with these settings
+
+        Args:
+            book (OpeningBook): opening book used if the engine plays book moves
+
+        Returns:
+            Engine: engine keeping its transposition table or search tree from move to move
+        """
+        if self.algorithm == "mcts":
+            return MctsEngine()
+        return Engine(self.table_mb, book if self.book else None, self.solver_threshold)
+
+    def choose_move(self, engine, position):
+        """Searches the move of the engine
+
+        Args:
+            engine (Engine): engine from create_engine
+            position (Position): position where the engine is to move
+
+        Returns:
+            int: column to play
+        """
+        if self.depth is None or self.algorithm == "mcts":
+            time_limit = self.time_limit
+        else:
+            time_limit = search.INF
+        return engine.choose_move(position, time_limit, max_depth=self.depth,
+                                  batch_leaves=self.evaluation == "batch")
+
+
+def random_openings(count, plies, seed=1):
+    """Plays random openings that do not give away an immediate win
+
+    Random games that run out of safe moves are dropped, and a ValueError is
+    raised if OPENING_ATTEMPTS games per opening do not reach the length.
+
+    Args:
+        count (int): number of openings
+        plies (int): number of moves in every opening
+        seed (int): seed of the random moves
+
+    Returns:
+        list: openings as lists of columns
+    """
+    if not 0 <= plies <= Position().rules.cells:
+        raise ValueError(f"an opening cannot have {plies} moves")
+    rng = random.Random(seed)
+    openings = []
+    for _ in range(OPENING_ATTEMPTS * count):
+        if len(openings) == count:
+            break
+        position = Position()
+        opening = []
+        while len(opening) < plies:
+            safe = []
+            for col in position.valid_moves():
+                if position.is_winning_move(col):
+                    continue
+                position.play(col)
+                if not any(position.is_winning_move(reply) for reply in position.valid_moves()):
+                    safe.append(col)
+                position.undo(col)
+            if not safe:
+                break
+            col = rng.choice(safe)
+            position.play(col)
+            opening.append(col)
+        if len(opening) == plies:
+            openings.append(opening)
+    if len(openings) < count:
+        raise ValueError(f"found {len(openings)} of {count} openings of {plies} moves")
+    return openings
+
+
+def book_openings(count, plies, seed=1):
+    """Picks openings among the distinct positions of the opening book
+
+    Args:
+        count (int): number of openings, all positions if there are fewer
+        plies (int): number of moves in every opening
+        seed (int): seed of the random choice
+
+    Returns:
+        list: openings as lists of columns
+    """
+    layer = {0: []}
+    for _ in range(plies):
+        next_layer = {}
+        for opening in layer.values():
+            position = Position.from_moves(opening)
+            for col in position.valid_moves():
+                if position.is_winning_move(col):
+                    continue
+                position.play(col)
+                next_layer.setdefault(position.key(), opening + [col])
+                position.undo(col)
+        layer = next_layer
+    openings = [layer[key] for key in sorted(layer)]
+    random.Random(seed).shuffle(openings)
+    return openings[:count]
+
+
+def _book():
+    """Loads the opening book once per process"""
+    if "book" not in _process_book:
+        _process_book["book"] = load_book()
+    return _process_book["book"]
+
+
+def play_game(task):
+    """Plays one game between two engines from an opening
+
+    Args:
+        task (tuple): engine moving first, engine moving second, the opening
+            moves and optionally the side the engine the results are
+            counted for plays, 0 if it moves first (the default) and 1 if second
+
+    Returns:
+        dict: winner (0 for the first engine, 1 for the second, None for a draw),
+            the moves of the game, the seconds every move took by engine and
+            the side of the counted engine copied from the task
+    """
+    engines, opening = task[:2], task[2]
+    counted_side = task[3] if len(task) > 3 else 0
+    position = Position.from_moves(opening)
+    moves = list(opening)
+    latencies = ([], [])
+    book = _book() if any(engine.book for engine in engines) else None
+    players = [engine.create_engine(book) for engine in engines]
+    while not position.is_draw():
+        side = position.moves & 1
+        start = time.perf_counter()
+        col = engines[side].choose_move(players[side], position)
+        latencies[side].append(time.perf_counter() - start)
+        moves.append(col)
+        if position.is_winning_move(col):
+            position.play(col)
+            return {"winner": side, "moves": moves, "latencies": latencies,
+                    "side": counted_side}
+        position.play(col)
+    return {"winner": None, "moves": moves, "latencies": latencies, "side": counted_side}
+
+
+def elo_difference(score):
+    """Converts a score share into an Elo difference
+
+    Args:
+        score (float): share of the points, 0.5 for even engines
+
+    Returns:
+        float: Elo difference, infinite for a score of 0 or 1
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(first, second, results, seconds):
+    """Counts the results of the games from the view of the first engine
+
+    Args:
+        first (EngineConfig): engine the results are counted for
+        second (EngineConfig): its opponent
+        results (list): results of play_game, each with the side the first engine played
+        seconds (float): wall time of the whole match
+
+    Returns:
+        dict: wins, draws, losses, score, Elo difference with its 95 % confidence
+            interval, average move latency of both engines by role ("first"
+            and "second"), their names by role and games per hour
+    """
+    wins = draws = losses = 0
+    points = []
+    # Keyed by role, so engines with the same name keep their own latencies
+    latencies = {"first": [], "second": []}
+    for result in results:
+        own_side = result["side"]
+        latencies["first"].extend(result["latencies"][own_side])
+        latencies["second"].extend(result["latencies"][1 - own_side])
+        if result["winner"] is None:
+            draws += 1
+            points.append(0.5)
+        elif result["winner"] == own_side:
+            wins += 1
+            points.append(1.0)
+        else:
+            losses += 1
+            points.append(0.0)
+    games = len(points)
+    score = sum(points) / games if games else 0.5
+    variance = sum((point - score) ** 2 for point in points) / games if games else 0.0
+    margin = 1.96 * math.sqrt(variance / games) if games else 0.0
+    return {
+        "games": games,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "score": score,
+        "elo": elo_difference(score),
+        "elo_low": elo_difference(score - margin),
+        "elo_high": elo_difference(score + margin),
+        "latency": {role: sum(values) / len(values) if values else 0.0
+                    for role, values in latencies.items()},
+        "names": {"first": first.name, "second": second.name},
+        "games_per_hour": games * 3600 / seconds if seconds else 0.0,
+    }
+
+
+def run_match(first, second, openings, workers=1):
+    """Plays every opening twice so that both engines move first once
+
+    Args:
+        first (EngineConfig): engine the results are counted for
+        second (EngineConfig): its opponent
+        openings (list): opening move lists
+        workers (int): number of processes playing games
+
+    Returns:
+        dict: summary of the match, see summarize
+    """
+    tasks = []
+    for opening in openings:
+        tasks.append((first, second, opening, 0))
+        tasks.append((second, first, opening, 1))
+    start = time.perf_counter()
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            games = pool.map(play_game, tasks, chunksize=1)
+    else:
+        games = [play_game(task) for task in tasks]
+    seconds = time.perf_counter() - start
+    return summarize(first, second, games, seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play engine against engine")
+    parser.add_argument("--first", default="", help='settings such as "depth=6,book=0"')
+    parser.add_argument("--second", default="")
+    parser.add_argument("--games", type=int, default=100, help="games, two per opening")
+    parser.add_argument("--openings", choices=["random", "book"], default="random")
+    parser.add_argument("--opening-plies", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    arguments = parser.parse_args()
+    first_engine = EngineConfig.parse("first", arguments.first)
+    second_engine = EngineConfig.parse("second", arguments.second)
+    make_openings = random_openings if arguments.openings == "random" else book_openings
+    match_openings = make_openings(max(arguments.games // 2, 1), arguments.opening_plies,
+                                   arguments.seed)
+    summary = run_match(first_engine, second_engine, match_openings, arguments.workers)
+    print(f"{summary['games']} games: +{summary['wins']} ={summary['draws']} "
+          f"-{summary['losses']}, score {summary['score']:.3f}")
+    print(f"Elo {summary['elo']:+.1f} ({summary['elo_low']:+.1f} .. {summary['elo_high']:+.1f})")
+    for role, latency in summary["latency"].items():
+        print(f"{summary['names'][role]}: {latency * 1000:.1f} ms per move")
+    print(f"{summary['games_per_hour']:.0f} games per hour")
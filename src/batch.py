@@ -0,0 +1,71 @@
+from geometry import WIDTH, HEIGHT, H1, WINDOW_BITS
+from evaluation import WINDOW_SCORES
+
+NUMPY_MISSING = ("batched evaluation needs NumPy, install it with "
+                 "'poetry install --extras batch' or 'pip install numpy'")
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError(NUMPY_MISSING) from error
+
+
+def _flat_index(bit):
+    """Converts a bit index into an index of a flattened 6x7 board"""
+    column, height = divmod(bit, H1)
+    return (HEIGHT - 1 - height) * WIDTH + column
+
+
+# Flattened board indexes of the four cells of every window, shape (69, 4)
+WINDOW_INDEX = np.array([[_flat_index(bit) for bit in bits] for bits in WINDOW_BITS],
+                        dtype=np.intp)
+# Bit index of every cell of a flattened board
+CELL_BITS = np.array([(col * H1 + HEIGHT - 1 - row) for row in range(HEIGHT)
+                      for col in range(WIDTH)], dtype=np.uint64)
+# Window score by code own * 5 + opponent
+CODE_SCORES = np.array([WINDOW_SCORES[own][opponent] for own in range(5)
+                        for opponent in range(5)], dtype=np.int64)
+
+
+def boards_to_array(boards):
+    """Converts list boards into an array
+
+    Args:
+        boards (list): game boards as 2D-lists
+
+    Returns:
+        numpy.ndarray: int8 array of shape (N, 6, 7)
+    """
+    return np.asarray(boards, dtype=np.int8).reshape(-1, HEIGHT, WIDTH)
+
+
+def bitboards_to_array(own, opponent):
+    """Converts bitboards into an array of boards with own pieces as 1 and opponent pieces as 2
+
+    Args:
+        own (list): bitboards of the evaluated player's pieces
+        opponent (list): bitboards of the opponent's pieces
+
+    Returns:
+        numpy.ndarray: int8 array of shape (N, 6, 7)
+    """
+    own_cells = (np.array(own, dtype=np.uint64)[:, None] >> CELL_BITS) & np.uint64(1)
+    opponent_cells = (np.array(opponent, dtype=np.uint64)[:, None] >> CELL_BITS) & np.uint64(1)
+    cells = own_cells + 2 * opponent_cells
+    return cells.astype(np.int8).reshape(-1, HEIGHT, WIDTH)
+
+
+def evaluate_batch(boards, piece, opponent_piece):
+    """Evaluates many boards at once with the same weights as evaluate_position
+
+    Args:
+        boards (numpy.ndarray): int8 array of shape (N, 6, 7)
+        piece (int): piece which is evaluated
+        opponent_piece (int): piece of the opponent
+
+    Returns:
+        numpy.ndarray: score of every board, shape (N,)
+    """
+    cells = boards.reshape(len(boards), HEIGHT * WIDTH)
+    cell_codes = (5 * (cells == piece) + (cells == opponent_piece)).astype(np.int8)
+    codes = cell_codes[:, WINDOW_INDEX].sum(axis=2, dtype=np.int8)
+    return CODE_SCORES[codes].sum(axis=1)
@@ -0,0 +1,291 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+from bitboard import Position
+from stats import SearchStats
+from transposition import TranspositionTable
+import search
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks")
+POSITIONS_PATH = os.path.join(BENCHMARK_DIR, "positions.json")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+
+def count_collections(function):
+    """Runs a function with the garbage collector triggering on every new container
+
+    The generation 0 threshold is set to 1, so a collection starts whenever
+    more than one new container object (list, tuple, Position, ...) is
+    alive since the previous collection. The number of collections is a
+    lower bound for the number of container allocations.
+
+    Args:
+        function (callable): function to run without arguments
+
+    Returns:
+        tuple: return value of the function and the number of collections
+    """
+    collections = 0
+
+    def on_collect(phase, info):
+        nonlocal collections
+        if phase == "start" and info["generation"] == 0:
+            collections += 1
+
+    old_threshold = gc.get_threshold()
+    gc.collect()
+    gc.callbacks.append(on_collect)
+    gc.set_threshold(1, old_threshold[1], old_threshold[2])
+    try:
+        result = function()
+    finally:
+        gc.set_threshold(*old_threshold)
+        gc.callbacks.remove(on_collect)
+    return result, collections
+
+
+def allocation_benchmark(moves, depth):
+    """Measures time and container allocations per searched node
+
+    Args:
+        moves (list): columns played from the empty board to reach the position
+        depth (int): search depth
+
+    Returns:
+        dict: nodes searched, seconds used and collections per node
+    """
+    position = Position.from_moves(moves)
+    table = TranspositionTable()
+    searcher = search.Search(table)
+    start = time.perf_counter()
+    _, collections = count_collections(
+        lambda: searcher.minimax(position, depth, -search.INF, search.INF, True, 0))
+    seconds = time.perf_counter() - start
+    return {
+        "nodes": searcher.nodes,
+        "seconds": round(seconds, 3),
+        "collections_per_node": collections / max(searcher.nodes, 1),
+    }
+
+
+def batch_benchmark(count, seed=1):
+    """Compares evaluate_position in a loop against one evaluate_batch call
+
+    Args:
+        count (int): number of random boards to score
+        seed (int): seed for generating the boards
+
+    Returns:
+        dict: boards per second for both evaluators
+    """
+    # Imported here so that the other benchmarks run without NumPy
+    import batch  # pylint: disable=import-outside-toplevel
+    from game import evaluate_position  # pylint: disable=import-outside-toplevel
+
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        position = Position()
+        for _ in range(rng.randint(0, 30)):
+            columns = [col for col in position.valid_moves() if not position.is_winning_move(col)]
+            if not columns:
+                break
+            position.play(rng.choice(columns))
+        boards.append(position.to_board(1, 2))
+
+    start = time.perf_counter()
+    for board in boards:
+        evaluate_position(board, 2, 1, 2)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    array = batch.boards_to_array(boards)
+    convert_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    batch.evaluate_batch(array, 2, 1)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "loop_boards_per_second": round(count / loop_seconds),
+        "batch_boards_per_second": round(count / batch_seconds),
+        "list_conversion_seconds": round(convert_seconds, 3),
+    }
+
+
+def parallel_benchmark(moves, depth, worker_counts=(1, 2, 4, 8)):
+    """Measures the time parallel search takes to complete a fixed depth
+
+    Args:
+        moves (list): columns played from the empty board to reach the position
+        depth (int): depth of the last iteration
+        worker_counts (tuple): numbers of processes to measure
+
+    Returns:
+        dict: seconds and speedup over one process by number of processes
+    """
+    from parallel import ParallelSearch  # pylint: disable=import-outside-toplevel
+
+    position = Position.from_moves(moves)
+    results = {}
+    for workers in worker_counts:
+        with ParallelSearch(workers) as parallel:
+            start = time.perf_counter()
+            parallel.search(position, True, max_depth=depth)
+            seconds = time.perf_counter() - start
+        results[workers] = {
+            "seconds": round(seconds, 3),
+            "speedup": round(results[1]["seconds"] / seconds, 2) if 1 in results else 1.0,
+        }
+    return results
+
+
+def load_positions(path=POSITIONS_PATH):
+    """Reads the benchmark positions
+
+    The file maps every phase to its search depth and to its positions as
+    strings of the columns (0-6) played from the empty board.
+
+    Args:
+        path (str): JSON file of the positions
+
+    Returns:
+        dict: depth and move lists by phase
+    """
+    with open(path, encoding="utf-8") as file:
+        phases = json.load(file)
+    return {phase: {"depth": group["depth"],
+                    "positions": [[int(col) for col in moves] for moves in group["positions"]]}
+            for phase, group in phases.items()}
+
+
+def search_benchmark(phases, table_mb=4):
+    """Searches every benchmark position to the fixed depth of its phase
+
+    Every position gets an empty transposition table, so the node counts
+    do not depend on the order the positions are searched in.
+
+    Args:
+        phases (dict): depth and move lists by phase, as returned by load_positions
+        table_mb (float): memory budget of the transposition table of a position
+
+    Returns:
+        dict: nodes, seconds, nodes per second and chosen columns by phase
+    """
+    results = {}
+    for phase, group in phases.items():
+        nodes = 0
+        seconds = 0.0
+        moves = []
+        for played in group["positions"]:
+            position = Position.from_moves(played)
+            table = TranspositionTable(table_mb)
+            stats = SearchStats()
+            start = time.perf_counter()
+            column, _, _ = search.deepen(position, -search.INF, search.INF, True, table,
+                                         search.INF, max_depth=group["depth"], stats=stats)
+            seconds += time.perf_counter() - start
+            nodes += stats.nodes
+            moves.append(column)
+        results[phase] = {
+            "depth": group["depth"],
+            "nodes": nodes,
+            "seconds": round(seconds, 3),
+            "nodes_per_second": round(nodes / seconds) if seconds else 0,
+            "moves": moves,
+        }
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.05, speed_tolerance=0.3):
+    """Compares benchmark results against stored ones
+
+    Node counts do not depend on the machine, so they get a tight
+    tolerance. Speed is compared as nodes per second with a looser one.
+
+    Args:
+        results (dict): results of search_benchmark
+        baseline (dict): earlier results of search_benchmark
+        tolerance (float): allowed relative growth of the node counts
+        speed_tolerance (float): allowed relative drop of nodes per second
+
+    Returns:
+        tuple: list of regressions and list of other differences, as messages
+    """
+    regressions = []
+    differences = []
+    for phase, result in results.items():
+        old = baseline.get(phase)
+        if old is None:
+            differences.append(f"{phase}: not in the baseline")
+            continue
+        if result["nodes"] > old["nodes"] * (1 + tolerance):
+            regressions.append(f"{phase}: {result['nodes']} nodes, baseline {old['nodes']}")
+        if result["nodes_per_second"] < old["nodes_per_second"] * (1 - speed_tolerance):
+            regressions.append(f"{phase}: {result['nodes_per_second']} nodes/s, "
+                               f"baseline {old['nodes_per_second']}")
+        if result["moves"] != old["moves"]:
+            differences.append(f"{phase}: moves {result['moves']}, baseline {old['moves']}")
+    return regressions, differences
+
+
+def main(arguments):
+    """Runs the benchmark suite from the command line
+
+    Args:
+        arguments (list): command line arguments
+
+    Returns:
+        int: exit status, 1 if the search benchmark regressed against the baseline
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the search")
+    parser.add_argument("benchmark", nargs="?", default="search",
+                        choices=["search", "allocation", "batch", "parallel"])
+    parser.add_argument("--positions", default=POSITIONS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--speed-tolerance", type=float, default=0.3)
+    parser.add_argument("--update-baseline", action="store_true")
+    options = parser.parse_args(arguments)
+
+    if options.benchmark == "allocation":
+        for start_moves, depth in (([], 7), ([3, 3, 2, 4], 8), ([3, 3, 3, 3, 2, 4, 4, 2], 8)):
+            print(start_moves, depth, allocation_benchmark(start_moves, depth))
+        return 0
+    if options.benchmark == "batch":
+        print(batch_benchmark(20000))
+        return 0
+    if options.benchmark == "parallel":
+        print(parallel_benchmark([3, 3, 2, 4], 10))
+        return 0
+
+    results = search_benchmark(load_positions(options.positions))
+    print(json.dumps(results, indent=2))
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if options.update_baseline:
+        with open(options.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+        print(f"Baseline written to {options.baseline}")
+        return 0
+    if not os.path.exists(options.baseline):
+        print("No baseline to compare against")
+        return 0
+    with open(options.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    regressions, differences = compare_to_baseline(results, baseline, options.tolerance,
+                                                   options.speed_tolerance)
+    for message in differences:
+        print(f"changed: {message}")
+    for message in regressions:
+        print(f"REGRESSION: {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,452 @@
+import functools
+import random
+
+from geometry import STANDARD
+from evaluation import code_tables
+
+
+class PositionTables:
+    """Tables a Position updates its hashes and window codes from
+
+    The tables only depend on the Rules, so positions of the same rules
+    share one instance, see position_tables.
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (Rules): board shape and win length
+        """
+        rng = random.Random(20240501)
+        cells = rules.columns * rules.h1
+        # Random key per colour and cell. The first player's pieces use the first
+        # list, so the hash does not depend on the order the moves were played in.
+        self.zobrist = [[rng.getrandbits(63) for _ in range(cells)] for _ in range(2)]
+        # Keys of the mirrored cells, so the hash of the mirror image is updated
+        # with the same index
+        self.mirror_zobrist = [[keys[rules.mirror_bits[bit]] for bit in range(cells)]
+                               for keys in self.zobrist]
+        (self.steps, self.first_scores, self.second_scores, self.first_gains,
+         self.second_gains) = code_tables(rules.connect)
+        # Window code of one piece less than a win of the first or the second
+        # player and no others
+        self.near_codes = tuple((rules.connect - 1) * step for step in self.steps)
+
+
+@functools.lru_cache(maxsize=None)
+def position_tables(rules):
+    """Returns the PositionTables of the rules, built once per Rules object"""
+    return PositionTables(rules)
+
+
+def alignment(stones, rules=STANDARD):
+    """Checks if a bitboard contains a winning line of pieces
+
+    Args:
+        stones (int): bitboard of one player's pieces
+        rules (Rules): board shape and win length
+
+    Returns:
+        bool: True if there are rules.connect pieces in a row in any direction
+    """
+    h1 = rules.h1
+    if rules.connect != 4:
+        for shift in (1, h1, h1 - 1, h1 + 1):
+            line = stones
+            for step in range(1, rules.connect):
+                line &= stones >> (step * shift)
+            if line:
+                return True
+        return False
+    for shift in (1, h1, h1 - 1, h1 + 1):
+        pairs = stones & (stones >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+
+def winning_cells(stones, mask, rules=STANDARD):
+    """Finds the empty cells that would complete a winning line
+
+    The empty top bit of every column keeps the lines of one column from
+    continuing in the next one, like in Position.
+
+    Args:
+        stones (int): bitboard of one player's pieces
+        mask (int): bitboard of all pieces
+        rules (Rules): board shape and win length
+
+    Returns:
+        int: bitboard of the empty cells, playable or not, that win for the stones
+    """
+    h1 = rules.h1
+    if rules.connect != 4:
+        cells = 0
+        for shift in (1, h1, h1 - 1, h1 + 1):
+            # The empty cell can be at any place of the line
+            for gap in range(rules.connect):
+                line = rules.board_mask
+                for place in range(rules.connect):
+                    offset = (gap - place) * shift
+                    if offset > 0:
+                        line &= stones << offset
+                    elif offset < 0:
+                        line &= stones >> -offset
+                cells |= line
+        return cells & (rules.board_mask ^ mask)
+    # Vertical: three pieces right below the cell
+    cells = (stones << 1) & (stones << 2) & (stones << 3)
+    for shift in (h1, h1 - 1, h1 + 1):
+        pairs = (stones << shift) & (stones << (2 * shift))
+        cells |= pairs & (stones << (3 * shift))
+        cells |= pairs & (stones >> shift)
+        pairs = (stones >> shift) & (stones >> (2 * shift))
+        cells |= pairs & (stones << shift)
+        cells |= pairs & (stones >> (3 * shift))
+    return cells & (rules.board_mask ^ mask)
+
+
+def mirror(bitboard, rules=STANDARD):
+    """Flips a bitboard left to right
+
+    Args:
+        bitboard (int): bitboard to flip
+        rules (Rules): board shape of the bitboard
+
+    Returns:
+        int: bitboard of the mirror image
+    """
+    flipped = 0
+    h1 = rules.h1
+    last = rules.columns - 1
+    for col in range(rules.columns):
+        flipped |= (bitboard & rules.column_masks[col]) >> (col * h1) << ((last - col) * h1)
+    return flipped
+
+
+class Position:
+    """Connect4 position stored as two bitboards
+
+    Each column takes H1 bits where the extra top bit is always empty so
+    that shifted masks never wrap from one column to the next. `current`
+    holds the pieces of the player to move and `mask` holds all pieces.
+    `heights` holds the index of the next free bit in every column,
+    `hash` is the Zobrist hash of the position and `mirror_hash` the hash
+    of its left-right mirror image, both updated on every move.
+
+    The evaluation is kept up to date on every move as well: `counts` holds
+    the pieces of every window as a code (see evaluation.code_tables) and
+    `score_first` and `score_second` are the evaluate_position scores from
+    the view of the players who moved first and second.
+
+    `wins` holds the empty cells where each player would complete a winning
+    line, like winning_cells, as a stack by number of moves: the cells of
+    the first player after n moves are at index 2 * n and those of the
+    second player at 2 * n + 1. A move only adds the cells of windows it
+    fills to one piece less than a win and removes its own cell, so play
+    updates the masks from the window codes and undo has nothing to restore.
+
+    `rules` gives the board shape and the win length, the standard 6x7 board
+    with four in a row by default. Every update reads the windows, masks and
+    keys from the tables of the rules, so other boards are played, searched
+    and evaluated by the same code.
+    """
+
+    __slots__ = ("rules", "tables", "current", "mask", "moves", "heights", "hash",
+                 "mirror_hash", "counts", "score_first", "score_second", "wins")
+
+    def __init__(self, rules=STANDARD):
+        """
+        Args:
+            rules (Rules): board shape and win length
+        """
+        self.rules = rules
+        self.tables = position_tables(rules)
+        self.current = 0
+        self.mask = 0
+        self.moves = 0
+        self.heights = [col * rules.h1 for col in range(rules.columns)]
+        self.hash = 0
+        self.mirror_hash = 0
+        self.counts = [0] * len(rules.windows)
+        self.score_first = 0
+        self.score_second = 0
+        self.wins = [0] * (2 * (rules.cells + 1))
+
+    @classmethod
+    def from_board(cls, board, piece, rules=STANDARD):
+        """Creates a position from a list board
+
+        Args:
+            board (list): game board as a 2D-list
+            piece (int): piece of the player to move
+            rules (Rules): board shape and win length
+
+        Returns:
+            Position: position matching the board
+        """
+        current = mask = 0
+        for col in range(rules.columns):
+            for row in range(rules.rows - 1, -1, -1):
+                cell = board[row][col]
+                if cell == 0:
+                    break
+                bit = 1 << rules.cell_bit(row, col)
+                mask |= bit
+                if cell == piece:
+                    current |= bit
+        return cls.from_bitboards(current, mask, rules)
+
+    @classmethod
+    def from_bitboards(cls, current, mask, rules=STANDARD):
+        """Creates a position from the bitboards of its pieces
+
+        Args:
+            current (int): pieces of the player to move
+            mask (int): all pieces, stacked from the bottom of every column
+            rules (Rules): board shape and win length
+
+        Returns:
+            Position: position with the hashes, evaluation and winning cells computed
+        """
+        position = cls(rules)
+        position.current = current
+        position.mask = mask
+        for col in range(rules.columns):
+            height = (mask & rules.column_masks[col]).bit_count()
+            position.heights[col] += height
+            position.moves += height
+        position.hash = position.compute_hash()
+        position.mirror_hash = position.compute_hash(mirrored=True)
+        if position.moves & 1:
+            first, second = current ^ mask, current
+        else:
+            first, second = current, current ^ mask
+        tables = position.tables
+        position.counts = [(first & window).bit_count() * tables.steps[0]
+                           + (second & window).bit_count() * tables.steps[1]
+                           for window in rules.windows]
+        position.score_first = sum(tables.first_scores[code] for code in position.counts)
+        position.score_second = sum(tables.second_scores[code] for code in position.counts)
+        position.wins[2 * position.moves] = winning_cells(first, mask, rules)
+        position.wins[2 * position.moves + 1] = winning_cells(second, mask, rules)
+        return position
+
+    @classmethod
+    def from_moves(cls, moves, rules=STANDARD):
+        """Creates a position by playing a sequence of columns from the empty board
+
+        Args:
+            moves (iterable): column numbers in the order they were played
+            rules (Rules): board shape and win length
+
+        Returns:
+            Position: position after the moves
+        """
+        position = cls(rules)
+        for col in moves:
+            position.play(col)
+        return position
+
+    def to_board(self, piece, other_piece):
+        """Converts the position into a list board
+
+        Args:
+            piece (int): piece of the player to move
+            other_piece (int): piece of the other player
+
+        Returns:
+            list: game board as a 2D-list
+        """
+        rules = self.rules
+        board = [[0] * rules.columns for _ in range(rules.rows)]
+        for row in range(rules.rows):
+            for col in range(rules.columns):
+                bit = 1 << rules.cell_bit(row, col)
+                if self.current & bit:
+                    board[row][col] = piece
+                elif self.mask & bit:
+                    board[row][col] = other_piece
+        return board
+
+    def copy(self):
+        """Returns an independent copy of the position"""
+        position = Position.__new__(Position)
+        position.rules = self.rules
+        position.tables = self.tables
+        position.current = self.current
+        position.mask = self.mask
+        position.moves = self.moves
+        position.heights = self.heights[:]
+        position.hash = self.hash
+        position.mirror_hash = self.mirror_hash
+        position.counts = self.counts[:]
+        position.score_first = self.score_first
+        position.score_second = self.score_second
+        position.wins = self.wins[:]
+        return position
+
+    def compute_hash(self, mirrored=False):
+        """Computes the Zobrist hash of the position from scratch
+
+        Args:
+            mirrored (bool): True to hash the mirror image of the position
+
+        Returns:
+            int: hash of the position
+        """
+        keys = self.tables.mirror_zobrist if mirrored else self.tables.zobrist
+        value = 0
+        mover = self.moves & 1
+        for bit in range(self.rules.columns * self.rules.h1):
+            if self.current >> bit & 1:
+                value ^= keys[mover][bit]
+            elif self.mask >> bit & 1:
+                value ^= keys[mover ^ 1][bit]
+        return value
+
+    def canonical_hash(self):
+        """Returns the smaller of the hashes of the position and its mirror image
+
+        A position and its mirror image have the same value with mirrored
+        moves, so tables keyed by the canonical hash store them only once.
+
+        Returns:
+            tuple: the hash and True if it is the hash of the mirror image
+        """
+        if self.mirror_hash < self.hash:
+            return self.mirror_hash, True
+        return self.hash, False
+
+    def evaluate(self, own_first):
+        """Returns the running evaluation of the position
+
+        Args:
+            own_first (bool): True to score from the view of the player who moved first
+
+        Returns:
+            int: Evaluated score, equal to evaluate_position for the same board
+        """
+        return self.score_first if own_first else self.score_second
+
+    def key(self):
+        """Returns an integer that is unique for every position"""
+        return self.current + self.mask
+
+    def canonical_key(self):
+        """Returns the smaller of the keys of the position and its mirror image
+
+        Returns:
+            tuple: the key and True if it is the key of the mirror image
+        """
+        key = self.current + self.mask
+        mirrored = mirror(self.current, self.rules) + mirror(self.mask, self.rules)
+        if mirrored < key:
+            return mirrored, True
+        return key, False
+
+    def can_play(self, column):
+        """Checks if a piece can be dropped into the column"""
+        return not self.mask & self.rules.top_masks[column]
+
+    def possible(self):
+        """Returns a bitboard of the cells where the next piece can be placed"""
+        return (self.mask + self.rules.bottom_mask) & self.rules.board_mask
+
+    def valid_moves(self):
+        """Returns the playable columns ordered from the centre outwards"""
+        top_masks = self.rules.top_masks
+        return [col for col in self.rules.preferred_cols if not self.mask & top_masks[col]]
+
+    def play(self, column):
+        """Drops a piece of the player to move into the column
+
+        Args:
+            column (int): column where to play, must be playable
+        """
+        tables = self.tables
+        bit = self.heights[column]
+        colour = self.moves & 1
+        self.hash ^= tables.zobrist[colour][bit]
+        self.mirror_hash ^= tables.mirror_zobrist[colour][bit]
+        self.current ^= self.mask
+        self.mask |= 1 << bit
+        self.heights[column] = bit + 1
+        self.moves += 1
+
+        rules = self.rules
+        counts = self.counts
+        step = tables.steps[colour]
+        near = tables.near_codes[colour]
+        first_gains = tables.first_gains[colour]
+        second_gains = tables.second_gains[colour]
+        windows = rules.windows
+        score_first = self.score_first
+        score_second = self.score_second
+        filled = 0
+        for window in rules.cell_windows[bit]:
+            code = counts[window]
+            score_first += first_gains[code]
+            score_second += second_gains[code]
+            code += step
+            counts[window] = code
+            if code == near:
+                filled |= windows[window]
+        self.score_first = score_first
+        self.score_second = score_second
+
+        wins = self.wins
+        index = 2 * self.moves
+        empty = rules.board_mask ^ self.mask
+        wins[index + colour] = (wins[index - 2 + colour] | filled) & empty
+        wins[index + 1 - colour] = wins[index - 1 - colour] & empty
+
+    def undo(self, column):
+        """Takes back the last piece played into the column
+
+        Args:
+            column (int): column of the last move
+        """
+        tables = self.tables
+        bit = self.heights[column] - 1
+        self.heights[column] = bit
+        self.mask ^= 1 << bit
+        self.current ^= self.mask
+        self.moves -= 1
+        colour = self.moves & 1
+        self.hash ^= tables.zobrist[colour][bit]
+        self.mirror_hash ^= tables.mirror_zobrist[colour][bit]
+
+        counts = self.counts
+        step = tables.steps[colour]
+        first_gains = tables.first_gains[colour]
+        second_gains = tables.second_gains[colour]
+        score_first = self.score_first
+        score_second = self.score_second
+        for window in self.rules.cell_windows[bit]:
+            code = counts[window] - step
+            score_first -= first_gains[code]
+            score_second -= second_gains[code]
+            counts[window] = code
+        self.score_first = score_first
+        self.score_second = score_second
+
+    def own_winning_cells(self):
+        """Returns the empty cells where the player to move would win, playable or not"""
+        return self.wins[2 * self.moves + (self.moves & 1)]
+
+    def opponent_winning_cells(self):
+        """Returns the empty cells where the opponent would win, playable or not"""
+        return self.wins[2 * self.moves + 1 - (self.moves & 1)]
+
+    def is_winning_move(self, column):
+        """Checks if playing into the column wins the game for the player to move"""
+        return bool(self.wins[2 * self.moves + (self.moves & 1)] >> self.heights[column] & 1)
+
+    def is_won(self):
+        """Checks if the player who made the last move has a winning line"""
+        return alignment(self.current ^ self.mask, self.rules)
+
+    def is_draw(self):
+        """Checks if the board is full"""
+        return self.moves == self.rules.cells
@@ -0,0 +1,183 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+from bitboard import Position
+from geometry import WIDTH, COLUMNS, MIRROR_COLUMNS
+from transposition import TranspositionTable
+
+MAGIC = b"C4BOOK2\0"
+HEADER = struct.Struct("<8sQ")
+# Canonical position key, best column of the position with that key and
+# score from the view of the player to move
+RECORD = struct.Struct("<Qbh")
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "..", "data", "opening_book.bin")
+# The first player wins by starting in the centre column, which is proven by
+# solving the whole game. Depth-limited searches of the empty board drift
+# away from it, so it is played without a book and stored in generated books.
+OPENING_MOVE = WIDTH // 2
+
+
+def known_move(position):
+    """Returns the proven best move of a position that searches do not find
+
+    Args:
+        position (Position): current position
+
+    Returns:
+        int: OPENING_MOVE on the empty standard board, None for other positions
+    """
+    return OPENING_MOVE if position.moves == 0 and position.rules.is_standard else None
+
+
+def book_positions(plies):
+    """Lists every position reachable in at most the given number of moves
+
+    Args:
+        plies (int): maximum number of moves from the empty board
+
+    Returns:
+        list: positions without duplicates or mirror images, games that are
+            already over are left out
+    """
+    layer = {0: Position()}
+    positions = list(layer.values())
+    for _ in range(plies):
+        next_layer = {}
+        for position in layer.values():
+            for col in position.valid_moves():
+                if position.is_winning_move(col):
+                    continue
+                child = position.copy()
+                child.play(col)
+                if not child.is_draw():
+                    next_layer.setdefault(child.canonical_key()[0], child)
+        layer = next_layer
+        positions.extend(layer.values())
+    return positions
+
+
+def _solve_entry(task):
+    """Searches one book position
+
+    Args:
+        task (tuple): position and search depth
+
+    Returns:
+        tuple: canonical position key, best column for that key and score
+    """
+    import search  # pylint: disable=import-outside-toplevel,cyclic-import
+    position, depth = task
+    best_col, _, score = search.deepen(position, -search.INF, search.INF, True,
+                                       TranspositionTable(4), search.INF, max_depth=depth)
+    known = known_move(position)
+    if known is not None:
+        best_col = known
+    key, mirrored = position.canonical_key()
+    return key, (MIRROR_COLUMNS if mirrored else COLUMNS)[best_col], score
+
+
+def generate_book(path, plies, depth, workers=1):
+    """Searches every position up to a number of moves and writes the results into a book file
+
+    Args:
+        path (str): file to write
+        plies (int): maximum number of moves from the empty board
+        depth (int): search depth used for every position
+        workers (int): number of processes searching the positions
+
+    Returns:
+        int: number of positions in the book
+    """
+    tasks = [(position, depth) for position in book_positions(plies)]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            entries = pool.map(_solve_entry, tasks, chunksize=16)
+    else:
+        entries = [_solve_entry(task) for task in tasks]
+    entries.sort()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(entries)))
+        for key, best_col, score in entries:
+            file.write(RECORD.pack(key, best_col, score))
+    return len(entries)
+
+
+class OpeningBook:
+    """Opening book file read through mmap
+
+    The file holds a header and records sorted by position key, so a lookup
+    is a binary search over the mapped file and opening the book reads
+    nothing but the header. A position and its mirror image share the record
+    of the smaller key, and lookup mirrors the move back when needed.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): book file written by generate_book
+        """
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or len(self.data) != HEADER.size + self.size * RECORD.size:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        """Unmaps the book file"""
+        self.data.close()
+
+    def lookup(self, position):
+        """Finds the stored move of a position
+
+        Args:
+            position (Position): position to look up
+
+        Returns:
+            tuple: best column and score or None if the position is not in the book
+        """
+        key, mirrored = position.canonical_key()
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            stored, best_col, score = RECORD.unpack_from(self.data, HEADER.size
+                                                         + middle * RECORD.size)
+            if stored == key:
+                return (MIRROR_COLUMNS if mirrored else COLUMNS)[best_col], score
+            if stored < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+def load_book(path=DEFAULT_BOOK_PATH):
+    """Opens an opening book if the file exists
+
+    Args:
+        path (str): book file
+
+    Returns:
+        OpeningBook: the book or None if there is no book file
+    """
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the opening book")
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default=DEFAULT_BOOK_PATH)
+    arguments = parser.parse_args()
+    count = generate_book(arguments.output, arguments.plies, arguments.depth, arguments.workers)
+    print(f"Wrote {count} positions to {arguments.output}")
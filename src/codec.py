@@ -0,0 +1,447 @@
+import array
+import functools
+import itertools
+import mmap
+import os
+import struct
+from bitboard import Position
+from geometry import WIDTH, HEIGHT, H1
+
+# Bits of one move in a packed game. Columns take the values 0-6, so the
+# value 7 marks the end of a game and fills the unused bits of its last byte.
+MOVE_BITS = 3
+END_OF_GAME = (1 << MOVE_BITS) - 1
+COLUMN_DIGITS = frozenset(str(col) for col in range(WIDTH))
+ARCHIVE_MAGIC = b"C4GAMES\0"
+# Magic, number of games and byte offset of the index of game offsets, 0
+# while games are added after the last index was written
+ARCHIVE_HEADER = struct.Struct("<8sQQ")
+COLUMN_KEY_MASK = (1 << H1) - 1
+
+
+def moves_to_string(moves):
+    """Writes columns as a move string, one digit per move
+
+    Args:
+        moves (iterable): columns 0-6 in the order they were played
+
+    Returns:
+        str: the move string
+    """
+    return "".join(map(str, moves))
+
+
+def moves_from_string(text):
+    """Reads a move string
+
+    Args:
+        text (str): columns 0-6 as digits, surrounding white space is ignored
+
+    Returns:
+        list: the columns
+    """
+    text = text.strip()
+    if not COLUMN_DIGITS.issuperset(text):
+        raise ValueError(f"invalid move string {text!r}")
+    return [int(char) for char in text]
+
+
+def pack_moves(moves):
+    """Packs columns into bytes, 3 bits per move
+
+    Args:
+        moves (list): columns 0-6 in the order they were played
+
+    Returns:
+        bytes: the moves from the lowest bits up, the bits after the last move
+            set, so at least one end marker follows the moves
+    """
+    value = 0
+    for col in reversed(moves):
+        value = value << MOVE_BITS | col
+    bits = MOVE_BITS * len(moves)
+    size = (bits + MOVE_BITS + 7) // 8
+    value |= ((1 << (8 * size - bits)) - 1) << bits
+    return value.to_bytes(size, "little")
+
+
+def unpack_moves(data):
+    """Reads the columns of a packed game
+
+    Args:
+        data (bytes): bytes from pack_moves
+
+    Returns:
+        list: the columns
+    """
+    value = int.from_bytes(data, "little")
+    moves = []
+    for _ in range(len(data) * 8 // MOVE_BITS):
+        col = value & END_OF_GAME
+        if col == END_OF_GAME:
+            break
+        moves.append(col)
+        value >>= MOVE_BITS
+    return moves
+
+
+def key_to_bitboards(key):
+    """Splits a position key back into the bitboards of the position
+
+    Every column of a key is the pieces of the player to move plus a run of
+    ones as high as the column, see Position.key.
+
+    Args:
+        key (int): key of a position
+
+    Returns:
+        tuple: pieces of the player to move and all pieces
+    """
+    current = mask = 0
+    for col in range(WIDTH):
+        shift = col * H1
+        column = key >> shift & COLUMN_KEY_MASK
+        stones = (1 << ((column + 1).bit_length() - 1)) - 1
+        mask |= stones << shift
+        current |= (column - stones) << shift
+    return current, mask
+
+
+def mirror_key(key):
+    """Returns the key of the mirror image of a position
+
+    A column of a key is H1 bits wide, one more than bitboard.mirror flips.
+    """
+    flipped = 0
+    for col in range(WIDTH):
+        flipped |= (key >> (col * H1) & COLUMN_KEY_MASK) << ((WIDTH - 1 - col) * H1)
+    return flipped
+
+
+def position_from_key(key):
+    """Creates the position of a key
+
+    Args:
+        key (int): key from Position.key
+
+    Returns:
+        Position: the position
+    """
+    return Position.from_bitboards(*key_to_bitboards(key))
+
+
+def pack_keys(keys):
+    """Writes position keys as 64-bit little-endian integers
+
+    Args:
+        keys (list): keys from Position.key
+
+    Returns:
+        bytes: 8 bytes per key
+    """
+    return struct.pack(f"<{len(keys)}Q", *keys)
+
+
+def unpack_keys(data):
+    """Reads the keys written by pack_keys
+
+    Args:
+        data (bytes): 8 bytes per key
+
+    Returns:
+        list: the keys
+    """
+    return list(struct.unpack(f"<{len(data) // 8}Q", data))
+
+
+@functools.lru_cache(maxsize=16)
+def _column_codes(piece, other_piece):
+    """Builds the tables between list board columns and the columns of keys
+
+    Args:
+        piece (int): piece of the player to move
+        other_piece (int): piece of the other player
+
+    Returns:
+        tuple: dictionary from a column of cells, top row first, to the
+            column of the key, and list of the cells of every key column
+    """
+    codes = {}
+    cells = [None] * (1 << H1)
+    for height in range(HEIGHT + 1):
+        for stones in itertools.product((piece, other_piece), repeat=height):
+            column = (0,) * (HEIGHT - height) + stones[::-1]
+            current = sum(1 << row for row, cell in enumerate(stones) if cell == piece)
+            code = current + (1 << height) - 1
+            codes[column] = code
+            cells[code] = column
+    return codes, cells
+
+
+def boards_to_keys(boards, piece, other_piece):
+    """Converts list boards into position keys
+
+    Args:
+        boards (iterable): game boards as 2D-lists like the ones make_move fills
+        piece (int): piece of the player to move
+        other_piece (int): piece of the other player
+
+    Returns:
+        list: key of every board
+    """
+    codes = _column_codes(piece, other_piece)[0]
+    keys = []
+    for board in boards:
+        key = 0
+        try:
+            for col, column in enumerate(zip(*board)):
+                key |= codes[column] << (col * H1)
+        except KeyError:
+            raise ValueError("a column has a gap or an unknown piece") from None
+        keys.append(key)
+    return keys
+
+
+def keys_to_boards(keys, piece, other_piece):
+    """Converts position keys into list boards
+
+    Args:
+        keys (iterable): keys from Position.key
+        piece (int): piece of the player to move
+        other_piece (int): piece of the other player
+
+    Returns:
+        list: game board of every key as a 2D-list
+    """
+    cells = _column_codes(piece, other_piece)[1]
+    return [[list(row) for row in zip(*(cells[key >> (col * H1) & COLUMN_KEY_MASK]
+                                        for col in range(WIDTH)))]
+            for key in keys]
+
+
+def board_to_key(board, piece, other_piece):
+    """Converts one list board into a position key, see boards_to_keys"""
+    return boards_to_keys([board], piece, other_piece)[0]
+
+
+def key_to_board(key, piece, other_piece):
+    """Converts one position key into a list board, see keys_to_boards"""
+    return keys_to_boards([key], piece, other_piece)[0]
+
+
+def scan_games(data, start, end):
+    """Finds where packed games written one after another end
+
+    Every game ends in the byte holding its first end marker, so the games
+    can be found without an index. Bytes after the last end marker are an
+    unfinished game and are left out.
+
+    Args:
+        data (bytes): bytes holding the games
+        start (int): offset of the first game
+        end (int): offset after the last byte to scan
+
+    Returns:
+        list: offset of the first game and the end offset of every game
+    """
+    offsets = [start]
+    value = bits = 0
+    for offset in range(start, end):
+        value |= data[offset] << bits
+        bits += 8
+        while bits >= MOVE_BITS:
+            if value & END_OF_GAME == END_OF_GAME:
+                offsets.append(offset + 1)
+                value = bits = 0
+                break
+            value >>= MOVE_BITS
+            bits -= MOVE_BITS
+    return offsets
+
+
+def recover_offsets(path):
+    """Reads the game offsets of an archive, also of one that was not closed
+
+    Args:
+        path (str): archive file
+
+    Returns:
+        list: start offset of every game and the end of the last one
+    """
+    try:
+        with GameArchive(path) as archive:
+            return list(archive.offsets())
+    except ValueError:
+        pass
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data:
+        return [ARCHIVE_HEADER.size]
+    if len(data) < ARCHIVE_HEADER.size or data[:8] != ARCHIVE_MAGIC:
+        raise ValueError(f"{path} is not a game archive")
+    _, size, index = ARCHIVE_HEADER.unpack_from(data, 0)
+    if not index:
+        # Games were being added, every complete game up to the end counts
+        return scan_games(data, ARCHIVE_HEADER.size, len(data))
+    # The index was being written after the games of the header
+    offsets = scan_games(data, ARCHIVE_HEADER.size, index)
+    if len(offsets) != size + 1 or offsets[-1] != index:
+        raise ValueError(f"{path} is not a game archive")
+    return offsets
+
+
+def read_move_strings(file):
+    """Streams the games of a text file with one move string per line
+
+    Args:
+        file: text file opened for reading
+
+    Yields:
+        list: columns of a game, blank lines are skipped
+    """
+    for line in file:
+        if line.strip():
+            yield moves_from_string(line)
+
+
+class GameWriter:
+    """Writes games into an archive file
+
+    An archive holds a header, the packed games one after another and an
+    index of where every game starts, written by flush and close. New games
+    are written over the index, and the header marks the archive unindexed
+    until the next flush. An archive that was not closed, for example after
+    a crash, is read back by scanning the games for their end markers when
+    it is opened for appending, so at most an unfinished game is lost.
+    """
+
+    def __init__(self, path, append=False):
+        """
+        Args:
+            path (str): archive file
+            append (bool): True to add games to an existing archive
+        """
+        if append and os.path.exists(path):
+            self.offsets = array.array("Q", recover_offsets(path))
+            self.file = open(path, "r+b")  # pylint: disable=consider-using-with
+            self.indexed = False
+            self.flush()
+        else:
+            self.file = open(path, "wb")  # pylint: disable=consider-using-with
+            self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, 0, 0))
+            self.offsets = array.array("Q", [ARCHIVE_HEADER.size])
+            self.indexed = False
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, moves):
+        """Adds a game
+
+        Args:
+            moves (list): columns of the game
+        """
+        if self.indexed:
+            # The index is cut off before the header is marked unindexed, so
+            # a crash in between leaves a header that points to the end of the games
+            self.file.truncate()
+            self._write_header(0)
+            self.indexed = False
+        self.file.write(pack_moves(moves))
+        self.offsets.append(self.file.tell())
+
+    def flush(self):
+        """Writes the index, so the archive can be read while more games are added"""
+        if self.indexed:
+            return
+        end = self.offsets[-1]
+        # The header goes first, so a crash while the index is written leaves
+        # the number of games and their end in the header
+        self._write_header(end)
+        self.file.seek(end)
+        self.file.write(self.offsets.tobytes())
+        self.file.truncate()
+        self.file.flush()
+        self.file.seek(end)
+        self.indexed = True
+
+    def _write_header(self, index):
+        """Writes the header with the offset of the index, 0 for no index"""
+        position = self.file.tell()
+        self.file.seek(0)
+        self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, len(self), index))
+        self.file.flush()
+        self.file.seek(position)
+
+    def close(self):
+        """Writes the index and closes the file"""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class GameArchive:
+    """Archive file read through mmap
+
+    Games are read one at a time from the mapped file, by number or in
+    order, so reading never loads the whole archive.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): archive written by GameWriter
+        """
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.index = ARCHIVE_HEADER.unpack_from(self.data, 0)
+        if magic != ARCHIVE_MAGIC or len(self.data) != self.index + 8 * (self.size + 1):
+            self.data.close()
+            raise ValueError(f"{path} is not a game archive")
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps the archive file"""
+        self.data.close()
+
+    def offsets(self):
+        """Returns the start offset of every game and the end of the last one"""
+        return struct.unpack_from(f"<{self.size + 1}Q", self.data, self.index)
+
+    def __getitem__(self, number):
+        """Reads the columns of a game
+
+        Args:
+            number (int): index of the game, negative indices count from the end
+
+        Returns:
+            list: the columns
+        """
+        if number < 0:
+            number += self.size
+        if not 0 <= number < self.size:
+            raise IndexError("game number out of range")
+        start, end = struct.unpack_from("<QQ", self.data, self.index + 8 * number)
+        return unpack_moves(self.data[start:end])
+
+    def __iter__(self):
+        data = self.data
+        start = ARCHIVE_HEADER.size
+        for offset in range(self.index + 8, self.index + 8 * (self.size + 1), 8):
+            end = struct.unpack_from("<Q", data, offset)[0]
+            yield unpack_moves(data[start:end])
+            start = end
@@ -0,0 +1,191 @@
+import threading
+import time
+import search
+from solver import Solver, SOLVER_EMPTY_CELLS
+from stats import SearchStats, table_move
+from transposition import TranspositionTable
+
+
+class Ponder:
+    """Background search of the position the engine expects to play next"""
+
+    def __init__(self, position, max_player):
+        """
+        Args:
+            position (Position): position searched, copied so the game can go on
+            max_player (bool): True if the engine is to move in the position
+        """
+        self.position = position.copy()
+        self.key = position.key()
+        self.max_player = max_player
+        self.stop = threading.Event()
+        self.stats = SearchStats()
+        self.move = None
+        self.thread = None
+
+    def start(self, table, tablebase=None, solved_cells=0):
+        """Starts the search in a thread
+
+        Args:
+            table (TranspositionTable): table of the engine, kept when the search is stopped
+            tablebase (Tablebase): exact scores of endgame positions, None to search them
+            solved_cells (int): largest number of empty cells of the positions
+                looked up from the solver entries of the table
+        """
+        self.thread = threading.Thread(target=self.run, args=(table, tablebase, solved_cells),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, table, tablebase=None, solved_cells=0):
+        """Searches until stopped or until the position is searched to the end"""
+        start = time.monotonic()
+        self.move, _, _ = search.deepen(self.position, -search.INF, search.INF, self.max_player,
+                                        table, search.INF, stop=self.stop, stats=self.stats,
+                                        tablebase=tablebase, solved_cells=solved_cells)
+        self.stats.seconds = time.monotonic() - start
+        self.stats.move = self.move
+        self.stats.source = "ponder"
+
+    def finish(self):
+        """Stops the search and waits for the thread to end"""
+        self.stop.set()
+        self.thread.join()
+
+
+class Engine:
+    """Search engine that keeps what it has learned from move to move
+
+    The engine owns a transposition table and an endgame solver for a
+    whole game or for many games. The solver stores its results in the
+    same table, so a solve that runs out of time still gives the search
+    the won, drawn and lost positions it proved. Every move starts a new table generation,
+    so entries of earlier moves still give cutoffs and best moves to try
+    first but are the first ones replaced when the table fills up. Keys
+    depend on the colour the engine plays, so one engine can play both
+    sides of different games. The search and the solver both read the
+    tablebase, if there is one, wherever they reach a position it covers.
+    """
+
+    def __init__(self, size_mb=16, book=None, solver_threshold=SOLVER_EMPTY_CELLS,
+                 tablebase=None):
+        """
+        Args:
+            size_mb (float): memory budget of the transposition table
+            book (OpeningBook): opening book to play from, None for no book
+            solver_threshold (int): largest number of empty cells solved exactly
+            tablebase (Tablebase): exact scores of endgame positions, None to search them
+        """
+        self.table = TranspositionTable(size_mb)
+        self.solver = Solver(self.table, tablebase)
+        self.book = book
+        self.tablebase = tablebase
+        self.solver_threshold = solver_threshold
+        self.pondering = None
+
+    def choose_move(self, position, time_limit, max_depth=None, max_nodes=search.INF,
+                    stats=None, trace=None, stop=None, batch_leaves=False):
+        """Searches the move of the player to move
+
+        Args:
+            position (Position): position where the engine is to move
+            time_limit (float): maximum time in seconds to search for the best move
+            max_depth (int): depth of the last iteration, None to search until the time limit
+            max_nodes (int): node budget of the search
+            stats (SearchStats): statistics to fill in, None to not collect them
+            trace (JsonLinesTrace): sink the statistics of the move are written to
+            stop (Event): event that aborts the search when set
+            batch_leaves (bool): True to evaluate the leaves of a node as one NumPy batch
+
+        Returns:
+            int: Column number where the engine plays or None if the board is full
+        """
+        pondering = self.pondering
+        # The book, the tablebase and the solver answer exactly, so a
+        # heuristic background search of their positions is not used
+        if (pondering is not None and pondering.max_player and pondering.key == position.key()
+                and max_depth is None and max_nodes == search.INF and stop is None
+                and not self.answers_without_search(position)):
+            return self._ponder_hit(pondering, position, time_limit, stats, trace)
+        self.stop_pondering()
+        self.table.new_search()
+        return search.iterative_deepening(
+            position, -search.INF, search.INF, True, time_limit, table=self.table,
+            book=self.book, solver=self.solver, solver_threshold=self.solver_threshold,
+            stats=stats, trace=trace, max_depth=max_depth, batch_leaves=batch_leaves,
+            max_nodes=max_nodes, stop=stop, tablebase=self.tablebase)
+
+    def answers_without_search(self, position):
+        """Checks if the book, the tablebase or the solver gives the move of a position
+
+        Args:
+            position (Position): position where the engine is to move
+
+        Returns:
+            bool: True if iterative_deepening does not need the heuristic search
+        """
+        return (search.book_move(position, self.book) is not None
+                or self.tablebase is not None and self.tablebase.best_move(position) is not None
+                or position.rules.cells - position.moves <= self.solver_threshold)
+
+    def clear(self):
+        """Forgets every searched position, for example to make results reproducible"""
+        self.stop_pondering()
+        self.table.clear()
+
+    def expected_reply(self, position):
+        """Reads the reply the last search expected from the opponent
+
+        Args:
+            position (Position): position after the move of the engine
+
+        Returns:
+            int: column of the expected reply, None if the table does not know it
+        """
+        col = table_move(position, self.table, search.perspective_key(position, False))
+        if col is None or not position.can_play(col):
+            return None
+        return col
+
+    def ponder(self, position):
+        """Starts searching in the background while the opponent thinks
+
+        If the table knows the reply the opponent is expected to play, the
+        position after that reply is searched, and choose_move continues
+        that search if the prediction comes true. Otherwise all replies are
+        searched to fill the table. Book, tablebase and solver positions are
+        answered quickly anyway, so they are not pondered.
+
+        Args:
+            position (Position): position after the move of the engine, the opponent to move
+        """
+        self.stop_pondering()
+        reply = self.expected_reply(position)
+        pondered = position.copy()
+        max_player = False
+        if reply is not None:
+            if pondered.is_winning_move(reply):
+                return
+            pondered.play(reply)
+            max_player = True
+        if pondered.is_draw() or self.answers_without_search(pondered):
+            return
+        self.table.new_search()
+        self.pondering = Ponder(pondered, max_player)
+        self.pondering.start(self.table, self.tablebase, self.solver_threshold)
+
+    def stop_pondering(self):
+        """Aborts the background search, its table entries are kept"""
+        if self.pondering is not None:
+            self.pondering.finish()
+            self.pondering = None
+
+    def _ponder_hit(self, pondering, position, time_limit, stats, trace):
+        """Lets the background search of the predicted position run for the time of the move"""
+        pondering.thread.join(time_limit)
+        self.stop_pondering()
+        if stats is not None:
+            vars(stats).update(vars(pondering.stats))
+        if trace is not None:
+            trace.write(pondering.stats, moves=position.moves, key=position.key(),
+                        ponder_hit=True)
+        return pondering.move
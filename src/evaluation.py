@@ -0,0 +1,138 @@
+import functools
+from geometry import WINDOWS
+
+
+def window_score(own, opponent, connect=4):
+    """Scores a single window the same way as evaluate_position
+
+    Args:
+        own (int): number of own pieces in the window
+        opponent (int): number of opponent pieces in the window
+        connect (int): number of cells in the window
+
+    Returns:
+        int: score of the window
+    """
+    empty = connect - own - opponent
+    value = 0
+    if own == connect:
+        value += 100
+    elif own == connect - 1 and empty == 1:
+        value += 5
+    elif own == connect - 2 and empty == 2:
+        value += 2
+    if opponent == connect - 1 and empty == 1:
+        value -= 4
+    elif opponent == connect - 2 and empty == 2:
+        value -= 2
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def window_scores(connect):
+    """Lists window scores by the number of own and opponent pieces
+
+    Args:
+        connect (int): number of cells in a window
+
+    Returns:
+        list: score of every window by own and then opponent pieces
+    """
+    return [[window_score(own, opponent, connect) if own + opponent <= connect else 0
+             for opponent in range(connect + 1)] for own in range(connect + 1)]
+
+
+def _code_scores(first_view, connect=4):
+    """Lists window scores by window code
+
+    Args:
+        first_view (bool): True to score from the view of the first player
+        connect (int): number of cells in a window
+
+    Returns:
+        list: score of every window code
+    """
+    table = window_scores(connect)
+    scores = []
+    for code in range((connect + 1) ** 2):
+        first, second = divmod(code, connect + 1)
+        if first_view:
+            scores.append(table[first][second])
+        else:
+            scores.append(table[second][first])
+    return scores
+
+
+def _gains(scores, step):
+    """Lists how much a window score changes when a piece is added to it
+
+    Args:
+        scores (list): window scores by code
+        step (int): code change caused by the added piece
+
+    Returns:
+        list: score change by the code before the piece was added
+    """
+    return [scores[code + step] - scores[code] if code + step < len(scores) else 0
+            for code in range(len(scores))]
+
+
+@functools.lru_cache(maxsize=None)
+def code_tables(connect):
+    """Builds the tables of the running evaluation for a win length
+
+    The pieces of a window are kept as one code, first * (connect + 1) +
+    second, where first and second count the pieces of the players who
+    moved first and second.
+
+    Args:
+        connect (int): number of cells in a window
+
+    Returns:
+        tuple: code steps of the first and second player, window scores by
+            code from the view of the first and the second player, and the
+            score changes of both views by the player adding a piece
+    """
+    steps = (connect + 1, 1)
+    first_scores = _code_scores(True, connect)
+    second_scores = _code_scores(False, connect)
+    first_gains = [_gains(first_scores, step) for step in steps]
+    second_gains = [_gains(second_scores, step) for step in steps]
+    return steps, first_scores, second_scores, first_gains, second_gains
+
+
+WINDOW_SCORES = window_scores(4)
+# Score changes for a piece of the first (index 0) or second (index 1) player
+COUNT_STEPS, FIRST_SCORES, SECOND_SCORES, FIRST_GAINS, SECOND_GAINS = code_tables(4)
+
+
+def evaluate(own, opponent):
+    """Evaluates a bitboard position from the view of one player by scanning every window
+
+    Args:
+        own (int): bitboard of the evaluated player's pieces
+        opponent (int): bitboard of the opponent's pieces
+
+    Returns:
+        int: Evaluated score, equal to evaluate_position for the same board
+    """
+    value = 0
+    for window in WINDOWS:
+        value += WINDOW_SCORES[(own & window).bit_count()][(opponent & window).bit_count()]
+    return value
+
+
+def window_counts(first, second):
+    """Computes window codes and both players' scores from scratch
+
+    Args:
+        first (int): bitboard of the first player's pieces
+        second (int): bitboard of the second player's pieces
+
+    Returns:
+        tuple: list of window codes, score of the first player and score of the second player
+    """
+    counts = [(first & window).bit_count() * 5 + (second & window).bit_count()
+              for window in WINDOWS]
+    return (counts, sum(FIRST_SCORES[code] for code in counts),
+            sum(SECOND_SCORES[code] for code in counts))
@@ -1,5 +1,14 @@
+import argparse
 import random
-import time
+import search
+from bitboard import Position
+from geometry import Rules, STANDARD
+from evaluation import window_scores
+from transposition import TranspositionTable
+from book import load_book
+from tablebase import load_tablebase
+from engine import Engine
+from mcts import MctsEngine
 
 def print_board(board):
     """Prints the current state of the Connect4 board
@@ -7,8 +16,9 @@ def print_board(board):
     Args:
         board (list): game board as a 2D-list
     """
-    print("1 2 3 4 5 6 7")
-    print("-------------")
+    header = " ".join(str(col + 1) for col in range(len(board[0])))
+    print(header)
+    print("-" * len(header))
     for row in board:
         print(' '.join(str(cell) for cell in row))
     print("\n")
@@ -22,12 +32,13 @@ def full_board(board):
     Returns:
         bool: True if the board is full
     """
-    for col in range(7):
+    for col in range(len(board[0])):
         if board[0][col] == 0:
             return False
     return True
 
-def iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece):
+def iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece,
+                        rules=STANDARD):
     """Iterative deepening with minimax and alpha-beta-pruning to figure out the best move for ai
 
     Args:
@@ -38,24 +49,16 @@ def iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece
         time_limit (int): maximum time to search for the best move
         player_piece (int): Number for player piece
         ai_piece (int): Number for ai piece
+        rules (Rules): board shape and win length
 
     Returns:
         int: Column number where ai plays its piece
     """
-    hash_map = {}
-    start_time = time.time()
-    depth = 3
-    best_col = 3
-    while True:
-        new_col, _ = minimax(board, depth, alpha, beta, 
-                             max_player, player_piece, ai_piece, hash_map)
-        if time.time() - start_time > time_limit:
-            break
-        best_col = new_col if new_col is not None else best_col
-        depth += 1
-    return best_col
+    position = Position.from_board(board, ai_piece if max_player else player_piece, rules)
+    return search.iterative_deepening(position, alpha, beta, max_player, time_limit)
 
-def minimax(board, depth, alpha, beta, max_player, player_piece, ai_piece, hash_map): 
+def minimax(board, depth, alpha, beta, max_player, player_piece, ai_piece, hash_map,
+            rules=STANDARD):
     """Minimax with alpha-beta-pruning to determine best move for ai
 
     Args:
@@ -66,86 +69,25 @@ def minimax(board, depth, alpha, beta, max_player, player_piece, ai_piece, hash_
         max_player (bool): True if its ai's turn
         player_piece (int): Number for player piece
         ai_piece (int): Number for ai piece
-        hash_map (dict): storage for previously computed values for board states
+        hash_map (TranspositionTable): storage for previously computed values for board
+            states, a new table is used if a plain dict is given
+        rules (Rules): board shape and win length
 
     Returns:
         tuple: Contains the best column to play the move and evaluation score for that move
     """
-    if full_board(board):
-        return None, 0
-
-    if depth == 0:
-        return None, evaluate_position(board, ai_piece, player_piece, ai_piece)
-
-    ordered_cols = sorted(valid_moves(board))
-
-    if max_player: 
-        value = float("-inf")
-        column = 0
-        board_key = str(board)
-        best_col = hash_map.get(board_key)
-        if best_col is not None:
-            ordered_cols.remove(best_col)
-            ordered_cols.insert(0, best_col)
-
-        for i in ordered_cols:
-            row = get_next_open_row(board, i)
-            copy_board = [row[:] for row in board]
-            make_move(copy_board, row, i, ai_piece)
-
-            if is_game_over(copy_board, (row, i)):
-                return i, 1000
-
-            new_value = minimax(copy_board, depth - 1, alpha, beta, False,
-                                player_piece, ai_piece, hash_map)[1]
-            if new_value > value:
-                value = new_value
-                column = i
-
-            alpha = max(value, alpha)
-            if alpha >= beta:
-                break
+    if not isinstance(hash_map, TranspositionTable):
+        hash_map = TranspositionTable()
+    position = Position.from_board(board, ai_piece if max_player else player_piece, rules)
+    return search.minimax(position, depth, alpha, beta, max_player, hash_map)
 
-        hash_map[board_key] = column
-        return column, value
-
-    else:
-        value = float("inf")
-        column = 0
-
-        board_key = str(board)
-        best_col = hash_map.get(board_key)
-        if best_col is not None:
-            ordered_cols.remove(best_col)
-            ordered_cols.insert(0, best_col)
-
-        for i in ordered_cols:
-            row = get_next_open_row(board, i)
-            copy_board = [row[:] for row in board]
-            make_move(copy_board, row, i, player_piece)
-
-            if is_game_over(copy_board, (row, i)):
-                return i, -1000
-
-            new_value = minimax(copy_board, depth - 1, alpha, beta, True,
-                                player_piece, ai_piece, hash_map)[1]
-            if new_value < value:
-                value = new_value
-                column = i
-
-            beta = min(value, beta)
-            if alpha >= beta:
-                break
-
-        hash_map[board_key] = column
-        return column, value
-    
-def is_game_over(board, last_move):
+def is_game_over(board, last_move, rules=STANDARD):
     """Determines if the game has ended to a winning position
 
     Args:
         board (list): game board as a 2D-list
         last_move (tuple): row and column numbers of the last move made
+        rules (Rules): board shape and win length
 
     Returns:
         bool: Returns True if the game is over
@@ -154,31 +96,9 @@ def is_game_over(board, last_move):
         return False
     x, y = last_move
     token = board[x][y]
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1),
-                    (-1, -1), (1, 1), (1, -1), (-1, 1)]
-
-    for dx, dy in directions:
-        count = 1
-
-        nx, ny = x + dx, y + dy
-        while 0 <= nx < 6 and 0 <= ny < 7 and board[nx][ny] == token:
-            count += 1
-            nx += dx
-            ny += dy
-            if count >= 4:
-                return True
-
-        nx, ny = x - dx, y - dy
-        while 0 <= nx < 6 and 0 <= ny < 7 and board[nx][ny] == token:
-            count += 1
-            nx -= dx
-            ny -= dy
-            if count >= 4:
-                return True
-
-        if count < 4:
-            count = 1
-
+    for cells in rules.board_cell_windows[x][y]:
+        if all(board[row][col] == token for row, col in cells):
+            return True
     return False
 
 def is_valid_move(board, column):
@@ -206,6 +126,16 @@ def make_move(board, row, column, piece):
   
     board[row][column] = piece
 
+def undo_move(board, row, column):
+    """Removes the piece from a spesified row and column, reverses make_move
+
+    Args:
+        board (list): game board as a 2D-list
+        row (int): row where the piece was placed
+        column (int): column where the piece was placed
+    """
+
+    board[row][column] = 0
 
 def get_next_open_row(board, column):
     """Finds the lowest empty space in a column
@@ -218,24 +148,24 @@ def get_next_open_row(board, column):
         int: The row index where the piece can be placed
     """
     
-    for row in range(5, -1, -1):
+    for row in range(len(board) - 1, -1, -1):
         if board[row][column] == 0:
             return row
     return None
 
-def valid_moves(board):
+def valid_moves(board, rules=STANDARD):
     """Creates a list of valid columns where to place a piece
 
     Args:
         board (list): game board as a 2D-list
+        rules (Rules): board shape and win length
 
     Returns:
         list: list of column numbers where piece can be placed
     """
-    PREFERRED_COLS = [3, 2, 4, 1, 5, 0, 6]
-    return [col for col in PREFERRED_COLS if is_valid_move(board, col)]
+    return [col for col in rules.preferred_cols if is_valid_move(board, col)]
 
-def evaluate_position(board, piece, player_piece, ai_piece):
+def evaluate_position(board, piece, player_piece, ai_piece, rules=STANDARD):
     """Evaluates the board and returns a score based on the board state
 
     Args:
@@ -243,6 +173,7 @@ def evaluate_position(board, piece, player_piece, ai_piece):
         piece (int): Current players piece type which is evaluated
         player_piece (int): The player's piece
         ai_piece (int): The AI's piece
+        rules (Rules): board shape and win length
 
     Returns:
         int: Evaluated score of the board from the view of the current player
@@ -250,123 +181,110 @@ def evaluate_position(board, piece, player_piece, ai_piece):
 
     value = 0
     opponent_piece = player_piece if piece == ai_piece else ai_piece
+    scores = window_scores(rules.connect)
 
-    for row in board:
-        for col in range(4):
-            if row[col:col+4].count(piece) == 4:
-                value += 100
-            elif row[col:col+4].count(piece) == 3 and row[col:col+4].count(0) == 1:
-                value += 5
-            elif row[col:col+4].count(piece) == 2 and row[col:col+4].count(0) == 2:
-                value += 2
-            if row[col:col+4].count(opponent_piece) == 3 and row[col:col+4].count(0) == 1:
-                value -= 4
-            elif row[col:col+4].count(opponent_piece) == 2 and row[col:col+4].count(0) == 2:
-                value -= 2
-            
-
-    for col in range(7):
-        for row in range(3):
-            tokens = [board[row+i][col] for i in range(4)]
-            if tokens.count(piece) == 4:
-                value += 100
-            elif tokens.count(piece) == 3 and tokens.count(0) == 1:
-                value += 5
-            elif tokens.count(piece) == 2 and tokens.count(0) == 2:
-                value += 2
-            if tokens.count(opponent_piece) == 3 and tokens.count(0) == 1:
-                value -= 4
-            elif tokens.count(opponent_piece) == 2 and tokens.count(0) == 2:
-                value -= 2
-
-    for row in range(3, 6):
-        for col in range(4):
-            tokens = [board[row-i][col+i] for i in range(4)]
-            if tokens.count(piece) == 4:
-                value += 100
-            elif tokens.count(piece) == 3 and tokens.count(0) == 1:
-                value += 5
-            elif tokens.count(piece) == 2 and tokens.count(0) == 2:
-                value += 2
-            if tokens.count(opponent_piece) == 3 and tokens.count(0) == 1:
-                value -= 4
-            elif tokens.count(opponent_piece) == 2 and tokens.count(0) == 2:
-                value -= 2
-
-    for row in range(3):
-        for col in range(4):
-            tokens = [board[row+i][col+i] for i in range(4)]
-            if tokens.count(piece) == 4: 
-                value += 100
-            elif tokens.count(piece) == 3 and tokens.count(0) == 1:
-                value += 5
-            elif tokens.count(piece) == 2 and tokens.count(0) == 2:
-                value += 2
-            if tokens.count(opponent_piece) == 3 and tokens.count(0) == 1:
-                value -= 4
-            elif tokens.count(opponent_piece) == 2 and tokens.count(0) == 2:
-                value -= 2
+    for cells in rules.window_cells:
+        tokens = [board[row][col] for row, col in cells]
+        value += scores[tokens.count(piece)][tokens.count(opponent_piece)]
 
     return value
 
-def get_player_move():
-    return int(input("Choose your move(1-7):  ")) - 1
+def get_player_move(columns=7):
+    return int(input(f"Choose your move(1-{columns}):  ")) - 1
+
+def board_view(position, turn, player_piece, ai_piece):
+    """Converts the game position into a list board for printing
+
+    Args:
+        position (Position): current game position
+        turn (str): "PLAYER" or "AI" depending on who is to move
+        player_piece (int): Number for player piece
+        ai_piece (int): Number for ai piece
+
+    Returns:
+        list: game board as a 2D-list
+    """
+    if turn == "PLAYER":
+        return position.to_board(player_piece, ai_piece)
+    return position.to_board(ai_piece, player_piece)
 
 """Game loop for the Connect4 game"""
-def game_loop():
+def game_loop(trace=None, ponder=True, engine=None, rules=STANDARD):
+    """Plays one game between the player and ai on the command line
+
+    Args:
+        trace (JsonLinesTrace): sink for the search statistics of every ai move
+        ponder (bool): True to keep searching while the player thinks
+        engine (Engine): engine playing ai, such as mcts.MctsEngine, the
+            alpha-beta Engine with the opening book and the
+            tablebase if not given
+        rules (Rules): board shape and win length, the opening book and the
+            tablebase only cover the standard board
+    """
     PLAYER_PIECE = 1
     AI_PIECE = 2
     PLAYERS = ["AI", "PLAYER"]
     TURN = random.choice(PLAYERS)
 
-    BOARD = [[0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0]]
-
-    PREFERRED_COLS = [3, 2, 4, 1, 5, 0, 6]
+    POSITION = Position(rules)
+    if engine is not None:
+        ENGINE = engine
+    elif rules.is_standard:
+        ENGINE = Engine(book=load_book(), tablebase=load_tablebase())
+    else:
+        ENGINE = Engine()
 
     while True:
-        if full_board(BOARD):
+        if POSITION.is_draw():
             print("It's a draw!")
             break
 
         if TURN == "PLAYER":
-            print_board(BOARD)
+            print_board(board_view(POSITION, TURN, PLAYER_PIECE, AI_PIECE))
             try:
-                COLUMN = get_player_move()
-                if is_valid_move(BOARD, COLUMN) and COLUMN >= 0 and COLUMN <= 7:
-                    row = get_next_open_row(BOARD, COLUMN)
-                    make_move(BOARD, row, COLUMN, PLAYER_PIECE)
-                    if is_game_over(BOARD, (row, COLUMN)):
-                        print_board(BOARD)
+                COLUMN = get_player_move(rules.columns)
+                if 0 <= COLUMN < rules.columns and POSITION.can_play(COLUMN):
+                    won = POSITION.is_winning_move(COLUMN)
+                    POSITION.play(COLUMN)
+                    if won:
+                        print_board(board_view(POSITION, "AI", PLAYER_PIECE, AI_PIECE))
                         print("Game over!")
                         print("You win!")
                         break
                     TURN = "AI"
                 else:
                     print("Invalid move. Try again!")
-            except IndexError:
-                print("Please enter a number between 1 and 7")
             except ValueError:
-                print("Please enter a number between 1 and 7")
+                print(f"Please enter a number between 1 and {rules.columns}")
 
         if TURN == "AI":
-            COLUMN = iterative_deepening(
-                BOARD, float('-inf'), float('inf'), True,
-                5, PLAYER_PIECE, AI_PIECE)
-
-            if is_valid_move(BOARD, COLUMN + 1):
-                row = get_next_open_row(BOARD, COLUMN)
-                make_move(BOARD, row, COLUMN, AI_PIECE)
-                if is_game_over(BOARD, (row, COLUMN)):
-                    print_board(BOARD)
+            COLUMN = ENGINE.choose_move(POSITION, 5, trace=trace)
+
+            if POSITION.can_play(COLUMN):
+                won = POSITION.is_winning_move(COLUMN)
+                POSITION.play(COLUMN)
+                if won:
+                    print_board(board_view(POSITION, "PLAYER", PLAYER_PIECE, AI_PIECE))
                     print("Game over!")
                     print("You lose!")
                     break
                 TURN = "PLAYER"
+                if ponder:
+                    ENGINE.ponder(POSITION)
+
+    ENGINE.stop_pondering()
 
 if __name__=="__main__":
-    game_loop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Play Connect4 against ai")
+    parser.add_argument("--engine", choices=["alphabeta", "mcts"], default="alphabeta")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--columns", type=int, default=7)
+    parser.add_argument("--connect", type=int, default=4)
+    arguments = parser.parse_args()
+    try:
+        RULES = Rules(arguments.rows, arguments.columns, arguments.connect)
+    except ValueError as error:
+        parser.error(str(error))
+    if arguments.engine == "mcts" and not RULES.is_standard:
+        parser.error("mcts plays only the standard 6x7 board")
+    game_loop(engine=MctsEngine() if arguments.engine == "mcts" else None, rules=RULES)
@@ -0,0 +1,108 @@
+class Rules:
+    """Board shape and win length with every table derived from them
+
+    Bitboards give every column H1 = rows + 1 bits where the extra top bit
+    is always empty, so shifted masks never wrap from one column to the
+    next. A window is a line of `connect` cells in any direction; the
+    tables list the windows as bit indexes, as bitboard masks and as list
+    board coordinates, and map every cell to the windows through it, so
+    nothing about the shape is derived again while searching.
+    """
+
+    DIRECTIONS = ((0, 1), (1, 0), (-1, 1), (1, 1))
+
+    def __init__(self, rows=6, columns=7, connect=4):
+        """
+        Args:
+            rows (int): height of the board
+            columns (int): width of the board
+            connect (int): number of pieces in a row that wins
+        """
+        if rows < 1 or columns < 1 or not 2 <= connect <= max(rows, columns):
+            raise ValueError(f"no connect {connect} on a board of {rows} rows and "
+                             f"{columns} columns")
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.h1 = rows + 1
+        self.cells = rows * columns
+        self.bottom_mask = sum(1 << (col * self.h1) for col in range(columns))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.top_masks = [1 << (rows - 1 + col * self.h1) for col in range(columns)]
+        self.column_masks = [((1 << rows) - 1) << (col * self.h1) for col in range(columns)]
+        # Columns from the centre outwards, the left one first on a tie
+        self.preferred_cols = tuple(sorted(range(columns),
+                                           key=lambda col: (abs(2 * col - columns + 1), col)))
+        # Column of every column in the left-right mirror image, and the identity
+        self.mirror_columns = tuple(range(columns - 1, -1, -1))
+        self.column_order = tuple(range(columns))
+        # Bit index of every bit in the mirror image
+        self.mirror_bits = [(columns - 1 - bit // self.h1) * self.h1 + bit % self.h1
+                            for bit in range(columns * self.h1)]
+
+        self.window_cells = self._window_cells()
+        self.window_bits = [tuple(self.cell_bit(row, col) for row, col in cells)
+                            for cells in self.window_cells]
+        self.windows = [sum(1 << bit for bit in bits) for bits in self.window_bits]
+        # Indexes of the windows every cell belongs to, by bit index
+        self.cell_windows = [tuple(index for index, bits in enumerate(self.window_bits)
+                                   if bit in bits)
+                             for bit in range(columns * self.h1)]
+        # Cells of the windows every list board cell belongs to, by row and column
+        self.board_cell_windows = [[tuple(self.window_cells[index]
+                                          for index in self.cell_windows[self.cell_bit(row, col)])
+                                    for col in range(columns)] for row in range(rows)]
+
+    @property
+    def is_standard(self):
+        """True for the 6x7 board with four in a row, the only board of the book and tablebase"""
+        return (self.rows, self.columns, self.connect) == (6, 7, 4)
+
+    def cell_bit(self, row, column):
+        """Converts a list board coordinate into a bit index
+
+        Args:
+            row (int): row index of the list board, 0 is the top row
+            column (int): column index
+
+        Returns:
+            int: index of the bit representing the cell
+        """
+        return column * self.h1 + (self.rows - 1 - row)
+
+    def _window_cells(self):
+        """Lists the list board cells of every window of the board
+
+        Returns:
+            list: tuple of `connect` row and column pairs per window
+        """
+        windows = []
+        last = self.connect - 1
+        for row in range(self.rows):
+            for col in range(self.columns):
+                for d_row, d_col in self.DIRECTIONS:
+                    end_row, end_col = row + last * d_row, col + last * d_col
+                    if 0 <= end_row < self.rows and 0 <= end_col < self.columns:
+                        windows.append(tuple((row + i * d_row, col + i * d_col)
+                                             for i in range(self.connect)))
+        return windows
+
+
+# The standard board, its tables are also module constants for the code that only plays it
+STANDARD = Rules()
+WIDTH = STANDARD.columns
+HEIGHT = STANDARD.rows
+H1 = STANDARD.h1
+
+BOTTOM_MASK = STANDARD.bottom_mask
+BOARD_MASK = STANDARD.board_mask
+TOP_MASKS = STANDARD.top_masks
+COLUMN_MASKS = STANDARD.column_masks
+PREFERRED_COLS = STANDARD.preferred_cols
+MIRROR_COLUMNS = STANDARD.mirror_columns
+COLUMNS = STANDARD.column_order
+MIRROR_BITS = STANDARD.mirror_bits
+WINDOW_BITS = STANDARD.window_bits
+WINDOWS = STANDARD.windows
+CELL_WINDOWS = STANDARD.cell_windows
+cell_bit = STANDARD.cell_bit
@@ -0,0 +1,7 @@
+INF = float("inf")
+# The deadline of a search is checked once every CHECK_INTERVAL nodes
+CHECK_INTERVAL = 1024
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its deadline has passed or it is stopped"""
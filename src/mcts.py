@@ -0,0 +1,265 @@
+import math
+import random
+import threading
+import time
+from bitboard import winning_cells
+from geometry import WIDTH, HEIGHT, BOTTOM_MASK, BOARD_MASK, COLUMN_MASKS, PREFERRED_COLS
+from limits import INF
+from stats import SearchStats
+
+# Exploration constant of UCT
+EXPLORATION = math.sqrt(2)
+
+
+def playout(current, mask, moves, rng):
+    """Plays random moves on bitboards until the game ends
+
+    The moves are random except that an immediate win is always taken and
+    a single immediate win of the opponent is always blocked, which keeps
+    the results close to real play without slowing the playout down much.
+
+    Args:
+        current (int): pieces of the player to move
+        mask (int): all pieces
+        moves (int): number of pieces on the board
+        rng (Random): source of the random moves
+
+    Returns:
+        float: 1 if the player to move wins, 0 if it loses and 0.5 for a draw
+    """
+    side = 0
+    while moves < WIDTH * HEIGHT:
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        if winning_cells(current, mask) & possible:
+            return 1.0 - side
+        forced = winning_cells(current ^ mask, mask) & possible
+        if forced:
+            if forced & (forced - 1):
+                return float(side)
+            move = forced
+        else:
+            move = 0
+            while not move:
+                move = possible & COLUMN_MASKS[rng.randrange(WIDTH)]
+        current ^= mask
+        mask |= move
+        moves += 1
+        side ^= 1
+    return 0.5
+
+
+class Node:
+    """Node of the search tree, the position after `move` was played
+
+    `wins` counts the playout results from the view of the player who
+    played `move`, so the parent picks the child with the best ratio.
+    `untried` has a bit for every column that has no child yet and
+    `result` is the result of a finished game from the same view.
+    """
+
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins", "result")
+
+    def __init__(self, move, parent, untried, result=None):
+        """
+        Args:
+            move (int): column played to reach the node, None for the root
+            parent (Node): node of the position before the move
+            untried (int): bitmask of the playable columns
+            result (float): 1 for a win and 0.5 for a draw if the game ended, otherwise None
+        """
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+        self.result = result
+
+    def select(self):
+        """Picks the child with the highest upper confidence bound"""
+        scale = EXPLORATION * math.sqrt(math.log(self.visits))
+        best, best_value = None, -INF
+        for child in self.children:
+            value = child.wins / child.visits + scale / math.sqrt(child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+
+def playable_columns(mask):
+    """Returns a bitmask of the columns that are not full"""
+    possible = (mask + BOTTOM_MASK) & BOARD_MASK
+    return sum(1 << col for col in range(WIDTH) if possible & COLUMN_MASKS[col])
+
+
+class MctsEngine:
+    """Monte Carlo tree search with UCT behind the interface of Engine
+
+    Every iteration walks down the tree by the upper confidence bound,
+    expands one new move, plays a random game from there and counts the
+    result on the way back. The tree is kept between moves: the next search
+    starts from the node of the position actually reached if the tree has
+    it. The engine can ponder while the opponent thinks, which simply grows
+    the same tree.
+    """
+
+    def __init__(self, seed=None):
+        """
+        Args:
+            seed (int): seed of the random playouts, None for a random seed
+        """
+        self.rng = random.Random(seed)
+        self.root = None
+        self.root_position = None
+        self.pondering = None
+
+    def choose_move(self, position, time_limit, max_depth=None, max_nodes=INF, stats=None,
+                    trace=None, stop=None, batch_leaves=False):
+        """Searches the move of the player to move
+
+        Args:
+            position (Position): position where the engine is to move
+            time_limit (float): maximum time in seconds to search for the best move
+            max_depth (int): not used, the tree has no depth limit
+            max_nodes (int): number of playouts after which the search stops
+            stats (SearchStats): statistics to fill in, None to not collect them
+            trace (JsonLinesTrace): sink the statistics of the move are written to
+            stop (Event): event that aborts the search when set
+            batch_leaves (bool): not used, playouts are not evaluated
+
+        Returns:
+            int: Column number where the engine plays or None if the board is full
+        """
+        self.stop_pondering()
+        if position.is_draw():
+            return None
+        if trace is not None and stats is None:
+            stats = SearchStats()
+        start = time.monotonic()
+        root = self.reroot(position)
+        playouts = self.grow(root, start + time_limit, stop, max_nodes)
+        best = max(root.children, key=lambda child: (child.visits, child.wins))
+        if stats is not None:
+            stats.nodes += playouts
+            stats.seconds = time.monotonic() - start
+            stats.move = best.move
+            stats.source = "mcts"
+        if trace is not None:
+            trace.write(stats, moves=position.moves, key=position.key(), visits=root.visits)
+        return best.move
+
+    def reroot(self, position):
+        """Finds the node of a position in the kept tree or starts a new tree
+
+        The position may be the root itself or be reached from it by one or
+        two moves, the move of the engine and the reply of the opponent.
+
+        Args:
+            position (Position): position to search
+
+        Returns:
+            Node: root node of the position, detached from its old parent
+        """
+        key = position.key()
+        if self.root is not None and position.moves - self.root_position.moves in (0, 1, 2):
+            candidates = [(self.root, self.root_position)]
+            for _ in range(position.moves - self.root_position.moves):
+                found = []
+                for node, node_position in candidates:
+                    for child in node.children:
+                        child_position = node_position.copy()
+                        child_position.play(child.move)
+                        found.append((child, child_position))
+                candidates = found
+            for node, node_position in candidates:
+                if node_position.key() == key:
+                    node.parent = None
+                    self.root, self.root_position = node, position.copy()
+                    return node
+        self.root = Node(None, None, playable_columns(position.mask))
+        self.root_position = position.copy()
+        return self.root
+
+    def grow(self, root, deadline=INF, stop=None, max_playouts=INF):
+        """Runs iterations on the tree until the deadline, the stop event or the budget
+
+        At least one iteration is run, so the root always has a child.
+
+        Args:
+            root (Node): root node of the kept root position
+            deadline (float): time.monotonic() value when the search has to stop
+            stop (Event): event that stops the search when set
+            max_playouts (int): number of iterations to run at most
+
+        Returns:
+            int: number of iterations run
+        """
+        rng = self.rng
+        base = self.root_position
+        playouts = 0
+        while playouts < max_playouts:
+            node = root
+            current, mask, moves = base.current, base.mask, base.moves
+            # Selection: follow the best bounds through fully expanded nodes
+            while not node.untried and node.children and node.result is None:
+                node = node.select()
+                current ^= mask
+                mask |= ((mask + BOTTOM_MASK) & BOARD_MASK) & COLUMN_MASKS[node.move]
+                moves += 1
+            # Expansion: add one untried move
+            if node.result is None and node.untried:
+                untried = [col for col in PREFERRED_COLS if node.untried >> col & 1]
+                col = untried[rng.randrange(len(untried))]
+                node.untried &= ~(1 << col)
+                move = (mask + BOTTOM_MASK) & BOARD_MASK & COLUMN_MASKS[col]
+                result = None
+                if winning_cells(current, mask) & move:
+                    result = 1.0
+                current ^= mask
+                mask |= move
+                moves += 1
+                if result is None and moves == WIDTH * HEIGHT:
+                    result = 0.5
+                child = Node(col, node, 0 if result is not None else playable_columns(mask),
+                             result)
+                node.children.append(child)
+                node = child
+            # Simulation from the view of the player who moved into the node
+            if node.result is not None:
+                reward = node.result
+            else:
+                reward = 1.0 - playout(current, mask, moves, rng)
+            # Backpropagation, the reward flips with every level
+            while node is not None:
+                node.visits += 1
+                node.wins += reward
+                reward = 1.0 - reward
+                node = node.parent
+            playouts += 1
+            if not playouts % 64 and (time.monotonic() > deadline
+                                      or stop is not None and stop.is_set()):
+                break
+        return playouts
+
+    def ponder(self, position):
+        """Grows the tree of the position in the background while the opponent thinks
+
+        Args:
+            position (Position): position after the move of the engine, the opponent to move
+        """
+        self.stop_pondering()
+        if position.is_draw():
+            return
+        root = self.reroot(position)
+        stop = threading.Event()
+        thread = threading.Thread(target=self.grow, args=(root, INF, stop), daemon=True)
+        thread.start()
+        self.pondering = (thread, stop)
+
+    def stop_pondering(self):
+        """Stops growing the tree in the background, the grown tree is kept"""
+        if self.pondering is not None:
+            thread, stop = self.pondering
+            stop.set()
+            thread.join()
+            self.pondering = None
@@ -0,0 +1,140 @@
+from geometry import STANDARD
+from bitboard import winning_cells
+
+# Ordering scores of the move classes, from the first tried to the last
+WIN_BONUS = 1 << 40
+TT_BONUS = 1 << 39
+BLOCK_BONUS = 1 << 38
+KILLER_BONUSES = (1 << 37, 1 << 36)
+# Every new cell where the move would threaten to win is worth this much
+THREAT_BONUS = 1 << 24
+# Threats are only counted at nodes with at least this much depth left,
+# closer to the leaves finding them costs more than the cutoffs save
+THREAT_DEPTH = 4
+# History scores are halved when one of them reaches this limit, so they
+# never reach the threat bonus and old cutoffs fade out
+HISTORY_LIMIT = 1 << 20
+
+
+def centre_keys(rules):
+    """Builds the low bits of the ordering keys of every column
+
+    Args:
+        rules (Rules): board shape
+
+    Returns:
+        tuple: number of bits of the centre rank and the column together, the
+            mask of the column bits and the low bits of every column
+    """
+    column_shift = max(3, (rules.columns - 1).bit_length())
+    key_shift = column_shift + rules.columns.bit_length()
+    keys = [((rules.columns - rules.preferred_cols.index(col)) << column_shift) | col
+            for col in range(rules.columns)]
+    return key_shift, (1 << column_shift) - 1, keys
+
+
+# Bits of the centre rank and the column in an ordering key of the standard
+# board and the mask of the column
+KEY_SHIFT, COLUMN_BITS, _ = centre_keys(STANDARD)
+
+
+class MoveOrdering:
+    """Orders the moves of a node from the most to the least promising
+
+    Immediate wins come first, then the transposition table move, forced
+    blocks of the opponent's immediate wins, the two killer moves of the ply
+    and finally the other moves by the number of new threats they create and
+    by their history score. Equal moves are tried from the centre outwards.
+
+    Killer moves are kept per ply and history scores per colour and cell,
+    so they are shared by every iteration of iterative deepening. The
+    ordering keys of each ply are sorted in a list of their own, which keeps
+    ordering free of allocations. The column of a key is read with
+    `column_bits`, which is COLUMN_BITS on the standard board.
+    """
+
+    def __init__(self, rules=STANDARD):
+        """
+        Args:
+            rules (Rules): board shape and win length of the ordered positions
+        """
+        self.rules = rules
+        self.key_shift, self.column_bits, self.centre_keys = centre_keys(rules)
+        self.killers = [[-1, -1] for _ in range(rules.cells + 1)]
+        self.history = [[0] * (rules.columns * rules.h1) for _ in range(2)]
+        self.buffers = [[-1] * rules.columns for _ in range(rules.cells + 1)]
+
+    def order(self, position, tt_move, depth, ply, candidates=None):
+        """Sorts the moves of a position
+
+        Args:
+            position (Position): position to order the moves of
+            tt_move (int): best column stored in the transposition table or None
+            depth (int): remaining depth of the node
+            ply (int): distance from the root of the search
+            candidates (int): bitboard of the cells of the moves to order, other
+                moves are left out, all moves by default
+
+        Returns:
+            list: ordering keys, best first. The column of a key is
+                `key & self.column_bits` and a negative key ends the moves.
+        """
+        rules = self.rules
+        if candidates is None:
+            candidates = rules.board_mask
+        top_masks = rules.top_masks
+        key_shift = self.key_shift
+        centre = self.centre_keys
+        buffer = self.buffers[ply]
+        current = position.current
+        mask = position.mask
+        heights = position.heights
+        own_wins = position.own_winning_cells()
+        opponent_wins = position.opponent_winning_cells()
+        history = self.history[position.moves & 1]
+        killers = self.killers[ply]
+        for col in range(rules.columns):
+            bit = heights[col]
+            move = 1 << bit
+            if mask & top_masks[col] or not candidates & move:
+                buffer[col] = -1
+                continue
+            if own_wins & move:
+                score = WIN_BONUS
+            elif col == tt_move:
+                score = TT_BONUS
+            elif opponent_wins & move:
+                score = BLOCK_BONUS
+            elif col == killers[0]:
+                score = KILLER_BONUSES[0]
+            elif col == killers[1]:
+                score = KILLER_BONUSES[1]
+            elif depth >= THREAT_DEPTH:
+                threats = winning_cells(current | move, mask | move, rules) & ~own_wins
+                score = threats.bit_count() * THREAT_BONUS + history[bit]
+            else:
+                score = history[bit]
+            buffer[col] = (score << key_shift) | centre[col]
+        buffer.sort(reverse=True)
+        return buffer
+
+    def cutoff(self, position, col, depth, ply):
+        """Records a move that caused a beta cutoff
+
+        Args:
+            position (Position): position where the move was played
+            col (int): column of the move
+            depth (int): remaining depth of the node
+            ply (int): distance from the root of the search
+        """
+        killers = self.killers[ply]
+        if killers[0] != col:
+            killers[1] = killers[0]
+            killers[0] = col
+        history = self.history[position.moves & 1]
+        bit = position.heights[col]
+        history[bit] += depth * depth
+        if history[bit] >= HISTORY_LIMIT:
+            for colour_history in self.history:
+                for index in range(len(colour_history)):
+                    colour_history[index] >>= 1
@@ -0,0 +1,112 @@
+import multiprocessing
+import time
+import search
+from transposition import TranspositionTable, table_slots
+
+# Transposition table and stop event of a helper process, set by _init_helper
+_helper = {}
+
+
+def _init_helper(memory, size_mb, stop):
+    """Attaches a helper process to the shared transposition table
+
+    Args:
+        memory (RawArray): shared memory holding the table
+        size_mb (float): memory budget the table was created with
+        stop (Event): event set when the helpers have to stop
+    """
+    _helper["table"] = TranspositionTable(size_mb, buffer=memory)
+    _helper["stop"] = stop
+
+
+def _helper_search(position, max_player, deadline, start_depth, max_depth):
+    """Runs iterative deepening in a helper process
+
+    Returns:
+        tuple: best column, deepest completed depth and its score
+    """
+    return search.deepen(position, -search.INF, search.INF, max_player, _helper["table"],
+                         deadline, start_depth, max_depth, _helper["stop"])
+
+
+class ParallelSearch:
+    """Lazy SMP search over a pool of processes
+
+    The main search runs in the calling process and `workers - 1` helper
+    processes search the same position, every other helper starting one
+    ply deeper. All of them share one transposition table in shared memory,
+    so the main search keeps cutting off on positions the helpers have
+    already searched. The helpers are stopped when the main search ends.
+    """
+
+    def __init__(self, workers, size_mb=16):
+        """
+        Args:
+            workers (int): number of processes searching, including this one
+            size_mb (float): memory budget of the shared transposition table
+        """
+        self.workers = workers
+        self.memory = multiprocessing.RawArray("q", 2 * table_slots(size_mb))
+        self.table = TranspositionTable(size_mb, buffer=self.memory)
+        self.stop = multiprocessing.Event()
+        self.pool = None
+        if workers > 1:
+            self.pool = multiprocessing.Pool(workers - 1, _init_helper,
+                                             (self.memory, size_mb, self.stop))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stops the helper processes"""
+        if self.pool is not None:
+            self.stop.set()
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, position, max_player, time_limit=None, max_depth=None):
+        """Searches the position with every process
+
+        Args:
+            position (Position): position where ai is to move if max_player is True
+            max_player (bool): True if its ai's turn
+            time_limit (float): maximum time in seconds, None to search until max_depth
+            max_depth (int): depth of the last iteration, None to search until the time limit
+
+        Returns:
+            tuple: best column, deepest completed depth and its score
+        """
+        deadline = search.INF if time_limit is None else time.monotonic() + time_limit
+        self.stop.clear()
+        helpers = []
+        for index in range(self.workers - 1):
+            start_depth = 4 if index % 2 == 0 else 3
+            helpers.append(self.pool.apply_async(
+                _helper_search, (position, max_player, deadline, start_depth, max_depth)))
+        result = search.deepen(position, -search.INF, search.INF, max_player, self.table,
+                               deadline, max_depth=max_depth)
+        self.stop.set()
+        for helper in helpers:
+            helper.wait()
+        return result
+
+
+def parallel_iterative_deepening(position, max_player, time_limit, workers):
+    """Iterative deepening over a pool of processes sharing one transposition table
+
+    Args:
+        position (Position): position where ai is to move if max_player is True
+        max_player (bool): True if its ai's turn
+        time_limit (float): maximum time in seconds to search for the best move
+        workers (int): number of processes searching
+
+    Returns:
+        int: Column number where ai plays its piece or None if the board is full
+    """
+    with ParallelSearch(workers) as parallel:
+        best_col, _, _ = parallel.search(position, max_player, time_limit)
+    return best_col
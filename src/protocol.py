@@ -0,0 +1,243 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from limits import INF
+
+# Seconds a "go" without limits searches
+DEFAULT_MOVE_TIME = 1.0
+
+
+class EngineProtocol:
+    """Resident engine driven by text commands, one per line, in the spirit of UCI
+
+    Commands:
+        ready                       answers "readyok"
+        newgame                     starts a new game from the empty board
+        position [startpos] [moves 3 3 2 4]
+                                    sets the position from columns 0-6, as
+                                    separate tokens or as one move string
+        go [movetime ms] [depth n] [nodes n] [infinite]
+                                    searches the position in the background
+                                    and answers "info" lines and "bestmove"
+        stop                        ends the search, its best move is answered
+        stats                       answers "stats" and the JSON statistics
+        quit                        ends the process
+
+    The engine, its transposition table, the opening book and the tablebase
+    stay loaded between commands and games. The search modules are imported
+    by the first command that needs them, so "ready" is answered before the
+    engine is loaded. Errors are answered with an "error" line and leave
+    the state as it was.
+    """
+
+    def __init__(self, output=sys.stdout, engine="alphabeta"):
+        """
+        Args:
+            output: text file the responses are written to
+            engine (str): "alphabeta" for the alpha-beta Engine or "mcts" for MctsEngine
+        """
+        self.output = output
+        self.kind = engine
+        self.engine = None
+        self.position = None
+        self.moves = []
+        self.won = False
+        self.search = None
+        self.stop = threading.Event()
+        self.stats = None
+        self.searches = 0
+        self.nodes = 0
+        self.lock = threading.Lock()
+        self.commands = {
+            "ready": self.ready,
+            "newgame": self.new_game,
+            "position": self.set_position,
+            "go": self.go,
+            "stop": self.stop_search,
+            "stats": self.report_stats,
+        }
+
+    def send(self, line):
+        """Writes a response line, the search thread and commands share the output"""
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, lines):
+        """Handles commands until "quit" or the end of the input
+
+        Args:
+            lines (iterable): command lines, for example sys.stdin
+        """
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop_search()
+        if self.engine is not None:
+            self.engine.stop_pondering()
+
+    def handle(self, line):
+        """Handles one command line
+
+        Args:
+            line (str): the command and its arguments separated by white space
+
+        Returns:
+            bool: False if the command was "quit"
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        if tokens[0] == "quit":
+            return False
+        command = self.commands.get(tokens[0])
+        if command is None:
+            self.send(f"error unknown command {tokens[0]}")
+            return True
+        try:
+            command(tokens[1:])
+        except ValueError as error:
+            self.send(f"error {error}")
+        return True
+
+    def ready(self, _arguments):
+        """Answers once every earlier command has been handled"""
+        self.send("readyok")
+
+    def load_engine(self):
+        """Creates the engine and the empty position on first use"""
+        if self.engine is not None:
+            return
+        # pylint: disable=import-outside-toplevel
+        from bitboard import Position
+        if self.kind == "mcts":
+            from mcts import MctsEngine
+            self.engine = MctsEngine()
+        else:
+            from book import load_book
+            from engine import Engine
+            from tablebase import load_tablebase
+            self.engine = Engine(book=load_book(), tablebase=load_tablebase())
+        self.position = Position()
+
+    def new_game(self, _arguments):
+        """Stops the search and goes back to the empty board, the caches are kept"""
+        self.stop_search()
+        self.load_engine()
+        self.engine.stop_pondering()
+        self.set_position([])
+
+    def set_position(self, arguments):
+        """Sets the position from the empty board and a list of moves
+
+        Args:
+            arguments (list): tokens after "position"
+        """
+        if arguments[:1] == ["startpos"]:
+            arguments = arguments[1:]
+        if arguments[:1] == ["moves"]:
+            arguments = arguments[1:]
+        elif arguments:
+            raise ValueError(f"expected moves, got {arguments[0]}")
+        self.stop_search()
+        self.load_engine()
+        from codec import moves_from_string  # pylint: disable=import-outside-toplevel
+        moves = moves_from_string("".join(arguments))
+        position = type(self.position)()
+        won = False
+        for number, col in enumerate(moves):
+            if won or not position.can_play(col):
+                raise ValueError(f"illegal move {col} at move {number + 1}")
+            won = position.is_winning_move(col)
+            position.play(col)
+        self.position, self.moves, self.won = position, moves, won
+
+    def go(self, arguments):
+        """Starts searching the position in a thread
+
+        Args:
+            arguments (list): tokens after "go"
+        """
+        if self.search is not None and self.search.is_alive():
+            raise ValueError("a search is running")
+        time_limit, max_depth, max_nodes = DEFAULT_MOVE_TIME, None, INF
+        tokens = iter(arguments)
+        for token in tokens:
+            if token == "infinite":
+                time_limit = INF
+                continue
+            if token not in ("movetime", "depth", "nodes"):
+                raise ValueError(f"unknown go option {token}")
+            value = next(tokens, None)
+            if value is None or not value.isdigit():
+                raise ValueError(f"{token} needs a number")
+            if token == "movetime":
+                time_limit = int(value) / 1000
+            elif token == "depth":
+                max_depth = int(value)
+            else:
+                max_nodes = int(value)
+        self.load_engine()
+        if self.won or self.position.is_draw():
+            self.send("bestmove none")
+            return
+        self.stop.clear()
+        self.search = threading.Thread(target=self.run_search,
+                                       args=(self.position.copy(), time_limit, max_depth,
+                                             max_nodes), daemon=True)
+        self.search.start()
+
+    def run_search(self, position, time_limit, max_depth, max_nodes):
+        """Searches a position and answers its statistics and best move
+
+        Args:
+            position (Position): copy of the position to search
+            time_limit (float): seconds the search may take
+            max_depth (int): depth of the last iteration, None for no limit
+            max_nodes (int): node budget of the search
+        """
+        from stats import SearchStats  # pylint: disable=import-outside-toplevel
+        stats = SearchStats()
+        start = time.monotonic()
+        try:
+            column = self.engine.choose_move(position, time_limit, max_depth=max_depth,
+                                             max_nodes=max_nodes, stats=stats, stop=self.stop)
+        except Exception as error:  # pylint: disable=broad-except
+            # The client waits for a best move, so a failed search still answers one
+            self.send(f"error search failed: {error}\nbestmove none")
+            return
+        stats.seconds = stats.seconds or time.monotonic() - start
+        self.stats = stats
+        self.searches += 1
+        self.nodes += stats.nodes
+        lines = []
+        for iteration in stats.iterations:
+            pv = " ".join(map(str, iteration["pv"]))
+            lines.append(f"info depth {iteration['depth']} score {iteration['score']} "
+                         f"nodes {iteration['nodes']} time {round(iteration['seconds'] * 1000)} "
+                         f"pv {pv}".rstrip())
+        lines.append(f"bestmove {column}")
+        self.send("\n".join(lines))
+
+    def stop_search(self, _arguments=()):
+        """Ends the running search, which answers its best move before this returns"""
+        if self.search is not None:
+            self.stop.set()
+            self.search.join()
+            self.search = None
+
+    def report_stats(self, _arguments):
+        """Answers the statistics of the last search and the totals of the process"""
+        report = {"searches": self.searches, "nodes": self.nodes, "moves": self.moves,
+                  "last": None if self.stats is None else self.stats.as_dict()}
+        self.send("stats " + json.dumps(report))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connect4 engine speaking a line protocol "
+                                                 "on standard input and output")
+    parser.add_argument("--engine", choices=["alphabeta", "mcts"], default="alphabeta")
+    arguments = parser.parse_args()
+    EngineProtocol(engine=arguments.engine).run(sys.stdin)
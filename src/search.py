@@ -0,0 +1,613 @@
+import random
+import time
+from geometry import WIDTH, COLUMN_MASKS, PREFERRED_COLS, STANDARD
+from book import known_move
+from limits import INF, CHECK_INTERVAL, SearchTimeout
+from ordering import MoveOrdering
+from solver import Solver, SOLVER_EMPTY_CELLS, SOLVED_KEY
+from stats import SearchStats, principal_variation
+from transposition import (TranspositionTable, EXACT, LOWER, UPPER, MAX_DEPTH, MOVE_MASK,
+                           entry_score, entry_depth, entry_flag, entry_move)
+
+WIN_SCORE = 1000
+# Share of the time limit the endgame solver may use before the search takes over
+SOLVER_TIME_SHARE = 0.5
+# Half width of the first window around the score of the previous iteration
+ASPIRATION_WINDOW = 2
+# Scores in the table are from the view of ai, so the key of a position
+# depends on which colour ai plays. Otherwise a table kept over games where
+# ai plays both colours would mix up the views.
+PERSPECTIVE_KEYS = (0, random.Random(20240502).getrandbits(63))
+
+
+def book_move(position, book=None):
+    """Finds a move for the position without searching
+
+    The book is consulted first, positions it does not hold can still have
+    a proven move, see book.known_move.
+
+    Args:
+        position (Position): current position
+        book (OpeningBook): opening book to look the position up from
+
+    Returns:
+        int: Column number or None if the move has to be searched
+    """
+    if book is not None:
+        entry = book.lookup(position)
+        if entry is not None:
+            return entry[0]
+    return known_move(position)
+
+
+def iterative_deepening(position, alpha, beta, max_player, time_limit, table=None, book=None,
+                        solver=None, solver_threshold=SOLVER_EMPTY_CELLS, stats=None,
+                        trace=None, max_depth=None, batch_leaves=False, max_nodes=INF,
+                        stop=None, tablebase=None):
+    """Iterative deepening with minimax and alpha-beta-pruning on a bitboard position
+
+    Positions with at most solver_threshold empty cells are solved exactly
+    instead, which prefers the fastest win and the slowest loss. The solver
+    gets SOLVER_TIME_SHARE of the time limit, and if it runs out of time,
+    the rest is used for the normal search. The stop event and the node
+    budget abort the solver like the search, and the search only gets the
+    nodes the solver left. A position whose children are
+    all in the tablebase is played from it without searching.
+
+    Args:
+        position (Position): position where ai is to move if max_player is True
+        alpha (float): Alpha value for alpha-beta-pruning
+        beta (float): Beta value for alpha-beta-pruning
+        max_player (bool): True if its ai's turn
+        time_limit (float): maximum time in seconds to search for the best move
+        table (TranspositionTable): table to use, a new one is created if not given
+        book (OpeningBook): opening book consulted before searching
+        solver (Solver): endgame solver to use, a new one sharing the table is created if
+            needed and not given
+        solver_threshold (int): largest number of empty cells solved exactly
+        stats (SearchStats): statistics to fill in, None to not collect them
+        trace (JsonLinesTrace): sink the statistics of the move are written to
+        max_depth (int): depth of the last iteration, None to search until the time limit
+        batch_leaves (bool): True to evaluate the leaves of a node as one NumPy batch
+        max_nodes (int): node budget of the search
+        stop (Event): event that aborts the search when set, the best move found so far is used
+        tablebase (Tablebase): exact scores of endgame positions read at any node of the search
+
+    Returns:
+        int: Column number where ai plays its piece or None if the board is full
+    """
+    if trace is not None and stats is None:
+        stats = SearchStats()
+    start = time.monotonic()
+    deadline = start + time_limit
+    best_col = book_move(position, book)
+    source = "book"
+    if best_col is None and tablebase is not None:
+        solved = tablebase.best_move(position)
+        if solved is not None:
+            best_col, source = solved[0], "tablebase"
+    if table is None:
+        table = TranspositionTable()
+    if best_col is None and position.rules.cells - position.moves <= solver_threshold:
+        if solver is None:
+            solver = Solver(table, tablebase)
+        nodes_before = solver.nodes
+        try:
+            best_col, _ = solver.best_move(position, start + time_limit * SOLVER_TIME_SHARE,
+                                           stop, max_nodes)
+            source = "solver"
+        except SearchTimeout:
+            pass
+        # The node budget is shared with the search that takes over
+        max_nodes -= solver.nodes - nodes_before
+        if stats is not None:
+            stats.nodes += solver.nodes - nodes_before
+
+    if best_col is None:
+        best_col, _, _ = deepen(position, alpha, beta, max_player, table, deadline,
+                                stop=stop, max_depth=max_depth, stats=stats,
+                                batch_leaves=batch_leaves, max_nodes=max_nodes,
+                                tablebase=tablebase, solved_cells=solver_threshold)
+        source = "search"
+
+    if stats is not None:
+        stats.seconds = time.monotonic() - start
+        stats.move = best_col
+        stats.source = source
+    if trace is not None:
+        trace.write(stats, moves=position.moves, key=position.key())
+    return best_col
+
+
+def deepen(position, alpha, beta, max_player, table, deadline, start_depth=3, max_depth=None,
+           stop=None, stats=None, batch_leaves=False, max_nodes=INF, tablebase=None,
+           solved_cells=0):
+    """Runs searches of growing depth until the deadline or the depth limit
+
+    The deadline is hard: it is checked inside the search. An iteration
+    that runs out of time is aborted and its best root move is used if that
+    move was searched completely. A new iteration is not started if the
+    growth of the previous iterations predicts that it cannot finish in the
+    remaining time.
+
+    Args:
+        position (Position): position where ai is to move if max_player is True
+        alpha (float): Alpha value for alpha-beta-pruning
+        beta (float): Beta value for alpha-beta-pruning
+        max_player (bool): True if its ai's turn
+        table (TranspositionTable): table to use
+        deadline (float): time.monotonic() value when the search has to stop
+        start_depth (int): depth of the first iteration
+        max_depth (int): depth of the last iteration, None to search until the deadline
+        stop (Event): event that aborts the search when set
+        stats (SearchStats): statistics to fill in, None to not collect them
+        batch_leaves (bool): True to evaluate the leaves of a node as one NumPy batch
+        max_nodes (int): node budget, the search is aborted like at the deadline when it is used up
+        tablebase (Tablebase): exact scores of endgame positions, None to search them
+        solved_cells (int): positions with at most this many empty cells are
+            looked up from the solver entries of the table
+
+    Returns:
+        tuple: best column (None if the board is full), deepest completed depth
+            and the score of that depth
+    """
+    moves = position.valid_moves()
+    if not moves:
+        return None, 0, 0
+    searcher = Search(table, batch_leaves, deadline, stop, stats=stats, max_nodes=max_nodes,
+                      perspective=perspective_key(position, max_player), tablebase=tablebase,
+                      rules=position.rules, solved_cells=solved_cells)
+    # An aborted search leaves its moves on the board, so search a copy
+    position = position.copy()
+    last_depth = position.rules.cells - position.moves
+    if max_depth is not None:
+        last_depth = min(last_depth, max_depth)
+    best_col = moves[0]
+    completed = 0
+    value = 0
+    # Scores swing between odd and even depths, so the window of an
+    # iteration is centred on the score of the same parity
+    scores = {}
+    depth = min(start_depth, last_depth)
+    last_nodes = 0
+    while True:
+        iteration_start = time.monotonic()
+        nodes_before = searcher.nodes
+        leaves_before = stats.leaves if stats is not None else 0
+        try:
+            score = searcher.aspiration(position, depth, alpha, beta, max_player,
+                                        scores.get(depth - 2))
+        except SearchTimeout:
+            if searcher.root_move is not None:
+                best_col = searcher.root_move
+            break
+        finally:
+            if stats is not None:
+                stats.nodes += searcher.nodes - nodes_before
+        completed = depth
+        value = score
+        scores[depth] = score
+        if searcher.best_moves[0] is not None:
+            best_col = searcher.best_moves[0]
+        if stats is not None:
+            stats.add_iteration(depth, searcher.nodes - nodes_before,
+                                stats.leaves - leaves_before,
+                                time.monotonic() - iteration_start, value, best_col,
+                                principal_variation(position, table, depth,
+                                                    searcher.perspective))
+        if depth >= last_depth or abs(value) >= WIN_SCORE:
+            break
+
+        now = time.monotonic()
+        nodes = searcher.nodes - nodes_before
+        branching = nodes / last_nodes if last_nodes else 1
+        if now + (now - iteration_start) * branching > deadline:
+            break
+        last_nodes = nodes
+        depth += 1
+    return best_col, completed, value
+
+
+def perspective_key(position, max_player):
+    """Returns the key xored into the table keys of a search
+
+    Args:
+        position (Position): root position of the search
+        max_player (bool): True if its ai's turn at the root
+
+    Returns:
+        int: key of the colour ai plays
+    """
+    colour = position.moves & 1
+    return PERSPECTIVE_KEYS[colour if max_player else 1 - colour]
+
+
+def minimax(position, depth, alpha, beta, max_player, table, batch_leaves=False):
+    """Minimax with alpha-beta-pruning on a bitboard position
+
+    Args:
+        position (Position): current position
+        depth (int): Current depth limit for the algorithm
+        alpha (float): Alpha value for alpha-beta-pruning
+        beta (float): Beta value for alpha-beta-pruning
+        max_player (bool): True if its ai's turn
+        table (TranspositionTable): scores and best moves of searched positions
+        batch_leaves (bool): True to evaluate the leaves of a node as one NumPy batch
+
+    Returns:
+        tuple: Contains the best column to play the move and evaluation score for that move
+    """
+    searcher = Search(table, batch_leaves, perspective=perspective_key(position, max_player),
+                      rules=position.rules)
+    value = searcher.minimax(position, depth, alpha, beta, max_player, 0)
+    return searcher.best_moves[0], value
+
+
+def move_orders():
+    """Builds the order of columns to try for every possible table move of the standard board
+
+    Returns:
+        list: tuple of columns for each table move, the last one is used
+            when the table has no move for the position
+    """
+    orders = [tuple([move] + [col for col in PREFERRED_COLS if col != move])
+              for move in range(WIDTH)]
+    orders.append(PREFERRED_COLS)
+    return orders
+
+
+MOVE_ORDERS = move_orders()
+
+
+class Search:
+    """State shared by the nodes of one search
+
+    Moves are played into the searched position and undone on the way back,
+    so a search allocates no boards. The moves of a node are ordered by
+    `ordering`, whose killer moves and history scores are shared by every
+    search run with this object. Columns are read by index from the sorted
+    keys, which keeps the loops free of iterator objects too. The best
+    column of every node is written into `best_moves` by ply and the best
+    completely searched column of the root into `root_move`, but only once
+    its score beats the window: a score below it is an upper bound.
+
+    With `batch_leaves` the children of depth 1 nodes are scored together
+    with the NumPy evaluator in batch.py instead of the running scores.
+    Nodes below the root that `tablebase` covers return its result as a
+    won, drawn or lost score without searching. So do nodes with at most
+    `solved_cells` empty cells that a solver sharing the table has proven
+    won, drawn or lost, see solver.SOLVED_KEY.
+
+    The board shape and the win length come from `rules`, which has to be
+    the rules of the searched positions. Masks, column orders and the number
+    of cells are read from its tables, so every board is searched the same
+    way; only the batched evaluator is limited to the standard board.
+    """
+
+    def __init__(self, table, batch_leaves=False, deadline=INF, stop=None, ordering=None,
+                 stats=None, max_nodes=INF, perspective=0, tablebase=None, rules=STANDARD,
+                 solved_cells=0):
+        """
+        Args:
+            table (TranspositionTable): scores and best moves of searched positions
+            batch_leaves (bool): True to evaluate the leaves of a node as one batch
+            deadline (float): time.monotonic() value after which SearchTimeout is raised
+            stop (Event): event that raises SearchTimeout when set
+            ordering (MoveOrdering): move ordering to use, a new one is created if not given
+            stats (SearchStats): counters to update, None to not count
+            max_nodes (int): number of nodes after which SearchTimeout is raised
+            perspective (int): key of the colour ai plays, see perspective_key
+            tablebase (Tablebase): exact scores of endgame positions, None to search them
+            rules (Rules): board shape and win length of the searched positions
+            solved_cells (int): largest number of empty cells of the positions
+                looked up from the solver entries of the table
+        """
+        if rules.columns > MOVE_MASK:
+            raise ValueError(f"the table stores moves of at most {MOVE_MASK} columns")
+        if batch_leaves and not rules.is_standard:
+            raise ValueError("batched evaluation only scores the standard board")
+        self.rules = rules
+        self.table = table
+        self.ordering = MoveOrdering(rules) if ordering is None else ordering
+        self.stats = stats
+        self.max_nodes = max_nodes
+        self.perspective = perspective
+        self.tablebase = tablebase
+        # Positions with at least this many moves can have solver entries
+        self.solved_moves = rules.cells - solved_cells
+        self.best_moves = [None] * (rules.cells + 1)
+        self.nodes = 0
+        self.deadline = deadline
+        self.stop = stop
+        self.root_move = None
+        self.ai_colour = 0
+        self.batch = None
+        if batch_leaves:
+            # Imported here so that NumPy is only needed for batched evaluation
+            import batch  # pylint: disable=import-outside-toplevel
+            self.batch = batch
+
+    def aspiration(self, position, depth, alpha, beta, max_player, guess=None):
+        """Searches the root with a narrow window around the score of the last iteration
+
+        A window that the score falls outside of is widened on that side,
+        twice as much every time, until the score is inside it.
+
+        Args:
+            position (Position): root position, restored before returning
+            depth (int): depth of the iteration
+            alpha (float): Alpha value for alpha-beta-pruning
+            beta (float): Beta value for alpha-beta-pruning
+            max_player (bool): True if its ai's turn
+            guess (int): score of the previous iteration, None to search the full window
+
+        Returns:
+            int: evaluation score of the position from the view of ai
+        """
+        low, high = alpha, beta
+        if guess is not None and abs(guess) < WIN_SCORE:
+            low = max(alpha, guess - ASPIRATION_WINDOW)
+            high = min(beta, guess + ASPIRATION_WINDOW)
+        window = ASPIRATION_WINDOW
+        while True:
+            self.root_move = None
+            score = self.minimax(position, depth, low, high, max_player, 0)
+            if low > alpha and score <= low:
+                low = max(alpha, score - window)
+            elif high < beta and score >= high:
+                high = min(beta, score + window)
+            else:
+                return score
+            if self.stats is not None:
+                self.stats.researches += 1
+            window *= 2
+
+    def minimax(self, position, depth, alpha, beta, max_player, ply):
+        """Minimax with alpha-beta-pruning that plays and undoes moves in place
+
+        The search itself is a negamax, this converts the window and the
+        score from and to the view of ai.
+
+        Args:
+            position (Position): current position, restored before returning
+            depth (int): Current depth limit for the algorithm
+            alpha (float): Alpha value for alpha-beta-pruning
+            beta (float): Beta value for alpha-beta-pruning
+            max_player (bool): True if its ai's turn
+            ply (int): distance from the root of the search
+
+        Returns:
+            int: evaluation score of the position from the view of ai
+        """
+        mover = position.moves & 1
+        self.ai_colour = mover if max_player else mover ^ 1
+        if max_player:
+            return self.negamax(position, depth, alpha, beta, ply)
+        return -self.negamax(position, depth, -beta, -alpha, ply)
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        """Principal variation search that plays and undoes moves in place
+
+        Scores are from the view of the player to move. The first move of a
+        node is searched with the full window and the others with a null
+        window that only tells whether they beat the best move so far. A
+        move that does is searched again with the full window. Leaves are
+        evaluated from the view of ai and negated for the other player, so
+        the scores match a minimax with the same evaluation.
+
+        Before searching any move, a node with an immediate win returns it,
+        a node facing two immediate wins of the opponent or only moves right
+        below the opponent's winning cells is lost, and a single threat
+        leaves the block as the only move. Moves below a winning cell of the
+        opponent are not searched.
+
+        Args:
+            position (Position): current position, restored before returning
+            depth (int): Current depth limit for the algorithm
+            alpha (float): Alpha value for alpha-beta-pruning
+            beta (float): Beta value for alpha-beta-pruning
+            ply (int): distance from the root of the search
+
+        Returns:
+            int: evaluation score of the position
+        """
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL and (
+                self.nodes >= self.max_nodes or time.monotonic() > self.deadline
+                or self.stop is not None and self.stop.is_set()):
+            raise SearchTimeout()
+        best_moves = self.best_moves
+        best_moves[ply] = None
+        if position.is_draw():
+            return 0
+
+        stats = self.stats
+        if depth == 0:
+            if stats is not None:
+                stats.leaves += 1
+            value = position.evaluate(self.ai_colour == 0)
+            return value if position.moves & 1 == self.ai_colour else -value
+
+        table = self.table
+        rules = self.rules
+        # A position and its mirror image share one entry under the smaller
+        # hash, with the moves of the entry stored for that one
+        if position.mirror_hash < position.hash:
+            key = position.mirror_hash ^ self.perspective
+            columns = rules.mirror_columns
+        else:
+            key = position.hash ^ self.perspective
+            columns = rules.column_order
+
+        # Immediate wins and losses are known from the winning cells
+        # without searching, see Position.wins
+        moves = position.moves
+        colour = moves & 1
+        possible = (position.mask + rules.bottom_mask) & rules.board_mask
+        own_wins = position.wins[2 * moves + colour]
+        if own_wins & possible:
+            cell = own_wins & possible
+            column = ((cell & -cell).bit_length() - 1) // rules.h1
+            table.store(key, WIN_SCORE, MAX_DEPTH, EXACT, columns[column])
+            best_moves[ply] = column
+            return WIN_SCORE
+        opponent_wins = position.wins[2 * moves + 1 - colour]
+        forced = opponent_wins & possible
+        if forced:
+            possible = forced
+        # A move right below a winning cell of the opponent lets it win there
+        candidates = possible & ~(opponent_wins >> 1)
+        if forced & (forced - 1) or not candidates:
+            column = ((possible & -possible).bit_length() - 1) // rules.h1
+            table.store(key, -WIN_SCORE, MAX_DEPTH, EXACT, columns[column])
+            best_moves[ply] = column
+            if ply == 0:
+                self.root_move = column
+            return -WIN_SCORE
+
+        tablebase = self.tablebase
+        if ply and tablebase is not None and rules.cells - moves <= tablebase.empty_cells:
+            solved = tablebase.probe(position)
+            if solved is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                return WIN_SCORE if solved > 0 else -WIN_SCORE if solved < 0 else 0
+        if ply and moves >= self.solved_moves:
+            # Bounds of the solver only give a result when they prove a win or a loss
+            solved = table.probe(key ^ self.perspective ^ SOLVED_KEY)
+            if solved is not None:
+                score = entry_score(solved)
+                flag = entry_flag(solved)
+                if flag == EXACT or flag == LOWER and score > 0 or flag == UPPER and score < 0:
+                    return WIN_SCORE if score > 0 else -WIN_SCORE if score < 0 else 0
+
+        entry = table.probe(key)
+        best_col = None
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            best_col = entry_move(entry)
+            if best_col is not None:
+                best_col = columns[best_col]
+            if entry_depth(entry) >= depth:
+                score = entry_score(entry)
+                flag = entry_flag(entry)
+                if flag == EXACT:
+                    best_moves[ply] = best_col
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    best_moves[ply] = best_col
+                    return score
+
+        if depth == 1 and self.batch is not None:
+            order = MOVE_ORDERS[WIDTH if best_col is None else best_col]
+            return self.frontier(position, order, alpha, beta, key, columns, candidates, ply)
+
+        alpha_orig = alpha
+        ordering = self.ordering
+        order = ordering.order(position, best_col, depth, ply, candidates)
+        column_bits = ordering.column_bits
+        if stats is not None:
+            stats.expanded += 1
+
+        value = -INF
+        column = 0
+        for n in range(rules.columns):
+            move_key = order[n]
+            if move_key < 0:
+                break
+            i = move_key & column_bits
+            position.play(i)
+            if n == 0:
+                score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self.negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.undo(i)
+            if score > value:
+                value = score
+                column = i
+                # A score at or below the window is only an upper bound, so the
+                # column is not known to be the best one until a score beats it
+                if ply == 0 and score > alpha_orig:
+                    self.root_move = column
+
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    ordering.cutoff(position, i, depth, ply)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += n == 0
+                    break
+
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        table.store(key, value, depth, flag, columns[column])
+        if stats is not None:
+            stats.tt_stores += 1
+        best_moves[ply] = column
+        return value
+
+    def frontier(self, position, order, alpha, beta, key, columns, candidates, ply):
+        """Scores every child of a depth 1 node with one batched evaluation
+
+        Args:
+            position (Position): current position, restored before returning
+            order (tuple): order to try the columns in
+            alpha (float): Alpha value used to classify the stored score
+            beta (float): Beta value used to classify the stored score
+            key (int): table key of the position
+            columns (tuple): columns of the table entry by column of the position
+            candidates (int): bitboard of the cells of the moves that do not lose at once
+            ply (int): distance from the root of the search
+
+        Returns:
+            int: evaluation score of the position from the view of the player to move
+        """
+        table = self.table
+        ai_moves = position.moves & 1 == self.ai_colour
+        children = []
+        ai_stones = []
+        player_stones = []
+        draws = []
+        for n in range(WIDTH):
+            i = order[n]
+            if not candidates & COLUMN_MASKS[i]:
+                continue
+            position.play(i)
+            self.nodes += 1
+            moved = position.current ^ position.mask
+            children.append(i)
+            ai_stones.append(moved if ai_moves else position.current)
+            player_stones.append(position.current if ai_moves else moved)
+            draws.append(position.is_draw())
+            position.undo(i)
+
+        boards = self.batch.bitboards_to_array(ai_stones, player_stones)
+        scores = self.batch.evaluate_batch(boards, 1, 2).tolist()
+        # Scores of the player to move
+        sign = 1 if ai_moves else -1
+        scores = [0 if draw else sign * score for score, draw in zip(scores, draws)]
+        value = max(scores)
+        column = children[scores.index(value)]
+
+        if value <= alpha:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        table.store(key, value, 1, flag, columns[column])
+        self.best_moves[ply] = column
+        return value
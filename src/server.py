@@ -0,0 +1,499 @@
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from bitboard import Position
+from book import load_book
+from codec import GameWriter
+from tablebase import load_tablebase
+from engine import Engine
+from mcts import MctsEngine
+from geometry import WIDTH
+
+# Stop events and engine of a search process, set by _init_worker
+_worker = {}
+
+# Finished games and seconds after which the index of the archive is written again
+ARCHIVE_FLUSH_GAMES = 100
+ARCHIVE_FLUSH_SECONDS = 30.0
+
+
+def _init_worker(stop_events, engine="alphabeta"):
+    """Prepares a search process of the pool
+
+    Args:
+        stop_events (list): stop event of every dispatcher slot
+        engine (str): "alphabeta" for the alpha-beta Engine or "mcts" for MctsEngine
+    """
+    _worker["stop_events"] = stop_events
+    if engine == "mcts":
+        _worker["engine"] = MctsEngine()
+    else:
+        _worker["engine"] = Engine(book=load_book(), tablebase=load_tablebase())
+
+
+def _search_job(slot, moves, time_limit, max_depth):
+    """Searches the move of a game in a pool process
+
+    Args:
+        slot (int): dispatcher slot, its stop event aborts the search
+        moves (list): columns played in the game
+        time_limit (float): seconds the search may take
+        max_depth (int): depth of the last iteration, None for no limit
+
+    Returns:
+        int: column to play
+    """
+    position = Position.from_moves(moves)
+    return _worker["engine"].choose_move(position, time_limit, max_depth=max_depth,
+                                         stop=_worker["stop_events"][slot])
+
+
+class Game:
+    """Moves and result of one game hosted by the server"""
+
+    def __init__(self, moves=()):
+        """
+        Args:
+            moves (iterable): columns already played
+        """
+        self.position = Position()
+        self.moves = []
+        self.winner = None
+        for col in moves:
+            self.play(col)
+
+    @property
+    def over(self):
+        """True if the game has been won or the board is full"""
+        return self.winner is not None or self.position.is_draw()
+
+    def play(self, col):
+        """Plays a move, raising ValueError if it is not legal
+
+        Args:
+            col (int): column to play
+        """
+        if self.over:
+            raise ValueError("the game is over")
+        if not isinstance(col, int) or not 0 <= col < WIDTH or not self.position.can_play(col):
+            raise ValueError(f"illegal move {col!r}")
+        if self.position.is_winning_move(col):
+            self.winner = self.position.moves & 1
+        self.position.play(col)
+        self.moves.append(col)
+
+    def state(self):
+        """Returns the game as a JSON compatible dictionary"""
+        result = None
+        if self.winner is not None:
+            result = "first" if self.winner == 0 else "second"
+        elif self.position.is_draw():
+            result = "draw"
+        return {"moves": self.moves, "result": result}
+
+
+class Job:
+    """Search request waiting in the queue or running in a slot"""
+
+    def __init__(self, moves, time_limit, max_depth, future):
+        self.moves = moves
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.future = future
+        self.slot = None
+        self.cancelled = False
+
+
+class EngineServer:
+    """Asyncio server hosting many games at once
+
+    Clients send one JSON request per line and get one JSON response per
+    line, with the "id" of the request copied into the response. Requests
+    are "new" (start a game, optionally from "moves" and with a "game" id
+    that is not in use, otherwise ids g1, g2, ... are given), "play" (play a
+    "column" in a "game"), "go" (let the engine move in a "game" within
+    "time_limit" seconds, optionally to "max_depth") and "close".
+
+    Searches run in a process pool, one per dispatcher slot, so a long
+    search never blocks the event loop or the other games. Waiting searches
+    are kept in a bounded queue: when it is full, the server stops reading
+    requests from the connection that sent the next "go" until there is
+    room again. When a client disconnects, its queued searches are dropped
+    and its running searches are stopped through the stop event of their
+    slot.
+
+    With an archive file, every game that ends on the server is appended to
+    it as a packed move sequence. Writing the index copies the offsets of
+    every game, so it is done only after flush_games new games, every
+    flush_seconds and when the server closes. Until the index is written
+    again after a new game, GameArchive refuses the file and
+    codec.recover_offsets finds the games from their end markers, as it does
+    after a crash, see codec.GameWriter.
+    """
+
+    def __init__(self, workers=None, queue_size=64, max_time_limit=10.0, engine="alphabeta",
+                 archive=None, flush_games=ARCHIVE_FLUSH_GAMES,
+                 flush_seconds=ARCHIVE_FLUSH_SECONDS):
+        """
+        Args:
+            workers (int): number of search processes, the number of CPUs if not given
+            queue_size (int): number of searches that may wait for a process
+            max_time_limit (float): upper bound for the time limit of a request
+            engine (str): "alphabeta" or "mcts", the engine of the search processes
+            archive (str): game archive the finished games are added to, None to not keep them
+            flush_games (int): finished games after which the index of the archive is written
+            flush_seconds (float): interval of writing the index while games are added
+        """
+        if engine not in ("alphabeta", "mcts"):
+            raise ValueError(f"unknown engine {engine}")
+        self.engine = engine
+        self.workers = workers or os.cpu_count()
+        self.queue_size = queue_size
+        self.max_time_limit = max_time_limit
+        self.queue = None
+        self.executor = None
+        self.stop_events = []
+        self.dispatchers = []
+        self.connections = {}
+        self.server = None
+        self.archive_path = archive
+        self.archive = None
+        self.flush_games = flush_games
+        self.flush_seconds = flush_seconds
+        self.unflushed = 0
+        self.flusher = None
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """Starts the search processes and listens for clients
+
+        Args:
+            host (str): address to listen on
+            port (int): TCP port, 0 for any free port
+            path (str): Unix socket to listen on instead of TCP
+
+        Returns:
+            asyncio.Server: the listening server
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        if self.archive_path is not None:
+            self.archive = GameWriter(self.archive_path, append=True)
+            self.flusher = asyncio.create_task(self.flush_archive())
+        self.stop_events = [multiprocessing.Event() for _ in range(self.workers)]
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, initializer=_init_worker,
+            initargs=(self.stop_events, self.engine))
+        self.dispatchers = [asyncio.create_task(self.dispatch(slot))
+                            for slot in range(self.workers)]
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def close(self):
+        """Stops listening, cancels the dispatchers and shuts the process pool down"""
+        if self.server is not None:
+            self.server.close()
+        # Closing the connections ends their handlers with end of file
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        for event in self.stop_events:
+            event.set()
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.flusher is not None:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+        if self.archive is not None:
+            self.archive.close()
+
+    async def flush_archive(self):
+        """Writes the index of the archive every flush_seconds if games were added"""
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            if self.unflushed:
+                self.archive.flush()
+                self.unflushed = 0
+
+    async def dispatch(self, slot):
+        """Runs queued searches one at a time in a process of the pool
+
+        Args:
+            slot (int): index of the stop event of this dispatcher
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.cancelled:
+                    continue
+                job.slot = slot
+                self.stop_events[slot].clear()
+                try:
+                    column = await loop.run_in_executor(
+                        self.executor, _search_job, slot, job.moves, job.time_limit,
+                        job.max_depth)
+                except Exception as error:  # pylint: disable=broad-except
+                    if not job.future.done():
+                        job.future.set_exception(error)
+                    continue
+                if not job.future.done():
+                    job.future.set_result(column)
+            finally:
+                job.slot = None
+                self.queue.task_done()
+
+    async def handle(self, reader, writer):
+        """Serves one client connection
+
+        Args:
+            reader (asyncio.StreamReader): requests of the client
+            writer (asyncio.StreamWriter): responses to the client
+        """
+        connection = asyncio.current_task()
+        self.connections[connection] = writer
+        games = {}
+        # Numbers of default game ids, never reused so a closed id is not handed out again
+        numbers = itertools.count(1)
+        jobs = set()
+        replies = set()
+        lock = asyncio.Lock()
+
+        async def respond(message):
+            async with lock:
+                writer.write(json.dumps(message).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    reply = await self.handle_request(request, games, jobs, numbers)
+                except (ValueError, KeyError, TypeError) as error:
+                    await respond({"id": request.get("id") if isinstance(request, dict)
+                                   else None, "error": str(error)})
+                    continue
+                if isinstance(reply, Job):
+                    task = asyncio.create_task(self.finish_go(request, reply, games, respond))
+                    replies.add(task)
+                    task.add_done_callback(replies.discard)
+                else:
+                    await respond(reply)
+        except ConnectionError:
+            pass
+        finally:
+            for job in jobs:
+                job.cancelled = True
+                if job.slot is not None:
+                    self.stop_events[job.slot].set()
+            for task in replies:
+                task.cancel()
+            writer.close()
+            del self.connections[connection]
+
+    async def handle_request(self, request, games, jobs, numbers):
+        """Handles one request of a connection
+
+        Args:
+            request (dict): decoded request
+            games (dict): games of the connection by id
+            jobs (set): searches of the connection that have not finished
+            numbers (iterator): increasing numbers for the ids of games started without one
+
+        Returns:
+            dict or Job: the response, or the queued search of a "go" request
+        """
+        request_id = request.get("id")
+        kind = request["type"]
+        if kind == "new":
+            if request.get("game"):
+                game_id = str(request["game"])
+                if game_id in games:
+                    raise ValueError(f"game {game_id} already exists")
+            else:
+                game_id = f"g{next(numbers)}"
+                while game_id in games:
+                    game_id = f"g{next(numbers)}"
+            games[game_id] = Game(request.get("moves", ()))
+            return {"id": request_id, "game": game_id, **games[game_id].state()}
+        game_id = str(request["game"])
+        if game_id not in games:
+            raise KeyError(f"unknown game {game_id}")
+        game = games[game_id]
+        if kind == "play":
+            game.play(request["column"])
+            self.record(game)
+            return {"id": request_id, "game": game_id, **game.state()}
+        if kind == "close":
+            del games[game_id]
+            return {"id": request_id, "game": game_id, "closed": True}
+        if kind != "go":
+            raise ValueError(f"unknown request type {kind}")
+        if game.over:
+            raise ValueError("the game is over")
+        time_limit = min(float(request.get("time_limit", 1.0)), self.max_time_limit)
+        future = asyncio.get_running_loop().create_future()
+        job = Job(list(game.moves), time_limit, request.get("max_depth"), future)
+        jobs.add(job)
+        future.add_done_callback(lambda _: jobs.discard(job))
+        # Waits while the queue is full, which stops reading from this client
+        await self.queue.put(job)
+        return job
+
+    async def finish_go(self, request, job, games, respond):
+        """Plays the engine move of a finished search and answers the request
+
+        Args:
+            request (dict): the "go" request
+            job (Job): the search of the request
+            games (dict): games of the connection by id
+            respond (callable): coroutine function sending a response
+        """
+        request_id = request.get("id")
+        try:
+            column = await job.future
+        except Exception as error:  # pylint: disable=broad-except
+            await respond({"id": request_id, "error": str(error)})
+            return
+        game = games.get(str(request["game"]))
+        if game is None or game.moves != job.moves:
+            await respond({"id": request_id, "error": "the game changed during the search"})
+            return
+        game.play(column)
+        self.record(game)
+        await respond({"id": request_id, "game": str(request["game"]), "move": column,
+                       **game.state()})
+
+    def record(self, game):
+        """Adds a game that has just ended to the archive
+
+        Args:
+            game (Game): game after a move
+        """
+        if self.archive is not None and game.over:
+            self.archive.write(game.moves)
+            self.unflushed += 1
+            if self.unflushed >= self.flush_games:
+                self.archive.flush()
+                self.unflushed = 0
+
+
+async def play_remote_game(reader, writer, game_id, time_limit, max_depth, seed):
+    """Plays one game on a server: the engine against random moves
+
+    Args:
+        reader (asyncio.StreamReader): responses of the server
+        writer (asyncio.StreamWriter): requests to the server
+        game_id (str): id of the game
+        time_limit (float): time limit of every engine move
+        max_depth (int): depth limit of every engine move
+        seed (int): seed of the random moves
+
+    Returns:
+        list: seconds every engine move took
+    """
+    rng = random.Random(seed)
+    latencies = []
+
+    async def call(request):
+        writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    state = await call({"id": 0, "type": "new", "game": game_id})
+    while state.get("result") is None and "error" not in state:
+        columns = [col for col in range(WIDTH) if state["moves"].count(col) < 6]
+        state = await call({"id": 1, "type": "play", "game": game_id,
+                            "column": rng.choice(columns)})
+        if state.get("result") is not None or "error" in state:
+            break
+        start = time.perf_counter()
+        state = await call({"id": 2, "type": "go", "game": game_id, "time_limit": time_limit,
+                            "max_depth": max_depth})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def load_test(games, host="127.0.0.1", port=8765, time_limit=0.1, max_depth=None):
+    """Plays many games against a running server at once, one connection per game
+
+    Args:
+        games (int): number of games
+        host (str): address of the server
+        port (int): port of the server
+        time_limit (float): time limit of every engine move
+        max_depth (int): depth limit of every engine move
+
+    Returns:
+        dict: games played, seconds taken and engine move latencies
+    """
+    async def one_game(index):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            return await play_remote_game(reader, writer, f"load{index}", time_limit,
+                                          max_depth, index)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_game(index) for index in range(games)))
+    seconds = time.perf_counter() - start
+    latencies = [latency for result in results for latency in result]
+    return {
+        "games": games,
+        "seconds": round(seconds, 3),
+        "moves": len(latencies),
+        "average_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        "max_latency": max(latencies, default=0.0),
+    }
+
+
+async def serve(host, port, path, workers, queue_size, engine="alphabeta", archive=None):
+    """Runs the server until it is interrupted"""
+    engine_server = EngineServer(workers, queue_size, engine=engine, archive=archive)
+    server = await engine_server.start(host, port, path)
+    print(f"Serving on {path or server.sockets[0].getsockname()}")
+    try:
+        await server.serve_forever()
+    finally:
+        await engine_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connect4 engine server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--engine", choices=["alphabeta", "mcts"], default="alphabeta")
+    parser.add_argument("--archive", help="game archive the finished games are added to")
+    parser.add_argument("--load-test", type=int, metavar="GAMES",
+                        help="play this many games against a running server instead of serving")
+    parser.add_argument("--time-limit", type=float, default=0.1)
+    arguments = parser.parse_args()
+    if arguments.load_test:
+        print(asyncio.run(load_test(arguments.load_test, arguments.host, arguments.port,
+                                    arguments.time_limit)))
+    else:
+        try:
+            asyncio.run(serve(arguments.host, arguments.port, arguments.unix, arguments.workers,
+                              arguments.queue_size, arguments.engine, arguments.archive))
+        except KeyboardInterrupt:
+            pass
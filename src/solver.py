@@ -0,0 +1,203 @@
+import random
+import time
+from geometry import STANDARD
+from limits import INF, CHECK_INTERVAL, SearchTimeout
+from transposition import (TranspositionTable, EXACT, LOWER, UPPER, MAX_DEPTH,
+                           entry_score, entry_flag)
+
+# Positions with at most this many empty cells are solved exactly
+SOLVER_EMPTY_CELLS = 14
+# Xored into the keys of solved positions, so that a table shared with the
+# heuristic search keeps the two kinds of scores apart
+SOLVED_KEY = random.Random(20240503).getrandbits(63)
+
+
+def win_score(moves, rules=STANDARD):
+    """Score of winning with the next move
+
+    Args:
+        moves (int): number of moves played before the winning move
+        rules (Rules): board shape and win length
+
+    Returns:
+        int: score, faster wins get bigger scores
+    """
+    return (rules.cells + 1 - moves) // 2
+
+
+class Solver:
+    """Exact solver for endgame positions
+
+    Scores are game theoretic values from the view of the player to move:
+    0 is a draw, a positive score is a win and a negative score is a loss.
+    The further from zero, the fewer moves the winner needs, so a win with
+    the last piece of the board scores 1. Solved bounds are kept in the
+    transposition table with the maximum depth, because they do not depend
+    on any depth limit, under keys xored with SOLVED_KEY. The table can be
+    shared with search.Search, which reads the solved wins, draws and
+    losses from it even when the solver ran out of time. With a tablebase, positions it covers are not
+    searched but read from it, at any depth of the search. The board shape
+    and the win length are read from the rules of the solved position.
+    """
+
+    def __init__(self, table=None, tablebase=None):
+        """
+        Args:
+            table (TranspositionTable): table for solved bounds, a new one is created if not given
+            tablebase (Tablebase): exact scores of endgame positions, None to search them
+        """
+        self.table = TranspositionTable() if table is None else table
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.deadline = INF
+        self.stop = None
+        self.node_limit = INF
+
+    def solve(self, position, deadline=INF, stop=None, max_nodes=INF):
+        """Finds the exact score of a position with null-window searches
+
+        The score is narrowed down like in MTD(f): every search only answers
+        whether the score is above a guess, which lets alpha-beta cut off far
+        more than a search with a wide window.
+
+        Args:
+            position (Position): position to solve, restored unless the search is aborted
+            deadline (float): time.monotonic() value after which SearchTimeout is raised
+            stop (Event): event that raises SearchTimeout when set
+            max_nodes (int): number of nodes after which SearchTimeout is raised
+
+        Returns:
+            int: exact score of the position
+        """
+        self.deadline = deadline
+        self.stop = stop
+        self.node_limit = self.nodes + max_nodes
+        cells = position.rules.cells
+        low = -(cells - position.moves) // 2
+        high = (cells + 1 - position.moves) // 2
+        while low < high:
+            guess = low + (high - low) // 2
+            if guess <= 0 and low // 2 < guess:
+                guess = low // 2
+            elif guess >= 0 and high // 2 > guess:
+                guess = high // 2
+            score = self.negamax(position, guess, guess + 1)
+            if score <= guess:
+                high = score
+            else:
+                low = score
+        # The searches only stored bounds of the position, the exact score
+        # lets a search sharing the table use it
+        self.table.store(position.canonical_hash()[0] ^ SOLVED_KEY, low, MAX_DEPTH, EXACT, None)
+        return low
+
+    def best_move(self, position, deadline=INF, stop=None, max_nodes=INF):
+        """Solves every move of the position
+
+        Args:
+            position (Position): position to solve
+            deadline (float): time.monotonic() value after which SearchTimeout is raised
+            stop (Event): event that raises SearchTimeout when set
+            max_nodes (int): number of nodes of all the moves after which SearchTimeout is raised
+
+        Returns:
+            tuple: best column and its exact score, None and 0 if the board is full
+        """
+        # An aborted search leaves its moves on the board, so solve a copy
+        position = position.copy()
+        nodes_before = self.nodes
+        best_col, best_score = None, -INF
+        for col in position.rules.preferred_cols:
+            if not position.can_play(col):
+                continue
+            if position.is_winning_move(col):
+                return col, win_score(position.moves, position.rules)
+            position.play(col)
+            score = 0 if position.is_draw() else -self.solve(
+                position, deadline, stop, max_nodes - (self.nodes - nodes_before))
+            position.undo(col)
+            if score > best_score:
+                best_col, best_score = col, score
+        return best_col, best_score if best_col is not None else 0
+
+    def negamax(self, position, alpha, beta):
+        """Negamax with alpha-beta-pruning down to the end of the game
+
+        Args:
+            position (Position): current position, restored before returning
+            alpha (int): Alpha value for alpha-beta-pruning
+            beta (int): Beta value for alpha-beta-pruning
+
+        Returns:
+            int: score of the position, exact if it is inside the window
+        """
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL and (
+                self.nodes >= self.node_limit or time.monotonic() > self.deadline
+                or self.stop is not None and self.stop.is_set()):
+            raise SearchTimeout()
+        rules = position.rules
+        cells = rules.cells
+        moves = position.moves
+        if moves == cells:
+            return 0
+        mask = position.mask
+        top_masks = rules.top_masks
+        for col in rules.preferred_cols:
+            if not mask & top_masks[col] and position.is_winning_move(col):
+                return (cells + 1 - moves) // 2
+        tablebase = self.tablebase
+        if tablebase is not None and cells - moves <= tablebase.empty_cells:
+            score = tablebase.probe(position)
+            if score is not None:
+                return score
+
+        high = (cells - 1 - moves) // 2
+        table = self.table
+        key, mirrored = position.canonical_hash()
+        key ^= SOLVED_KEY
+        entry = table.probe(key)
+        if entry is not None:
+            score = entry_score(entry)
+            flag = entry_flag(entry)
+            if flag == EXACT:
+                return score
+            if flag == UPPER:
+                if score <= alpha:
+                    return score
+                high = min(high, score)
+            else:
+                if score >= beta:
+                    return score
+                alpha = max(alpha, score)
+        if beta > high:
+            beta = high
+        if alpha >= beta:
+            return beta
+
+        alpha_orig = alpha
+        value = -INF
+        column = None
+        for col in rules.preferred_cols:
+            if mask & top_masks[col]:
+                continue
+            position.play(col)
+            score = -self.negamax(position, -beta, -alpha)
+            position.undo(col)
+            if score > value:
+                value = score
+                column = col
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    break
+
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        table.store(key, value, MAX_DEPTH, flag,
+                    (rules.mirror_columns if mirrored else rules.column_order)[column])
+        return value
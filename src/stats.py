@@ -0,0 +1,182 @@
+import json
+from transposition import entry_move
+
+
+def table_move(position, table, perspective=0):
+    """Reads the best move of a position from a search table
+
+    Args:
+        position (Position): position to look up
+        table (TranspositionTable): table of a search
+        perspective (int): key the search xored into the table keys
+
+    Returns:
+        int: stored column translated to the position, None if there is none
+    """
+    key, mirrored = position.canonical_hash()
+    entry = table.probe(key ^ perspective)
+    col = None if entry is None else entry_move(entry)
+    if col is None:
+        return None
+    rules = position.rules
+    return (rules.mirror_columns if mirrored else rules.column_order)[col]
+
+
+def principal_variation(position, table, length, perspective=0):
+    """Follows the best moves stored in the transposition table from a position
+
+    Args:
+        position (Position): position to start from, restored before returning
+        table (TranspositionTable): table of a finished search
+        length (int): maximum number of moves to follow
+        perspective (int): key the search xored into the table keys
+
+    Returns:
+        list: columns of the expected line of play
+    """
+    line = []
+    while len(line) < length:
+        col = table_move(position, table, perspective)
+        if col is None or not position.can_play(col):
+            break
+        line.append(col)
+        won = position.is_winning_move(col)
+        position.play(col)
+        if won or position.is_draw():
+            break
+    for col in reversed(line):
+        position.undo(col)
+    return line
+
+
+def _rate(count, total):
+    """Share of count in total, 0 if there is nothing to share"""
+    return count / total if total else 0.0
+
+
+class SearchStats:
+    """Counters filled in by one iterative deepening search
+
+    The search only touches the counters when it was given a stats object,
+    so a search without one pays a single `is not None` check at the
+    counting points. Counters are totals over the whole search and
+    `iterations` holds a record of every completed depth.
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.expanded = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.researches = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_stores = 0
+        self.tablebase_hits = 0
+        self.seconds = 0.0
+        self.move = None
+        self.source = "search"
+        self.iterations = []
+
+    def add_iteration(self, depth, nodes, leaves, seconds, score, move, line):
+        """Records a completed iteration
+
+        Args:
+            depth (int): depth of the iteration
+            nodes (int): nodes searched in the iteration
+            leaves (int): leaves evaluated in the iteration
+            seconds (float): time used by the iteration
+            score (int): score of the iteration
+            move (int): best column of the iteration
+            line (list): principal variation of the iteration
+        """
+        self.iterations.append({
+            "depth": depth,
+            "nodes": nodes,
+            "leaves": leaves,
+            "seconds": seconds,
+            "score": score,
+            "move": move,
+            "pv": line,
+        })
+
+    @property
+    def nodes_per_second(self):
+        """Searched nodes per second over the whole search"""
+        return _rate(self.nodes, self.seconds)
+
+    @property
+    def cutoff_rate(self):
+        """Share of expanded nodes that ended in a beta cutoff"""
+        return _rate(self.cutoffs, self.expanded)
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Share of beta cutoffs caused by the first move tried"""
+        return _rate(self.first_move_cutoffs, self.cutoffs)
+
+    @property
+    def tt_hit_rate(self):
+        """Share of transposition table probes that found an entry"""
+        return _rate(self.tt_hits, self.tt_probes)
+
+    @property
+    def tt_store_rate(self):
+        """Transposition table stores per probe"""
+        return _rate(self.tt_stores, self.tt_probes)
+
+    @property
+    def branching_factor(self):
+        """Effective branching factor, the node growth of the last two iterations"""
+        if len(self.iterations) < 2:
+            return 0.0
+        return _rate(self.iterations[-1]["nodes"], self.iterations[-2]["nodes"])
+
+    @property
+    def principal_variation(self):
+        """Expected line of play of the deepest completed iteration"""
+        return self.iterations[-1]["pv"] if self.iterations else []
+
+    def as_dict(self):
+        """Returns the counters and the derived rates as a JSON compatible dictionary"""
+        return {
+            "move": self.move,
+            "source": self.source,
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "seconds": round(self.seconds, 6),
+            "nodes_per_second": round(self.nodes_per_second),
+            "cutoff_rate": round(self.cutoff_rate, 4),
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate, 4),
+            "researches": self.researches,
+            "tt_hit_rate": round(self.tt_hit_rate, 4),
+            "tt_store_rate": round(self.tt_store_rate, 4),
+            "tablebase_hits": self.tablebase_hits,
+            "branching_factor": round(self.branching_factor, 3),
+            "pv": self.principal_variation,
+            "iterations": self.iterations,
+        }
+
+
+class JsonLinesTrace:
+    """Trace sink that writes the statistics of every move as one line of JSON"""
+
+    def __init__(self, file):
+        """
+        Args:
+            file: text file object opened for writing
+        """
+        self.file = file
+
+    def write(self, stats, **fields):
+        """Writes one move
+
+        Args:
+            stats (SearchStats): statistics of the move
+            **fields: extra values to store on the line, such as the position
+        """
+        record = dict(fields)
+        record.update(stats.as_dict())
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
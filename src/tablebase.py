@@ -0,0 +1,445 @@
+import argparse
+import array
+import heapq
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+from analyze import read_records, position_from_moves
+from bitboard import alignment, winning_cells
+from codec import key_to_bitboards, mirror_key
+from geometry import WIDTH, HEIGHT, H1, BOTTOM_MASK, BOARD_MASK, COLUMN_MASKS, PREFERRED_COLS
+from solver import win_score
+
+MAGIC = b"C4TBASE\0"
+# Magic, number of records, largest number of empty cells and bits of the bucket index
+HEADER = struct.Struct("<8sQII")
+# First and end record of a bucket of the index
+BUCKET = struct.Struct("<QQ")
+INDEX_ENTRY = struct.Struct("<Q")
+# A record is the canonical position key followed by the solver score in
+# SCORE_BITS bits, 7 bytes in total because keys take WIDTH * H1 bits
+KEY_BITS = WIDTH * H1
+SCORE_BITS = 6
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+RECORD_BYTES = (KEY_BITS + SCORE_BITS + 7) // 8
+MAX_INDEX_BITS = 20
+# Positions solved by one task of a generation
+CHUNK_SIZE = 4096
+DEFAULT_TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                      "..", "data", "tablebase.bin")
+
+# Tablebase of the previous layer opened by a generation process
+_worker = {}
+
+
+def canonical(key):
+    """Returns the smaller of a position key and the key of its mirror image"""
+    return min(key, mirror_key(key))
+
+
+def index_bits(count):
+    """Chooses the size of the bucket index, about eight records per bucket
+
+    Args:
+        count (int): number of records
+
+    Returns:
+        int: bits of the key that select the bucket
+    """
+    return min(MAX_INDEX_BITS, max(0, count.bit_length() - 3))
+
+
+def write_tablebase(path, records, count, empty_cells):
+    """Writes sorted records into a tablebase file
+
+    The records are streamed to the file and the bucket index is written
+    after them, so the records never have to be in memory at once.
+
+    Args:
+        path (str): file to write, replaced atomically
+        records (iterable): pairs of a canonical key and a score sorted by key
+        count (int): number of records
+        empty_cells (int): largest number of empty cells of the positions
+    """
+    bits = index_bits(count)
+    shift = KEY_BITS - bits
+    starts = [0] * ((1 << bits) + 1)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, count, empty_cells, bits))
+        written = 0
+        for key, score in records:
+            starts[(key >> shift) + 1] += 1
+            file.write(((key << SCORE_BITS) | (score + SCORE_OFFSET)).to_bytes(RECORD_BYTES,
+                                                                                 "little"))
+            written += 1
+        if written != count:
+            raise ValueError(f"expected {count} records, got {written}")
+        for bucket in range(1, len(starts)):
+            starts[bucket] += starts[bucket - 1]
+        file.write(array.array("Q", starts).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class Tablebase:
+    """Tablebase file read through mmap
+
+    The file holds the exact scores of endgame positions, in the units of
+    Solver: the sign tells the winner and the size how soon the game ends.
+    Records are sorted by canonical position key and followed by an index
+    of where every range of keys starts, so a probe is a short binary
+    search inside one bucket and opening the file reads only the header.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): tablebase file written by write_tablebase
+        """
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.empty_cells, bits = HEADER.unpack_from(self.data, 0)
+        self.shift = KEY_BITS - bits
+        self.index = HEADER.size + self.size * RECORD_BYTES
+        if (magic != MAGIC
+                or len(self.data) != self.index + ((1 << bits) + 1) * INDEX_ENTRY.size):
+            self.data.close()
+            raise ValueError(f"{path} is not a tablebase")
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        """Unmaps the tablebase file"""
+        self.data.close()
+
+    def records(self):
+        """Reads every record in key order
+
+        Yields:
+            tuple: canonical key and score
+        """
+        data = self.data
+        for offset in range(HEADER.size, self.index, RECORD_BYTES):
+            record = int.from_bytes(data[offset:offset + RECORD_BYTES], "little")
+            yield record >> SCORE_BITS, (record & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET
+
+    def probe_key(self, key):
+        """Finds the score of a canonical position key
+
+        Args:
+            key (int): canonical key of the position
+
+        Returns:
+            int: score of the player to move or None if the position is not in the file
+        """
+        data = self.data
+        low, high = BUCKET.unpack_from(data, self.index + (key >> self.shift)
+                                       * INDEX_ENTRY.size)
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD_BYTES
+            record = int.from_bytes(data[offset:offset + RECORD_BYTES], "little")
+            stored = record >> SCORE_BITS
+            if stored == key:
+                return (record & ((1 << SCORE_BITS) - 1)) - SCORE_OFFSET
+            if stored < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def probe(self, position):
+        """Finds the exact score of a position
+
+        Args:
+            position (Position): position to look up
+
+        Returns:
+            int: score of the player to move or None if the position is not in the file
+        """
+        if WIDTH * HEIGHT - position.moves > self.empty_cells:
+            return None
+        return self.probe_key(position.canonical_key()[0])
+
+    def best_move(self, position):
+        """Picks the move with the best score from the scores of the children
+
+        Args:
+            position (Position): position to play, restored before returning
+
+        Returns:
+            tuple: best column and its score or None if a child is not in the file
+        """
+        if position.is_draw() or WIDTH * HEIGHT - position.moves > self.empty_cells:
+            return None
+        best = None
+        for col in PREFERRED_COLS:
+            if not position.can_play(col):
+                continue
+            if position.is_winning_move(col):
+                return col, win_score(position.moves)
+            position.play(col)
+            score = 0 if position.is_draw() else self.probe(position)
+            position.undo(col)
+            if score is None:
+                return None
+            if best is None or -score > best[1]:
+                best = col, -score
+        return best
+
+
+def load_tablebase(path=DEFAULT_TABLEBASE_PATH):
+    """Opens a tablebase if the file exists
+
+    Args:
+        path (str): tablebase file
+
+    Returns:
+        Tablebase: the tablebase or None if there is no tablebase file
+    """
+    if not os.path.exists(path):
+        return None
+    return Tablebase(path)
+
+
+def solve_key(key, moves, children):
+    """Solves a position from the scores of its children
+
+    Args:
+        key (int): key of the position
+        moves (int): number of pieces on the board
+        children (Tablebase): solved positions with one more piece, None if the board gets full
+
+    Returns:
+        int: exact score of the player to move
+    """
+    current, mask = key_to_bitboards(key)
+    possible = (mask + BOTTOM_MASK) & BOARD_MASK
+    if winning_cells(current, mask) & possible:
+        return win_score(moves)
+    if children is None:
+        return 0
+    opponent = current ^ mask
+    best = -WIDTH * HEIGHT
+    for col in range(WIDTH):
+        move = possible & COLUMN_MASKS[col]
+        if not move:
+            continue
+        score = children.probe_key(canonical(opponent + (mask | move)))
+        if score is None:
+            raise ValueError(f"position {key} has a child missing from the previous layer")
+        best = max(best, -score)
+    return best
+
+
+def expand(keys):
+    """Lists the positions one move after each position
+
+    Children of positions with an immediate win are not listed: every
+    search takes the win without looking at them. Games that end with the
+    move are left out too.
+
+    Args:
+        keys (list): keys of positions with the same number of pieces
+
+    Returns:
+        set: canonical keys of the children
+    """
+    children = set()
+    for key in keys:
+        current, mask = key_to_bitboards(key)
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        if winning_cells(current, mask) & possible:
+            continue
+        opponent = current ^ mask
+        for col in range(WIDTH):
+            move = possible & COLUMN_MASKS[col]
+            if move and mask | move != BOARD_MASK:
+                children.add(canonical(opponent + (mask | move)))
+    return children
+
+
+def _layer_path(work_dir, moves):
+    """File of the position keys with the given number of pieces"""
+    return os.path.join(work_dir, f"positions-{moves}.bin")
+
+
+def _scores_path(work_dir, moves, chunk=None):
+    """File of the solved layer or of one of its chunks"""
+    if chunk is None:
+        return os.path.join(work_dir, f"scores-{moves}.bin")
+    return os.path.join(work_dir, f"scores-{moves}-{chunk}.bin")
+
+
+def _write_array(path, values):
+    """Writes an array of numbers to a file atomically"""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        values.tofile(file)
+    os.replace(temporary, path)
+
+
+def _read_array(path, typecode, start=0, stop=None):
+    """Reads a slice of an array of numbers from a file"""
+    values = array.array(typecode)
+    with open(path, "rb") as file:
+        if stop is None:
+            stop = os.fstat(file.fileno()).st_size // values.itemsize
+        file.seek(start * values.itemsize)
+        values.fromfile(file, stop - start)
+    return values
+
+
+def _expand_chunk(keys):
+    """Lists the children of a slice of a layer in a generation process"""
+    return sorted(expand(keys))
+
+
+def _solve_chunk(task):
+    """Solves a slice of a layer and writes its scores into a chunk file
+
+    Args:
+        task (tuple): work directory, number of pieces, chunk number, first and end position
+    """
+    work_dir, moves, chunk, start, stop = task
+    children = None
+    if moves + 1 < WIDTH * HEIGHT:
+        path = _scores_path(work_dir, moves + 1)
+        if _worker.get("path") != path:
+            if "tablebase" in _worker:
+                _worker["tablebase"].close()
+            _worker["path"], _worker["tablebase"] = path, Tablebase(path)
+        children = _worker["tablebase"]
+    keys = _read_array(_layer_path(work_dir, moves), "Q", start, stop)
+    scores = array.array("b", (solve_key(key, moves, children) for key in keys))
+    _write_array(_scores_path(work_dir, moves, chunk), scores)
+
+
+def _check_settings(work_dir, empty_cells, roots):
+    """Stores the settings of a generation or checks that a resumed one uses the same"""
+    settings = {"empty_cells": empty_cells, "roots": roots}
+    path = os.path.join(work_dir, "settings.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            if json.load(file) != settings:
+                raise ValueError(f"{work_dir} belongs to a generation with other settings")
+        return
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(settings, file)
+
+
+def generate_tablebase(path, roots, empty_cells, workers=1, work_dir=None,
+                       chunk_size=CHUNK_SIZE):
+    """Solves every position with few empty cells that can be reached from the roots
+
+    Positions are first listed layer by layer forwards from the roots, one
+    file of sorted keys per number of pieces. They are then solved
+    backwards from the fullest layer, where every position only needs the
+    scores of the layer solved before it. Both steps are split between
+    processes, and every finished layer and chunk is kept in the work
+    directory, so an interrupted generation started again with the same
+    arguments continues where it stopped.
+
+    Args:
+        path (str): tablebase file to write
+        roots (list): positions to start from, positions of finished games are skipped
+        empty_cells (int): largest number of empty cells of the stored positions
+        workers (int): number of processes
+        work_dir (str): directory for the intermediate files, removed at the end,
+            path with ".work" appended if not given
+        chunk_size (int): number of positions solved by one task
+
+    Returns:
+        int: number of positions in the tablebase
+    """
+    if not 0 < empty_cells < 1 << (SCORE_BITS - 1):
+        raise ValueError(f"empty_cells must be between 1 and {(1 << (SCORE_BITS - 1)) - 1}")
+    if work_dir is None:
+        work_dir = path + ".work"
+    os.makedirs(work_dir, exist_ok=True)
+    layers = {}
+    for position in roots:
+        if not position.is_draw() and not alignment(position.current ^ position.mask):
+            layers.setdefault(position.moves, set()).add(position.canonical_key()[0])
+    if not layers:
+        raise ValueError("no unfinished root position")
+    _check_settings(work_dir, empty_cells, sorted(key for keys in layers.values()
+                                                  for key in keys))
+    first = min(layers)
+    last = WIDTH * HEIGHT - 1
+    solved = max(first, WIDTH * HEIGHT - empty_cells)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        previous = []
+        for moves in range(first, last + 1):
+            layer_path = _layer_path(work_dir, moves)
+            if os.path.exists(layer_path):
+                previous = _read_array(layer_path, "Q").tolist()
+                continue
+            keys = set(layers.get(moves, ()))
+            chunks = [previous[start:start + chunk_size]
+                      for start in range(0, len(previous), chunk_size)]
+            for children in (pool.imap_unordered(_expand_chunk, chunks) if pool is not None
+                             else map(_expand_chunk, chunks)):
+                keys.update(children)
+            previous = sorted(keys)
+            _write_array(layer_path, array.array("Q", previous))
+        del previous
+
+        for moves in range(last, solved - 1, -1):
+            if os.path.exists(_scores_path(work_dir, moves)):
+                continue
+            size = os.path.getsize(_layer_path(work_dir, moves)) // INDEX_ENTRY.size
+            tasks = [(work_dir, moves, chunk, start, min(start + chunk_size, size))
+                     for chunk, start in enumerate(range(0, size, chunk_size))
+                     if not os.path.exists(_scores_path(work_dir, moves, chunk))]
+            for _ in (pool.imap_unordered(_solve_chunk, tasks) if pool is not None
+                      else map(_solve_chunk, tasks)):
+                pass
+            chunk_count = (size + chunk_size - 1) // chunk_size
+            scores = array.array("b")
+            for chunk in range(chunk_count):
+                scores.extend(_read_array(_scores_path(work_dir, moves, chunk), "b"))
+            keys = _read_array(_layer_path(work_dir, moves), "Q")
+            write_tablebase(_scores_path(work_dir, moves), zip(keys, scores), size,
+                            WIDTH * HEIGHT - moves)
+            for chunk in range(chunk_count):
+                os.remove(_scores_path(work_dir, moves, chunk))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if "tablebase" in _worker:
+            _worker["tablebase"].close()
+        _worker.clear()
+
+    parts = [Tablebase(_scores_path(work_dir, moves)) for moves in range(solved, last + 1)]
+    count = sum(len(part) for part in parts)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    write_tablebase(path, heapq.merge(*(part.records() for part in parts)), count,
+                    empty_cells)
+    for part in parts:
+        part.close()
+    shutil.rmtree(work_dir)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase")
+    parser.add_argument("roots", help="file of move strings or JSON lines of the root positions")
+    parser.add_argument("--empty-cells", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default=DEFAULT_TABLEBASE_PATH)
+    parser.add_argument("--work-dir", help="directory of the intermediate files")
+    arguments = parser.parse_args()
+    with open(arguments.roots, "rb") as roots_file:
+        root_positions = [position_from_moves(record["moves"])
+                          for _, record in read_records(roots_file)]
+    total = generate_tablebase(arguments.output, root_positions, arguments.empty_cells,
+                               arguments.workers, arguments.work_dir)
+    print(f"Wrote {total} positions to {arguments.output}")
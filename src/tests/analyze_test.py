@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+from analyze import (parse_record, position_from_moves, analyze_stream, run_analysis,
+                     save_checkpoint)
+
+POSITIONS = ["33", '{"id": 7, "moves": [3, 2, 4]}', "", "3332", "0000000", "444", "12", "56"]
+
+class TestAnalyze(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, "positions.txt")
+        with open(self.input, "w", encoding="utf-8") as file:
+            file.write("\n".join(POSITIONS) + "\n")
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_parse_record(self):
+        """Move strings and JSON records give the same moves and JSON fields are kept
+        """
+        self.assertEqual(parse_record("3324"), {"moves": "3324"})
+        self.assertEqual(parse_record('{"id": 1, "moves": [3, 3]}'), {"id": 1, "moves": "33"})
+
+    def test_position_from_moves(self):
+        """Illegal moves and finished games are rejected
+        """
+        self.assertEqual(position_from_moves("3324").moves, 4)
+        for moves in ("39", "3333333", "3434343"):
+            with self.assertRaises(ValueError):
+                position_from_moves(moves)
+
+    def test_results_keep_input_order(self):
+        """Results of several processes come out in input order like with one process
+        """
+        records = [(index, parse_record(moves)) for index, moves in enumerate(POSITIONS)
+                   if moves]
+        alone = list(analyze_stream(records, depth=4))
+        pooled = list(analyze_stream(iter(records), depth=4, workers=2, window=2))
+        self.assertEqual(alone, pooled)
+        self.assertEqual([key for key, _ in pooled], [0, 1, 3, 4, 5, 6, 7])
+        self.assertEqual(pooled[1][1]["id"], 7)
+        self.assertIn("error", pooled[3][1])
+
+    def test_resume_from_checkpoint(self):
+        """An interrupted analysis continues from its checkpoint and ends like a full run
+        """
+        full = os.path.join(self.directory, "full.jsonl")
+        self.assertEqual(run_analysis(self.input, full, depth=4), 7)
+        resumed = os.path.join(self.directory, "resumed.jsonl")
+        checkpoint = os.path.join(self.directory, "checkpoint.json")
+        run_analysis(self.input, resumed, depth=4, checkpoint_path=checkpoint,
+                     checkpoint_every=2)
+        with open(resumed, "rb") as file:
+            lines = file.readlines()
+        with open(self.input, "rb") as file:
+            input_lines = file.readlines()
+        # Pretend the run stopped after a checkpoint at two results and
+        # wrote one more line before it was interrupted
+        save_checkpoint(checkpoint, {"input": sum(map(len, input_lines[:2])),
+                                     "output": sum(map(len, lines[:2])), "count": 2})
+        with open(resumed, "ab") as file:
+            file.write(b'{"partial": ')
+        self.assertEqual(run_analysis(self.input, resumed, depth=4,
+                                      checkpoint_path=checkpoint), 7)
+        self.assertEqual(self.read("resumed.jsonl"), self.read("full.jsonl"))
+
+    def test_resume_without_output(self):
+        """A checkpoint whose output file is missing or shorter is refused
+        """
+        output = os.path.join(self.directory, "output.jsonl")
+        checkpoint = os.path.join(self.directory, "checkpoint.json")
+        save_checkpoint(checkpoint, {"input": 3, "output": 40, "count": 1})
+        with self.assertRaises(ValueError):
+            run_analysis(self.input, output, depth=2, checkpoint_path=checkpoint)
+        self.assertFalse(os.path.exists(output))
+        with open(output, "wb") as file:
+            file.write(b"{}\n")
+        with self.assertRaises(ValueError):
+            run_analysis(self.input, output, depth=2, checkpoint_path=checkpoint)
+        with open(output, "rb") as file:
+            self.assertEqual(file.read(), b"{}\n")
+
+    def test_node_budget(self):
+        """A node budget stops the search after about that many nodes
+        """
+        results = list(analyze_stream([(0, {"moves": "33"})], max_nodes=2000))
+        self.assertLessEqual(results[0][1]["nodes"], 2048)
+
+    def test_mirrored_positions_are_searched_once(self):
+        """A repeated or mirrored position copies the first result with the move mirrored
+        """
+        records = [(0, {"moves": "12"}), (1, {"moves": "54", "id": 1}), (2, {"moves": "21"}),
+                   (3, {"moves": "12"})]
+        results = [result for _, result in analyze_stream(records, depth=5)]
+        first = results[0]
+        self.assertEqual(results[1], {"moves": "54", "id": 1, "move": 6 - first["move"],
+                                      "score": first["score"], "depth": first["depth"],
+                                      "nodes": first["nodes"]})
+        self.assertEqual(results[3], first)
+        pooled = [result for _, result in analyze_stream(iter(records), depth=5, workers=2)]
+        self.assertEqual(pooled, results)
@@ -0,0 +1,84 @@
+import pickle
+import unittest
+from arena import (EngineConfig, random_openings, book_openings, play_game, elo_difference,
+                   run_match, summarize)
+from bitboard import Position
+
+class TestArena(unittest.TestCase):
+
+    def test_parse_engine_config(self):
+        """Engine settings are read from a key=value list
+        """
+        config = EngineConfig.parse("fast", "depth=3,book=0,evaluation=incremental")
+        self.assertEqual((config.name, config.depth, config.book), ("fast", 3, False))
+        with self.assertRaises(ValueError):
+            EngineConfig.parse("bad", "speed=11")
+        with self.assertRaises(ValueError):
+            EngineConfig("bad", evaluation="neural")
+        self.assertEqual(EngineConfig.parse("tree", "algorithm=mcts").algorithm, "mcts")
+        with self.assertRaises(ValueError):
+            EngineConfig("bad", algorithm="random")
+
+    def test_openings(self):
+        """Openings have the requested length and do not hand out an immediate win
+        """
+        for opening in random_openings(5, 4) + book_openings(5, 3):
+            position = Position.from_moves(opening[:-1])
+            self.assertFalse(position.is_winning_move(opening[-1]))
+        self.assertEqual([len(opening) for opening in random_openings(3, 4)], [4, 4, 4])
+        self.assertEqual(len(book_openings(1000, 2)), 49)
+        self.assertEqual(random_openings(2, 0), [[], []])
+        for plies in (-1, 43):
+            with self.assertRaises(ValueError):
+                random_openings(1, plies)
+
+    def test_play_game(self):
+        """A game ends with a legal result and every move has a latency
+        """
+        strong = EngineConfig("strong", depth=4, book=False)
+        weak = EngineConfig("weak", depth=1, book=False, solver_threshold=0)
+        result = play_game((strong, weak, [3, 3]))
+        position = Position.from_moves(result["moves"][:-1])
+        if result["winner"] is not None:
+            self.assertTrue(position.is_winning_move(result["moves"][-1]))
+        self.assertEqual(sum(map(len, result["latencies"])), len(result["moves"]) - 2)
+
+    def test_match_summary(self):
+        """Both engines play both colours and the results add up to the number of games
+        """
+        strong = EngineConfig("strong", depth=4, book=False)
+        weak = EngineConfig("weak", depth=1, book=False, solver_threshold=0)
+        summary = run_match(strong, weak, random_openings(2, 2))
+        self.assertEqual(summary["games"], 4)
+        self.assertEqual(summary["wins"] + summary["draws"] + summary["losses"], 4)
+        self.assertGreater(summary["score"], 0.5)
+        self.assertLessEqual(summary["elo_low"], summary["elo"])
+        self.assertEqual(set(summary["latency"]), {"first", "second"})
+        self.assertEqual(summary["names"], {"first": "strong", "second": "weak"})
+
+    def test_summary_does_not_rely_on_identity(self):
+        """Results are counted by the recorded side, also for configs copied to other processes
+        """
+        strong = EngineConfig("strong", depth=4, book=False)
+        weak = EngineConfig("weak", depth=1, book=False, solver_threshold=0)
+        copy = pickle.loads(pickle.dumps(strong))
+        results = [play_game((copy, weak, [3, 3], 0)), play_game((weak, copy, [3, 3], 1))]
+        summary = summarize(strong, weak, results, 1.0)
+        expected = sum(result["winner"] == result["side"] for result in results)
+        self.assertEqual(summary["wins"], expected)
+        self.assertEqual(len(summary["latency"]), 2)
+        # Engines with the same name keep their own latencies
+        twin = EngineConfig("strong", depth=1, book=False)
+        results = [{"winner": None, "side": 0, "latencies": ([1.0], [3.0])},
+                   {"winner": None, "side": 1, "latencies": ([3.0], [1.0])}]
+        self.assertEqual(summarize(strong, twin, results, 1.0)["latency"],
+                         {"first": 1.0, "second": 3.0})
+        self.assertEqual(summarize(strong, weak, [{"winner": 1, "side": 1, "latencies": ([], [])}],
+                                   1.0)["wins"], 1)
+
+    def test_elo_difference(self):
+        """An even score is no difference and three quarters of the points is about 191
+        """
+        self.assertEqual(elo_difference(0.5), 0)
+        self.assertAlmostEqual(elo_difference(0.75), 190.85, places=2)
+        self.assertEqual(elo_difference(1.0), float("inf"))
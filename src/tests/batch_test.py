@@ -0,0 +1,69 @@
+import importlib.util
+import random
+import sys
+import unittest
+from unittest import mock
+import arena
+import search
+from bitboard import Position
+from transposition import TranspositionTable
+from game import evaluate_position
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+@unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(9)
+        self.positions = []
+        for _ in range(100):
+            position = Position()
+            for _ in range(rng.randint(0, 35)):
+                columns = [col for col in position.valid_moves()
+                           if not position.is_winning_move(col)]
+                if not columns:
+                    break
+                position.play(rng.choice(columns))
+            self.positions.append(position)
+
+    def test_evaluate_batch_matches_evaluate_position(self):
+        """Every board of a batch gets the same score as from evaluate_position
+        """
+        import batch
+        boards = [position.to_board(1, 2) for position in self.positions]
+        scores = batch.evaluate_batch(batch.boards_to_array(boards), 2, 1).tolist()
+        self.assertEqual(scores, [evaluate_position(board, 2, 1, 2) for board in boards])
+
+    def test_bitboards_to_array(self):
+        """Bitboards convert to the same array as the list boards
+        """
+        import batch
+        own = [position.current for position in self.positions]
+        opponent = [position.current ^ position.mask for position in self.positions]
+        boards = [position.to_board(1, 2) for position in self.positions]
+        self.assertEqual(batch.bitboards_to_array(own, opponent).tolist(), boards)
+
+    def test_frontier_search_matches_search(self):
+        """Batched leaf evaluation finds the same move and score as the normal search
+        """
+        for moves in ([3, 3, 2, 4], [0, 1, 2, 3, 4], [3, 3, 3, 3, 2, 4, 4, 2]):
+            position = Position.from_moves(moves)
+            expected = search.minimax(position, 5, -search.INF, search.INF, True,
+                                      TranspositionTable(1))
+            result = search.minimax(position, 5, -search.INF, search.INF, True,
+                                    TranspositionTable(1), batch_leaves=True)
+            self.assertEqual(result, expected)
+
+class TestWithoutNumpy(unittest.TestCase):
+
+    def test_clear_error(self):
+        """Batched evaluation without NumPy fails with an install hint
+        """
+        with mock.patch.dict(sys.modules, {"numpy": None, "batch": None}):
+            del sys.modules["batch"]
+            with self.assertRaisesRegex(ImportError, "pip install numpy"):
+                search.Search(TranspositionTable(1), batch_leaves=True)
+        with mock.patch("importlib.util.find_spec", return_value=None):
+            with self.assertRaisesRegex(ValueError, "needs NumPy"):
+                arena.EngineConfig("batch", evaluation="batch")
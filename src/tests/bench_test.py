@@ -0,0 +1,34 @@
+import unittest
+from bench import load_positions, search_benchmark, compare_to_baseline
+
+class TestBench(unittest.TestCase):
+
+    def test_positions_by_phase(self):
+        """The checked-in positions are grouped by phase with a depth for each phase
+        """
+        phases = load_positions()
+        self.assertEqual(set(phases), {"opening", "midgame", "endgame"})
+        for group in phases.values():
+            self.assertGreater(group["depth"], 0)
+            self.assertTrue(all(0 <= col < 7 for moves in group["positions"] for col in moves))
+
+    def test_search_benchmark_is_reproducible(self):
+        """Fixed depth searches of the same positions take the same nodes and moves
+        """
+        phases = {"short": {"depth": 5, "positions": [[3, 3], [3, 2, 4]]}}
+        first = search_benchmark(phases, table_mb=1)
+        second = search_benchmark(phases, table_mb=1)
+        self.assertEqual(first["short"]["nodes"], second["short"]["nodes"])
+        self.assertEqual(first["short"]["moves"], second["short"]["moves"])
+
+    def test_compare_to_baseline(self):
+        """More nodes or a slower search than the baseline allows are regressions
+        """
+        baseline = {"opening": {"nodes": 1000, "nodes_per_second": 10000, "moves": [3]}}
+        same = {"opening": {"nodes": 1040, "nodes_per_second": 8000, "moves": [3]}}
+        self.assertEqual(compare_to_baseline(same, baseline), ([], []))
+        worse = {"opening": {"nodes": 1100, "nodes_per_second": 5000, "moves": [2]},
+                 "endgame": {"nodes": 10, "nodes_per_second": 10, "moves": [1]}}
+        regressions, differences = compare_to_baseline(worse, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(len(differences), 2)
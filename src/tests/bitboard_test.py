@@ -0,0 +1,119 @@
+import random
+import unittest
+from bitboard import Position, alignment, winning_cells
+from geometry import cell_bit
+from evaluation import evaluate
+from game import evaluate_position, is_game_over, make_move, get_next_open_row, valid_moves
+
+class TestBitboard(unittest.TestCase):
+
+    def test_from_board_round_trip(self):
+        """Converting a list board to a position and back keeps every piece in place
+        """
+        board = [
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 2, 0, 0, 0],
+            [0, 0, 0, 1, 0, 0, 0],
+            [0, 0, 1, 1, 2, 0, 0],
+            [0, 2, 2, 1, 2, 1, 0]
+        ]
+        position = Position.from_board(board, 1)
+        self.assertEqual(position.moves, 10)
+        self.assertEqual(position.to_board(1, 2), board)
+        self.assertEqual(position.valid_moves(), valid_moves(board))
+
+    def test_play_and_win_detection(self):
+        """Wins are found in all four directions
+        """
+        vertical = Position.from_moves([3, 4, 3, 4, 3, 4])
+        self.assertTrue(vertical.is_winning_move(3))
+        self.assertFalse(vertical.is_winning_move(2))
+
+        horizontal = Position.from_moves([0, 0, 1, 1, 2, 2])
+        self.assertTrue(horizontal.is_winning_move(3))
+
+        diagonal = Position.from_moves([0, 1, 1, 2, 3, 2, 2, 3, 3, 6])
+        self.assertTrue(diagonal.is_winning_move(3))
+        diagonal.play(3)
+        self.assertTrue(diagonal.is_won())
+
+        self.assertFalse(alignment(sum(1 << cell_bit(5, col) for col in (4, 5, 6))
+                                   | 1 << cell_bit(4, 0)))
+
+    def test_undo_restores_position(self):
+        """Undoing moves returns every field to its earlier value
+        """
+        position = Position.from_moves([3, 3, 2, 4, 4])
+        before = (position.current, position.mask, position.moves,
+                  position.heights[:], position.hash, position.mirror_hash)
+        for col in (4, 0, 6, 4):
+            position.play(col)
+        for col in (4, 6, 0, 4):
+            position.undo(col)
+        self.assertEqual((position.current, position.mask, position.moves,
+                          position.heights, position.hash, position.mirror_hash), before)
+
+    def test_winning_cells_follow_moves(self):
+        """The winning cells kept on every move match winning_cells after moves and undos
+        """
+        rng = random.Random(3)
+        for _ in range(50):
+            position = Position()
+            played = []
+            while len(played) < 30 and not position.is_draw():
+                col = rng.choice(position.valid_moves())
+                position.play(col)
+                played.append(col)
+            for col in reversed(played):
+                self.assertEqual(position.own_winning_cells(),
+                                 winning_cells(position.current, position.mask))
+                self.assertEqual(position.opponent_winning_cells(),
+                                 winning_cells(position.current ^ position.mask, position.mask))
+                position.undo(col)
+
+    def test_mirror_image_keys(self):
+        """A position and its mirror image share the canonical hash and key
+        """
+        position = Position.from_moves([0, 1, 2, 2, 5])
+        mirrored = Position.from_moves([6, 5, 4, 4, 1])
+        self.assertEqual(position.mirror_hash, mirrored.hash)
+        self.assertEqual(position.mirror_hash, position.compute_hash(mirrored=True))
+        self.assertEqual(position.canonical_hash()[0], mirrored.canonical_hash()[0])
+        self.assertNotEqual(position.canonical_hash()[1], mirrored.canonical_hash()[1])
+        self.assertEqual(position.canonical_key()[0], mirrored.canonical_key()[0])
+        self.assertNotEqual(position.canonical_key()[1], mirrored.canonical_key()[1])
+        symmetric = Position.from_moves([3, 3, 2, 2, 4, 4])
+        self.assertEqual(symmetric.canonical_hash(), (symmetric.hash, False))
+
+    def test_full_column_and_draw(self):
+        """Full columns cannot be played and a full board is a draw
+        """
+        position = Position.from_moves([0] * 6)
+        self.assertFalse(position.can_play(0))
+        self.assertEqual(position.valid_moves(), [3, 2, 4, 1, 5, 6])
+        self.assertFalse(position.is_draw())
+        position.moves = 42
+        self.assertTrue(position.is_draw())
+
+    def test_matches_list_board_functions(self):
+        """Random games give the same wins and evaluations as the list board functions
+        """
+        rng = random.Random(7)
+        for _ in range(50):
+            board = [[0] * 7 for _ in range(6)]
+            position = Position()
+            piece = 1
+            while position.valid_moves():
+                col = rng.choice(position.valid_moves())
+                won = position.is_winning_move(col)
+                row = get_next_open_row(board, col)
+                make_move(board, row, col, piece)
+                position.play(col)
+                self.assertEqual(won, is_game_over(board, (row, col)))
+                other = position.current ^ position.mask
+                self.assertEqual(evaluate(other, position.current),
+                                 evaluate_position(board, piece, 1, 2))
+                if won:
+                    break
+                piece = 3 - piece
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import search
+from bitboard import Position
+from book import (HEADER, MAGIC, OPENING_MOVE, RECORD, OpeningBook, book_positions,
+                  generate_book, known_move, load_book)
+
+class TestBook(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "book.bin")
+        generate_book(self.path, 2, 4)
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(os.path.dirname(self.path))
+
+    def test_book_positions(self):
+        """Positions are listed once per position and its mirror image, not once per move order
+        """
+        self.assertEqual(len(book_positions(0)), 1)
+        self.assertEqual(len(book_positions(1)), 5)
+        self.assertEqual(len(book_positions(2)), 30)
+
+    def test_lookup(self):
+        """Every generated position is found with the move the engine chooses
+        """
+        book = OpeningBook(self.path)
+        self.assertEqual(len(book), 30)
+        self.assertEqual(book.lookup(Position())[0], 3)
+        for position in book_positions(2):
+            best_col, _ = book.lookup(position)
+            self.assertTrue(position.can_play(best_col))
+        self.assertIsNone(book.lookup(Position.from_moves([3, 3, 3])))
+        book.close()
+
+    def test_mirror_image_lookup(self):
+        """The mirror image of a stored position gets the mirrored move
+        """
+        book = OpeningBook(self.path)
+        for moves in ([0], [1, 3], [2, 6], [0, 0]):
+            best_col, score = book.lookup(Position.from_moves(moves))
+            mirrored = book.lookup(Position.from_moves([6 - col for col in moves]))
+            self.assertEqual(mirrored, (6 - best_col, score))
+        book.close()
+
+    def test_iterative_deepening_uses_book(self):
+        """A position in the book is answered with the book move without searching
+        """
+        book = load_book(self.path)
+        position = Position.from_moves([0, 6])
+        expected = book.lookup(position)[0]
+        self.assertEqual(search.iterative_deepening(position, -search.INF, search.INF,
+                                                    True, 0, book=book), expected)
+        book.close()
+        self.assertIsNone(load_book(self.path + ".missing"))
+
+    def test_opening_move(self):
+        """The proven first move is played without a book but a book entry comes first
+        """
+        self.assertEqual(OPENING_MOVE, 3)
+        self.assertEqual(known_move(Position()), OPENING_MOVE)
+        self.assertIsNone(known_move(Position.from_moves([3])))
+        self.assertEqual(search.book_move(Position()), OPENING_MOVE)
+        self.assertIsNone(search.book_move(Position.from_moves([3])))
+
+        with mock.patch("search.deepen", return_value=(5, [], 7)):
+            generate_book(self.path, 0, 1)
+        book = OpeningBook(self.path)
+        self.assertEqual(book.lookup(Position()), (OPENING_MOVE, 7))
+        book.close()
+
+        with open(self.path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, 1))
+            file.write(RECORD.pack(Position().canonical_key()[0], 2, 0))
+        book = OpeningBook(self.path)
+        self.assertEqual(search.book_move(Position(), book), 2)
+        book.close()
+
+    def test_invalid_file(self):
+        """A file that is not a book is rejected
+        """
+        with open(self.path, "wb") as file:
+            file.write(b"not a book at all")
+        with self.assertRaises(ValueError):
+            OpeningBook(self.path)
@@ -0,0 +1,119 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+from bitboard import Position
+from codec import (moves_to_string, moves_from_string, pack_moves, unpack_moves,
+                   key_to_bitboards, mirror_key, position_from_key, pack_keys, unpack_keys,
+                   boards_to_keys, keys_to_boards, board_to_key, key_to_board,
+                   read_move_strings, GameWriter, GameArchive)
+
+def random_game(rng):
+    """Plays random moves until the game ends"""
+    position = Position()
+    moves = []
+    while not position.is_draw():
+        col = rng.choice(position.valid_moves())
+        moves.append(col)
+        if position.is_winning_move(col):
+            break
+        position.play(col)
+    return moves
+
+class TestCodec(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(6)
+        self.games = [random_game(rng) for _ in range(40)] + [[], [3], list(range(7)) * 6]
+
+    def test_move_strings_and_packing(self):
+        """Games survive move strings and 3-bit packing of any length
+        """
+        for moves in self.games:
+            self.assertEqual(moves_from_string(moves_to_string(moves)), moves)
+            packed = pack_moves(moves)
+            self.assertEqual(len(packed), (3 * len(moves) + 3 + 7) // 8)
+            self.assertEqual(unpack_moves(packed), moves)
+        self.assertEqual(moves_from_string(" 3324\n"), [3, 3, 2, 4])
+        for text in ("337", "3a", "-1"):
+            with self.assertRaises(ValueError):
+                moves_from_string(text)
+        lines = io.StringIO("33\n\n0123\n")
+        self.assertEqual(list(read_move_strings(lines)), [[3, 3], [0, 1, 2, 3]])
+
+    def test_keys(self):
+        """Keys give back the position, its mirror image and its list board
+        """
+        positions = []
+        for moves in self.games:
+            position = Position.from_moves(moves[:-1])
+            positions.append(position)
+            key = position.key()
+            self.assertEqual(key_to_bitboards(key), (position.current, position.mask))
+            self.assertEqual(min(key, mirror_key(key)), position.canonical_key()[0])
+            copy = position_from_key(key)
+            self.assertEqual((copy.moves, copy.hash, copy.wins[2 * copy.moves]),
+                             (position.moves, position.hash, position.wins[2 * position.moves]))
+            self.assertEqual(key_to_board(key, 1, 2), position.to_board(1, 2))
+            self.assertEqual(board_to_key(position.to_board(2, 1), 2, 1), key)
+        keys = [position.key() for position in positions]
+        self.assertEqual(unpack_keys(pack_keys(keys)), keys)
+        boards = keys_to_boards(keys, 1, 2)
+        self.assertEqual(boards, [position.to_board(1, 2) for position in positions])
+        self.assertEqual(boards_to_keys(boards, 1, 2), keys)
+        board = [[0] * 7 for _ in range(6)]
+        board[0][0] = 1
+        with self.assertRaises(ValueError):
+            board_to_key(board, 1, 2)
+
+    def test_archive(self):
+        """Games are read back by number and in order, also after appending
+        """
+        path = os.path.join(tempfile.mkdtemp(), "games.c4g")
+        with GameWriter(path) as writer:
+            for moves in self.games[:30]:
+                writer.write(moves)
+        with GameWriter(path, append=True) as writer:
+            self.assertEqual(len(writer), 30)
+            for moves in self.games[30:]:
+                writer.write(moves)
+        with GameArchive(path) as archive:
+            self.assertEqual(len(archive), len(self.games))
+            self.assertEqual(list(archive), self.games)
+            self.assertEqual(archive[7], self.games[7])
+            self.assertEqual(archive[-1], self.games[-1])
+            with self.assertRaises(IndexError):
+                archive[len(self.games)]
+        with open(path, "r+b") as file:
+            file.write(b"XX")
+        with self.assertRaises(ValueError):
+            GameArchive(path)
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+    def test_archive_that_was_not_closed(self):
+        """Appending recovers the games of an archive whose index was never written
+        """
+        path = os.path.join(tempfile.mkdtemp(), "games.c4g")
+        writer = GameWriter(path)
+        for moves in self.games[:10]:
+            writer.write(moves)
+        # A crash loses the writer without writing the index, and the last game half way
+        writer.file.write(pack_moves(self.games[10])[:-1])
+        writer.file.close()
+        with self.assertRaises(ValueError):
+            GameArchive(path)
+        with GameWriter(path, append=True) as writer:
+            self.assertEqual(len(writer), 10)
+            writer.write(self.games[11])
+            writer.flush()
+            # A crash while the index is written
+            writer.file.truncate(writer.offsets[-1] + 5)
+            writer.file.close()
+        with GameWriter(path, append=True) as writer:
+            self.assertEqual(len(writer), 11)
+        with GameArchive(path) as archive:
+            self.assertEqual(list(archive), self.games[:10] + [self.games[11]])
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
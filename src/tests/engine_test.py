@@ -0,0 +1,87 @@
+import time
+import unittest
+import search
+from bitboard import Position
+from engine import Engine
+from stats import SearchStats
+from transposition import TranspositionTable
+
+class TestEngine(unittest.TestCase):
+
+    def test_table_is_kept_between_moves(self):
+        """A later move starts from the entries of the earlier ones
+        """
+        engine = Engine(1, solver_threshold=0)
+        position = Position.from_moves([3, 3, 2, 4])
+        cold, warm = SearchStats(), SearchStats()
+        first = engine.choose_move(position, 100, max_depth=8, stats=cold)
+        second = engine.choose_move(position, 100, max_depth=8, stats=warm)
+        self.assertEqual(first, second)
+        self.assertLess(warm.nodes, cold.nodes)
+        self.assertEqual(engine.table.generation, 2)
+
+    def test_views_of_both_players_are_kept_apart(self):
+        """Scores stored from the view of one player are not read by a search for the other
+        """
+        table = TranspositionTable(1)
+        position = Position.from_moves([3, 3, 2, 4, 4])
+        _, _, own = search.deepen(position, -search.INF, search.INF, True, table, search.INF,
+                                  max_depth=6)
+        _, _, other = search.deepen(position, -search.INF, search.INF, False, table,
+                                    search.INF, max_depth=6)
+        self.assertEqual(other, -own)
+
+    def test_ponder_hit_continues_search(self):
+        """A correct prediction of the reply lets the background search finish the move
+        """
+        engine = Engine(1)
+        position = Position.from_moves([3, 3, 2, 4])
+        position.play(engine.choose_move(position, 0.2))
+        reply = engine.expected_reply(position)
+        self.assertIsNotNone(reply)
+        engine.ponder(position)
+        time.sleep(0.2)
+        position.play(reply)
+        stats = SearchStats()
+        column = engine.choose_move(position, 0.2, stats=stats)
+        self.assertTrue(position.can_play(column))
+        self.assertEqual(stats.source, "ponder")
+        self.assertEqual(stats.move, column)
+        self.assertIsNone(engine.pondering)
+
+    def test_ponder_hit_uses_solver(self):
+        """A predicted position the solver answers is solved instead of taking the pondered move
+        """
+        engine = Engine(1, solver_threshold=10)
+        position = Position.from_moves([6, 1, 6, 1, 3, 4, 5, 1, 1, 6, 6, 4, 1, 4, 5, 2, 5, 2, 4,
+                                        4, 3, 5, 6, 4, 0, 6])
+        position.play(engine.choose_move(position, 0.2))
+        reply = engine.expected_reply(position)
+        engine.ponder(position)
+        self.assertTrue(engine.pondering.max_player)
+        position.play(reply)
+        engine.solver_threshold = 14
+        stats = SearchStats()
+        column = engine.choose_move(position, 10, stats=stats)
+        self.assertEqual(stats.source, "solver")
+        self.assertEqual(column, engine.solver.best_move(position)[0])
+        self.assertIsNone(engine.pondering)
+
+    def test_ponder_miss_keeps_table(self):
+        """A wrong prediction stops the background search but keeps its entries
+        """
+        engine = Engine(1)
+        position = Position.from_moves([3, 3, 2, 4])
+        position.play(engine.choose_move(position, 0.2))
+        reply = engine.expected_reply(position)
+        engine.ponder(position)
+        time.sleep(0.2)
+        pondered = engine.pondering
+        other = next(col for col in position.valid_moves() if col != reply)
+        position.play(other)
+        stats = SearchStats()
+        column = engine.choose_move(position, 0.2, stats=stats)
+        self.assertTrue(position.can_play(column))
+        self.assertEqual(stats.source, "search")
+        self.assertFalse(pondered.thread.is_alive())
+        self.assertGreater(pondered.stats.tt_stores, 0)
@@ -0,0 +1,55 @@
+import random
+import unittest
+from bitboard import Position
+from evaluation import evaluate, window_counts
+from game import evaluate_position
+
+def random_position(rng, moves):
+    """Plays random moves from the empty board without ending the game"""
+    position = Position()
+    for _ in range(moves):
+        columns = [col for col in position.valid_moves() if not position.is_winning_move(col)]
+        if not columns:
+            break
+        position.play(rng.choice(columns))
+    return position
+
+class TestEvaluation(unittest.TestCase):
+
+    def test_incremental_matches_evaluate_position(self):
+        """The running scores equal evaluate_position for both players on random positions
+        """
+        rng = random.Random(11)
+        for _ in range(200):
+            position = random_position(rng, rng.randint(0, 40))
+            mover_first = position.moves % 2 == 0
+            board = position.to_board(1, 2)
+            self.assertEqual(position.evaluate(mover_first), evaluate_position(board, 1, 1, 2))
+            self.assertEqual(position.evaluate(not mover_first), evaluate_position(board, 2, 1, 2))
+
+    def test_undo_restores_scores(self):
+        """Undoing moves gives back the same window codes and scores
+        """
+        rng = random.Random(5)
+        position = random_position(rng, 12)
+        before = (position.counts[:], position.score_first, position.score_second)
+        played = []
+        for _ in range(10):
+            col = rng.choice(position.valid_moves())
+            position.play(col)
+            played.append(col)
+        for col in reversed(played):
+            position.undo(col)
+        self.assertEqual((position.counts, position.score_first, position.score_second), before)
+
+    def test_window_counts_matches_full_scan(self):
+        """Scores computed from scratch match the scan over every window
+        """
+        rng = random.Random(3)
+        position = random_position(rng, 20)
+        first = position.current ^ position.mask if position.moves % 2 else position.current
+        second = first ^ position.mask
+        _, score_first, score_second = window_counts(first, second)
+        self.assertEqual(score_first, evaluate(first, second))
+        self.assertEqual(score_second, evaluate(second, first))
+        self.assertEqual(score_first, position.score_first)
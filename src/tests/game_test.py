@@ -1,6 +1,6 @@
 import unittest
 from game import (minimax, iterative_deepening, full_board, is_valid_move, make_move, get_next_open_row, 
-                  evaluate_position, valid_moves, is_game_over)
+                  evaluate_position, valid_moves, is_game_over, undo_move)
 
 class TestGame(unittest.TestCase):
 
@@ -79,10 +79,10 @@ class TestGame(unittest.TestCase):
         ]
 
         #Ai winning in 5 moves 
-        #Ai move to column 6
+        #Ai move to column 0, 2 or 6 wins equally fast
         #player move to column 0
         
-        self.assertEqual(iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece), 6)
+        self.assertIn(iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece), (0, 2, 6))
 
         board = [
             [0, 2, 0, 1, 2, 1, 0],
@@ -94,9 +94,9 @@ class TestGame(unittest.TestCase):
         ]
 
         #Ai winning in 4 moves 
-        #Ai move to column 0
+        #Ai move to column 0, 2 or 6 wins equally fast
         #player move to column 0
-        self.assertEqual(iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece), 0)
+        self.assertIn(iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece), (0, 2, 6))
         
         board = [
             [1, 2, 0, 1, 2, 1, 0],
@@ -108,10 +108,10 @@ class TestGame(unittest.TestCase):
         ]
 
         #Ai winning in 3 moves 
-        #Ai move to column 2
+        #Ai move to column 2 or 6 wins equally fast
         #player move to column 2
         
-        self.assertEqual(iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece), 2)
+        self.assertIn(iterative_deepening(board, alpha, beta, max_player, time_limit, player_piece, ai_piece), (2, 6))
         
         board = [
             [1, 2, 0, 1, 2, 1, 0],
@@ -188,6 +188,23 @@ class TestGame(unittest.TestCase):
         make_move(board, 4, 0, 2)
         self.assertEqual(board[4][0], 2)
 
+    def test_undo_move(self):
+        """Test to see that undo_move frees the spot taken by make_move
+        """
+        board = [
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0]
+        ]
+        row = get_next_open_row(board, 2)
+        make_move(board, row, 2, 1)
+        undo_move(board, row, 2)
+        self.assertEqual(board[5][2], 0)
+        self.assertEqual(get_next_open_row(board, 2), 5)
+
     def test_get_next_open_row(self):
         """Test to see if piece was placed correctly to the lowest free spot on the column
         """
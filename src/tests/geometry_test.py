@@ -0,0 +1,167 @@
+import random
+import unittest
+import geometry
+from bitboard import Position, alignment, winning_cells
+from engine import Engine
+from game import (evaluate_position, get_next_open_row, is_game_over, iterative_deepening,
+                  make_move, minimax, valid_moves)
+from geometry import Rules, STANDARD
+from search import WIN_SCORE, Search
+from stats import SearchStats
+from transposition import TranspositionTable
+
+VARIANTS = (STANDARD, Rules(7, 8, 4), Rules(9, 7, 5), Rules(6, 7, 3), Rules(5, 6, 5))
+
+def empty_board(rules):
+    return [[0] * rules.columns for _ in range(rules.rows)]
+
+def play_board(board, moves, rules):
+    """Drops alternating pieces 1 and 2 into the columns and returns the last cell"""
+    cell = None
+    for number, col in enumerate(moves):
+        cell = (get_next_open_row(board, col), col)
+        make_move(board, *cell, 1 + number % 2)
+    return cell
+
+def board_winning_cells(board, piece, rules):
+    """Finds the empty cells that complete a window of the piece by trying every one"""
+    cells = 0
+    for row in range(rules.rows):
+        for col in range(rules.columns):
+            if board[row][col] == 0:
+                board[row][col] = piece
+                if is_game_over(board, (row, col), rules):
+                    cells |= 1 << rules.cell_bit(row, col)
+                board[row][col] = 0
+    return cells
+
+def board_has_line(board, piece, rules):
+    """Checks if any window of the list board is full of the piece"""
+    return any(all(board[row][col] == piece for row, col in cells) for cells in rules.window_cells)
+
+class TestGeometry(unittest.TestCase):
+
+    def test_rules_tables(self):
+        """The standard rules give the tables of the bitboard engine
+        """
+        self.assertEqual(STANDARD.windows, geometry.WINDOWS)
+        self.assertEqual(len(STANDARD.windows), 69)
+        self.assertEqual(STANDARD.preferred_cols, (3, 2, 4, 1, 5, 0, 6))
+        self.assertTrue(STANDARD.is_standard)
+        wide = Rules(6, 8, 5)
+        self.assertFalse(wide.is_standard)
+        self.assertEqual(wide.preferred_cols, (3, 4, 2, 5, 1, 6, 0, 7))
+        self.assertEqual(len(wide.windows), 6 * 4 + 8 * 2 + 2 * 2 * 4)
+        for rows, columns, connect in ((0, 7, 4), (6, 7, 8), (6, 7, 1)):
+            with self.assertRaises(ValueError):
+                Rules(rows, columns, connect)
+
+    def test_positions_match_list_board(self):
+        """Scores and wins of positions equal the list board functions, also after completed windows
+        """
+        rng = random.Random(5)
+        for rules in VARIANTS:
+            completed = 0
+            for _ in range(8):
+                position = Position(rules)
+                board = empty_board(rules)
+                # Games go on after a win, so boards get windows that are
+                # completed by both players
+                while not position.is_draw():
+                    col = rng.choice(position.valid_moves())
+                    piece = 1 + position.moves % 2
+                    won = position.is_winning_move(col)
+                    cell = (get_next_open_row(board, col), col)
+                    make_move(board, *cell, piece)
+                    position.play(col)
+                    self.assertEqual(won, is_game_over(board, cell, rules))
+                    completed += won
+                    self.assertEqual(position.is_won(), board_has_line(board, piece, rules))
+                    for first, own in ((True, 1), (False, 2)):
+                        self.assertEqual(position.evaluate(first),
+                                         evaluate_position(board, own, 1, 2, rules))
+                    for piece, cells in ((1, position.wins[2 * position.moves]),
+                                         (2, position.wins[2 * position.moves + 1])):
+                        self.assertEqual(cells, board_winning_cells(board, piece, rules))
+                mover = 1 + position.moves % 2
+                restored = Position.from_board(board, mover, rules)
+                self.assertEqual(restored.counts, position.counts)
+                self.assertEqual((restored.hash, restored.mirror_hash),
+                                 (position.hash, position.mirror_hash))
+                self.assertEqual(winning_cells(restored.current, restored.mask, rules),
+                                 board_winning_cells(board, mover, rules))
+                self.assertEqual(alignment(restored.current, rules),
+                                 board_has_line(board, mover, rules))
+            self.assertGreater(completed, 8)
+
+    def test_play_and_undo(self):
+        """Undoing moves restores every table of a position on another board
+        """
+        rules = Rules(7, 9, 5)
+        rng = random.Random(2)
+        position = Position(rules)
+        for _ in range(20):
+            position.play(rng.choice(position.valid_moves()))
+        before = position.copy()
+        played = []
+        while position.valid_moves() and len(played) < 25:
+            col = rng.choice(position.valid_moves())
+            position.play(col)
+            played.append(col)
+        for col in reversed(played):
+            position.undo(col)
+        for name in Position.__slots__:
+            if name != "wins":
+                self.assertEqual(getattr(position, name), getattr(before, name))
+        # Entries above the current move are left for the next play to overwrite
+        self.assertEqual(position.wins[:2 * position.moves + 2],
+                         before.wins[:2 * before.moves + 2])
+        board = position.to_board(1, 2)
+        self.assertEqual(Position.from_board(board, 1, rules).counts, position.counts)
+
+    def test_wins_on_other_boards(self):
+        """Wins are found in every direction with the length of the rules
+        """
+        for rules, moves in ((Rules(7, 8, 4), [7, 0, 7, 0, 7, 0, 7]),
+                             (Rules(6, 9, 5), [0, 0, 1, 1, 2, 2, 3, 3, 4]),
+                             (Rules(6, 7, 3), [0, 1, 1, 2, 3, 2, 2])):
+            board = empty_board(rules)
+            last = play_board(board, moves[:-1], rules)
+            self.assertFalse(is_game_over(board, last, rules))
+            position = Position.from_moves(moves[:-1], rules)
+            self.assertTrue(position.is_winning_move(moves[-1]))
+            position.play(moves[-1])
+            self.assertTrue(position.is_won())
+            last = (get_next_open_row(board, moves[-1]), moves[-1])
+            make_move(board, *last, 2 - len(moves) % 2)
+            self.assertTrue(is_game_over(board, last, rules))
+        self.assertFalse(is_game_over(board, last, Rules(6, 7, 4)))
+
+    def test_engine_wins_and_blocks(self):
+        """The engine takes a win and blocks a threat of the opponent on another board
+        """
+        rules = Rules(9, 7, 5)
+        engine = Engine()
+        stats = SearchStats()
+        position = Position.from_moves([1, 6, 2, 6, 3, 0, 4, 6], rules)
+        self.assertEqual(engine.choose_move(position, 5, max_depth=4, stats=stats), 5)
+        self.assertEqual(stats.source, "search")
+        position = Position.from_moves([1, 6, 2, 6, 3, 0, 4], rules)
+        self.assertEqual(engine.choose_move(position, 5, max_depth=4), 5)
+
+        board = empty_board(rules)
+        play_board(board, [1, 6, 2, 6, 3, 0, 4], rules)
+        self.assertEqual(iterative_deepening(board, -float("inf"), float("inf"), True, 0.5, 1, 2,
+                                             rules), 5)
+        make_move(board, get_next_open_row(board, 6), 6, 2)
+        self.assertEqual(minimax(board, 3, -float("inf"), float("inf"), False, 1, 2, {}, rules),
+                         (5, -WIN_SCORE))
+        self.assertEqual(valid_moves(board, rules), list(rules.preferred_cols))
+
+    def test_search_limits(self):
+        """Boards whose columns the table cannot store and batched variants are refused
+        """
+        with self.assertRaises(ValueError):
+            Search(TranspositionTable(), rules=Rules(6, 16, 4))
+        with self.assertRaises(ValueError):
+            Search(TranspositionTable(), batch_leaves=True, rules=Rules(7, 8, 4))
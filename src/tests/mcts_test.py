@@ -0,0 +1,61 @@
+import random
+import threading
+import unittest
+from bitboard import Position
+from mcts import MctsEngine, playout
+from stats import SearchStats
+
+class TestMcts(unittest.TestCase):
+
+    def test_playout_takes_wins_and_blocks(self):
+        """A playout wins at once when it can and loses at once against two threats
+        """
+        rng = random.Random(1)
+        position = Position.from_moves([0, 6, 1, 6, 2])
+        self.assertEqual(playout(position.current ^ position.mask, position.mask,
+                                 position.moves - 1, rng), 1.0)
+        position = Position.from_moves([1, 6, 2, 6, 3])
+        self.assertEqual(playout(position.current, position.mask, position.moves, rng), 0.0)
+        results = {playout(0, 0, 0, rng) for _ in range(50)}
+        self.assertTrue(results <= {0.0, 0.5, 1.0})
+
+    def test_finds_win_and_block(self):
+        """The engine plays an immediate win and blocks the only threat of the opponent
+        """
+        engine = MctsEngine(seed=1)
+        self.assertEqual(engine.choose_move(Position.from_moves([0, 6, 1, 6, 2, 6]), 10,
+                                            max_nodes=500), 3)
+        self.assertEqual(engine.choose_move(Position.from_moves([0, 6, 1, 6, 2]), 10,
+                                            max_nodes=2000), 3)
+
+    def test_tree_is_reused_after_moves(self):
+        """The next search starts from the node of the reached position
+        """
+        engine = MctsEngine(seed=2)
+        position = Position.from_moves([3, 3])
+        stats = SearchStats()
+        column = engine.choose_move(position, 10, max_nodes=3000, stats=stats)
+        self.assertEqual((stats.nodes, stats.source, stats.move), (3000, "mcts", column))
+        position.play(column)
+        reply = max(engine.root.children, key=lambda child: child.visits)
+        reply = max(reply.children, key=lambda child: child.visits).move
+        node = [child for child in engine.root.children if child.move == column][0]
+        node = [child for child in node.children if child.move == reply][0]
+        visits = node.visits
+        position.play(reply)
+        engine.choose_move(position, 10, max_nodes=100)
+        self.assertIs(engine.root, node)
+        self.assertIsNone(node.parent)
+        self.assertEqual(node.visits, visits + 100)
+
+    def test_time_limit_and_stop(self):
+        """At least one playout is run and a set stop event ends the search
+        """
+        engine = MctsEngine(seed=3)
+        position = Position.from_moves([3, 3, 2, 4])
+        self.assertTrue(position.can_play(engine.choose_move(position, 0)))
+        stop = threading.Event()
+        stop.set()
+        stats = SearchStats()
+        engine.choose_move(Position(), 100, stop=stop, stats=stats)
+        self.assertLessEqual(stats.nodes, 64)
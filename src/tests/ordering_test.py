@@ -0,0 +1,56 @@
+import unittest
+import search
+from bitboard import Position, winning_cells
+from ordering import MoveOrdering, COLUMN_BITS
+from transposition import TranspositionTable
+
+def columns(keys):
+    """Columns of ordering keys up to the end marker"""
+    return [key & COLUMN_BITS for key in keys if key >= 0]
+
+class TestOrdering(unittest.TestCase):
+
+    def test_winning_cells(self):
+        """Winning cells are found in every direction, including cells that are not playable yet
+        """
+        position = Position.from_moves([0, 6, 1, 6, 2])
+        self.assertTrue(winning_cells(position.current ^ position.mask, position.mask)
+                        >> position.heights[3] & 1)
+        position = Position.from_moves([3, 0, 3, 0, 3])
+        self.assertEqual(winning_cells(position.current ^ position.mask, position.mask),
+                         1 << position.heights[3])
+
+    def test_wins_and_blocks_first(self):
+        """An immediate win is tried first and a forced block before the other moves
+        """
+        ordering = MoveOrdering()
+        position = Position.from_moves([0, 6, 1, 6, 2, 6])
+        self.assertEqual(columns(ordering.order(position, 5, 4, 0))[:3], [3, 5, 6])
+        position = Position.from_moves([0, 6, 1, 6, 5])
+        self.assertEqual(columns(ordering.order(position, None, 4, 0))[0], 6)
+
+    def test_killers_and_history(self):
+        """Cutoff moves become killers of their ply and raise their history score on every ply
+        """
+        ordering = MoveOrdering()
+        position = Position.from_moves([3, 3])
+        ordering.cutoff(position, 0, 3, 2)
+        ordering.cutoff(position, 6, 3, 2)
+        self.assertEqual(ordering.killers[2], [6, 0])
+        self.assertEqual(ordering.history[0][position.heights[6]], 9)
+        self.assertEqual(columns(ordering.order(position, None, 4, 2))[:2], [6, 0])
+        self.assertEqual(set(columns(ordering.order(position, None, 4, 3))[:2]), {0, 6})
+
+    def test_full_columns_are_left_out(self):
+        """Full columns get no ordering key
+        """
+        position = Position.from_moves([3, 3, 3, 3, 3, 3])
+        self.assertEqual(sorted(columns(MoveOrdering().order(position, None, 1, 0))),
+                         [0, 1, 2, 4, 5, 6])
+
+    def test_ordering_is_shared_by_iterations(self):
+        """Killer moves found by one search are used by the next search with the same object
+        """
+        searcher = search.Search(TranspositionTable(1))
+        searcher.minimax(Position.from_moves([3, 3, 2, 4]), 5, -search.INF, search.INF, True, 0)
+        self.assertTrue(any(killers[0] >= 0 for killers in searcher.ordering.killers))
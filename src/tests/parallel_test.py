@@ -0,0 +1,35 @@
+import unittest
+from multiprocessing import RawArray
+from bitboard import Position
+from parallel import ParallelSearch, parallel_iterative_deepening
+from transposition import TranspositionTable, table_slots, EXACT, entry_score
+
+class TestParallel(unittest.TestCase):
+
+    def test_shared_buffer_table(self):
+        """A table in a shared buffer stores and probes like a normal table
+        """
+        memory = RawArray("q", 2 * table_slots(1))
+        table = TranspositionTable(1, buffer=memory)
+        other_view = TranspositionTable(1, buffer=memory)
+        table.store(99, 12, 3, EXACT, 2)
+        self.assertEqual(entry_score(other_view.probe(99)), 12)
+        with self.assertRaises(ValueError):
+            TranspositionTable(2, buffer=memory)
+
+    def test_parallel_search_finds_win(self):
+        """Helpers and the main search together find the same move as one process
+        """
+        position = Position.from_moves([3, 4, 3, 4, 3, 5])
+        self.assertEqual(parallel_iterative_deepening(position, True, 2, 2), 3)
+
+    def test_fixed_depth_with_workers(self):
+        """A fixed depth search with helpers completes the requested depth
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        with ParallelSearch(3) as parallel:
+            column, depth, _ = parallel.search(position, True, max_depth=6)
+            self.assertEqual(depth, 6)
+            self.assertTrue(position.can_play(column))
+            column, depth, _ = parallel.search(position, True, max_depth=7)
+            self.assertEqual(depth, 7)
@@ -0,0 +1,76 @@
+import io
+import json
+import time
+import unittest
+from unittest import mock
+from protocol import EngineProtocol
+
+class TestProtocol(unittest.TestCase):
+
+    def setUp(self):
+        self.output = io.StringIO()
+        self.protocol = EngineProtocol(self.output)
+
+    def command(self, *lines):
+        """Handles command lines, waits for the search and returns the new response lines"""
+        start = self.output.tell()
+        for line in lines:
+            self.protocol.handle(line)
+        self.protocol.stop_search()
+        self.output.seek(start)
+        return self.output.read().splitlines()
+
+    def test_search_commands(self):
+        """Positions are searched with the limits of go and answered with info and bestmove
+        """
+        self.assertEqual(self.command("ready"), ["readyok"])
+        self.assertIsNone(self.protocol.engine)
+        response = self.command("position startpos moves 3 3 2 2 4 4", "go depth 4")
+        self.assertIn(response[-1], ("bestmove 1", "bestmove 5"))
+        self.assertRegex(response[0], "^info depth [0-9]+ score 1000 nodes ")
+        response = self.command("position moves 33225", "go nodes 500")
+        self.assertTrue(response[-1].startswith("bestmove "))
+        stats = json.loads(self.command("stats")[0][len("stats "):])
+        self.assertEqual((stats["searches"], stats["moves"]), (2, [3, 3, 2, 2, 5]))
+        self.assertLessEqual(stats["last"]["nodes"], 500 + 1024)
+
+    def test_stop_and_new_game(self):
+        """Stop ends an infinite search and a new game keeps the engine and its table
+        """
+        self.command("position moves 3324425106")
+        engine = self.protocol.engine
+        start = time.monotonic()
+        self.protocol.handle("go infinite")
+        time.sleep(0.1)
+        self.protocol.handle("go depth 2")
+        response = self.command("stop")
+        self.assertIn("error a search is running\n", self.output.getvalue())
+        self.assertEqual(response[-1][:9], "bestmove ")
+        self.assertLess(time.monotonic() - start, 5)
+        self.command("newgame", "stats")
+        self.assertIs(self.protocol.engine, engine)
+        self.assertEqual(self.protocol.moves, [])
+        self.assertFalse(self.protocol.handle("quit"))
+
+    def test_errors(self):
+        """Bad commands are answered with an error and change nothing
+        """
+        self.command("position moves 33")
+        self.assertEqual(self.command("castle"), ["error unknown command castle"])
+        self.assertEqual(self.command("position moves 3 3 2 2 4 4 1 1"),
+                         ["error illegal move 1 at move 8"])
+        self.assertEqual(self.command("position moves 9")[0][:6], "error ")
+        self.assertEqual(self.command("go depth"), ["error depth needs a number"])
+        self.assertEqual(self.command("go ponder"), ["error unknown go option ponder"])
+        self.assertEqual(self.protocol.moves, [3, 3])
+        self.assertEqual(self.command("position moves 3232323", "go"), ["bestmove none"])
+
+    def test_failed_search(self):
+        """A search that raises is answered with an error and no best move
+        """
+        self.command("position moves 3324425106")
+        self.protocol.engine = mock.Mock()
+        self.protocol.engine.choose_move.side_effect = RuntimeError("table is broken")
+        self.assertEqual(self.command("go depth 4"),
+                         ["error search failed: table is broken", "bestmove none"])
+        self.assertEqual(self.command("ready"), ["readyok"])
@@ -0,0 +1,150 @@
+import time
+import unittest
+import search
+from bench import count_collections
+from bitboard import Position
+from ordering import COLUMN_BITS
+from stats import SearchStats
+from transposition import TranspositionTable
+
+class TestSearch(unittest.TestCase):
+
+    def test_search_restores_position(self):
+        """Searching plays and undoes moves in place without changing the position
+        """
+        position = Position.from_moves([3, 3, 2, 4, 4, 2])
+        before = (position.current, position.mask, position.moves, position.hash)
+        search.minimax(position, 5, -search.INF, search.INF, True, TranspositionTable(1))
+        self.assertEqual((position.current, position.mask, position.moves, position.hash), before)
+
+    def test_search_does_not_allocate_per_node(self):
+        """The searched nodes do not create container objects
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        searcher = search.Search(TranspositionTable(1))
+        _, collections = count_collections(
+            lambda: searcher.minimax(position, 7, -search.INF, search.INF, True, 0))
+        self.assertGreater(searcher.nodes, 1000)
+        self.assertLess(collections, searcher.nodes / 100)
+
+    def test_mirror_image_uses_same_entries(self):
+        """A search of the mirror image finds the entries with mirrored moves
+        """
+        table = TranspositionTable(1)
+        position = Position.from_moves([1, 2, 1, 3])
+        searcher = search.Search(table)
+        score = searcher.minimax(position, 6, -search.INF, search.INF, True, 0)
+        column = searcher.best_moves[0]
+        searcher = search.Search(table)
+        mirrored = Position.from_moves([5, 4, 5, 3])
+        self.assertEqual(searcher.minimax(mirrored, 6, -search.INF, search.INF, True, 0), score)
+        self.assertEqual(searcher.best_moves[0], 6 - column)
+        self.assertEqual(searcher.nodes, 1)
+
+    def test_principal_variation_search_matches_minimax(self):
+        """Null-window searches and re-searches give the scores of a plain minimax
+        """
+        def plain(position, depth, max_player):
+            if position.is_draw():
+                return 0
+            if depth == 0:
+                return position.evaluate(max_player != position.moves & 1)
+            values = []
+            for col in position.valid_moves():
+                if position.is_winning_move(col):
+                    return search.WIN_SCORE if max_player else -search.WIN_SCORE
+                position.play(col)
+                values.append(plain(position, depth - 1, not max_player))
+                position.undo(col)
+            return max(values) if max_player else min(values)
+
+        for moves in ([3, 3, 2], [3, 2, 4, 4, 1], [0, 6, 3, 3, 3, 2]):
+            position = Position.from_moves(moves)
+            for max_player in (True, False):
+                searcher = search.Search(TranspositionTable(1),
+                                         perspective=search.perspective_key(position, max_player))
+                self.assertEqual(searcher.minimax(position, 4, -search.INF, search.INF,
+                                                  max_player, 0),
+                                 plain(position, 4, max_player))
+
+    def test_aspiration_window_is_widened(self):
+        """A guess far from the score fails and the widened search finds the true score
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        expected = search.Search(TranspositionTable(1)).minimax(position, 6, -search.INF,
+                                                                 search.INF, True, 0)
+        stats = SearchStats()
+        searcher = search.Search(TranspositionTable(1), stats=stats)
+        for guess in (expected - 50, expected + 50):
+            self.assertEqual(searcher.aspiration(position, 6, -search.INF, search.INF, True,
+                                                 guess), expected)
+        self.assertGreater(stats.researches, 1)
+
+    def test_immediate_wins_and_losses_are_not_searched(self):
+        """A win, two threats of the opponent and a single forced block end the node early
+        """
+        position = Position.from_moves([0, 6, 1, 6, 2, 6])
+        searcher = search.Search(TranspositionTable(1))
+        self.assertEqual(searcher.minimax(position, 5, -search.INF, search.INF, True, 0),
+                         search.WIN_SCORE)
+        self.assertEqual((searcher.nodes, searcher.best_moves[0]), (1, 3))
+        position = Position.from_moves([1, 6, 2, 6, 3])
+        searcher = search.Search(TranspositionTable(1))
+        self.assertEqual(searcher.minimax(position, 5, -search.INF, search.INF, True, 0),
+                         -search.WIN_SCORE)
+        self.assertEqual(searcher.nodes, 1)
+        position = Position.from_moves([0, 6, 1, 6, 2])
+        searcher = search.Search(TranspositionTable(1))
+        searcher.minimax(position, 1, -search.INF, search.INF, True, 0)
+        self.assertEqual((searcher.nodes, searcher.best_moves[0]), (2, 3))
+
+    def test_moves_below_opponent_wins_are_skipped(self):
+        """A move that lets the opponent win right above it is not searched
+        """
+        position = Position.from_moves([6, 5, 3, 3, 5, 4, 1, 4, 4])
+        self.assertTrue(position.opponent_winning_cells() >> 1 & 1 << position.heights[3])
+        searcher = search.Search(TranspositionTable(1))
+        searcher.minimax(position, 2, -search.INF, search.INF, True, 0)
+        searched = [key & COLUMN_BITS for key in searcher.ordering.buffers[0] if key >= 0]
+        self.assertEqual(sorted(searched), [0, 1, 2, 4, 5, 6])
+
+    def test_search_aborts_at_deadline(self):
+        """A search past its deadline raises SearchTimeout
+        """
+        searcher = search.Search(TranspositionTable(1), deadline=time.monotonic())
+        with self.assertRaises(search.SearchTimeout):
+            searcher.minimax(Position.from_moves([3, 3]), 12, -search.INF, search.INF, True, 0)
+
+    def test_timeout_after_fail_low_has_no_root_move(self):
+        """A search aborted after its window failed low does not offer an upper bound as its move
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        stats = SearchStats()
+        searcher = search.Search(TranspositionTable(1), stats=stats,
+                                 max_nodes=10 * search.CHECK_INTERVAL)
+        with self.assertRaises(search.SearchTimeout):
+            searcher.aspiration(position, 10, -search.INF, search.INF, True, 48)
+        self.assertGreater(stats.researches, 0)
+        self.assertIsNone(searcher.root_move)
+
+    def test_iterative_deepening_keeps_time_limit(self):
+        """Iterative deepening returns a legal move within the time limit
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        before = position.hash
+        start = time.monotonic()
+        column = search.iterative_deepening(position, -search.INF, search.INF, True, 0.3)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertTrue(position.can_play(column))
+        self.assertEqual(position.hash, before)
+
+    def test_iterative_deepening_stops_on_full_board(self):
+        """A full board has no move and a solved position does not use the whole time limit
+        """
+        full = Position.from_moves([0] * 6 + [1] * 6 + [2] * 6 + [4] * 6 + [3] * 6
+                                   + [5] * 6 + [6] * 6)
+        self.assertIsNone(search.iterative_deepening(full, -search.INF, search.INF, True, 1))
+        start = time.monotonic()
+        winning = Position.from_moves([3, 4, 3, 4, 3, 4])
+        self.assertEqual(search.iterative_deepening(winning, -search.INF, search.INF, True, 5), 3)
+        self.assertLess(time.monotonic() - start, 1)
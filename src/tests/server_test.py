@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from codec import GameArchive
+from server import EngineServer, Game, load_test
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine_server = EngineServer(workers=1, queue_size=2)
+        server = await self.engine_server.start(port=0)
+        self.port = server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.engine_server.close()
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+        async def call(request):
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+        return call, writer
+
+    async def test_play_a_game(self):
+        """Moves of the client and the engine are played into the game
+        """
+        call, writer = await self.connect()
+        state = await call({"id": 1, "type": "new", "game": "a", "moves": [3, 3]})
+        self.assertEqual((state["id"], state["moves"]), (1, [3, 3]))
+        state = await call({"id": 2, "type": "play", "game": "a", "column": 2})
+        self.assertEqual(state["moves"], [3, 3, 2])
+        state = await call({"id": 3, "type": "go", "game": "a", "time_limit": 1, "max_depth": 4})
+        self.assertEqual(len(state["moves"]), 4)
+        self.assertEqual(state["move"], state["moves"][-1])
+        writer.close()
+
+    async def test_errors(self):
+        """Illegal requests get an error response and the connection stays usable
+        """
+        call, writer = await self.connect()
+        await call({"id": 1, "type": "new", "game": "a", "moves": [0] * 6})
+        self.assertIn("error", await call({"id": 2, "type": "play", "game": "a", "column": 0}))
+        self.assertIn("error", await call({"id": 3, "type": "go", "game": "b"}))
+        self.assertIn("error", await call({"id": 4, "type": "resign", "game": "a"}))
+        self.assertIn("error", await call({"id": 5}))
+        state = await call({"id": 6, "type": "play", "game": "a", "column": 1})
+        self.assertEqual(state["moves"][-1], 1)
+        writer.close()
+
+    async def test_game_ids(self):
+        """Default ids are never reused and an existing id cannot be started again
+        """
+        call, writer = await self.connect()
+        self.assertEqual((await call({"id": 1, "type": "new"}))["game"], "g1")
+        self.assertEqual((await call({"id": 2, "type": "new", "moves": [3]}))["game"], "g2")
+        await call({"id": 3, "type": "close", "game": "g1"})
+        self.assertEqual((await call({"id": 4, "type": "new"}))["game"], "g3")
+        state = await call({"id": 5, "type": "play", "game": "g2", "column": 4})
+        self.assertEqual(state["moves"], [3, 4])
+        self.assertIn("error", await call({"id": 6, "type": "new", "game": "g2"}))
+        await call({"id": 7, "type": "new", "game": "g4"})
+        self.assertEqual((await call({"id": 8, "type": "new"}))["game"], "g5")
+        state = await call({"id": 9, "type": "play", "game": "g2", "column": 3})
+        self.assertEqual(state["moves"], [3, 4, 3])
+        writer.close()
+
+    async def test_disconnect_stops_search(self):
+        """A client that disconnects does not keep the only search process busy
+        """
+        call, writer = await self.connect()
+        await call({"id": 1, "type": "new", "game": "slow", "moves": [3, 3]})
+        writer.write(b'{"id": 2, "type": "go", "game": "slow", "time_limit": 8}\n')
+        await writer.drain()
+        await asyncio.sleep(0.5)
+        writer.close()
+        call, writer = await self.connect()
+        await call({"id": 1, "type": "new", "game": "fast", "moves": [3, 3]})
+        start = time.monotonic()
+        state = await call({"id": 2, "type": "go", "game": "fast", "max_depth": 3})
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual(len(state["moves"]), 3)
+        writer.close()
+
+    async def test_many_games_at_once(self):
+        """Games on many connections are answered while the queue is full
+        """
+        result = await load_test(12, port=self.port, time_limit=0.5, max_depth=2)
+        self.assertEqual(result["games"], 12)
+        self.assertGreater(result["moves"], 12)
+
+    async def test_finished_games_are_archived(self):
+        """Games that end on the server are appended to the archive, whose index is written
+        after flush_games games and when the server closes
+        """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "games.c4g")
+        for count in range(1, 3):
+            engine_server = EngineServer(workers=1, archive=path, flush_games=2)
+            server = await engine_server.start(port=0)
+            self.port = server.sockets[0].getsockname()[1]
+            call, writer = await self.connect()
+            await call({"id": 1, "type": "new", "game": "a", "moves": [3, 4, 3, 4, 3, 4]})
+            await call({"id": 2, "type": "new", "game": "b", "moves": [3]})
+            state = await call({"id": 3, "type": "go", "game": "a", "max_depth": 2})
+            await call({"id": 4, "type": "play", "game": "b", "column": 3})
+            self.assertEqual(engine_server.unflushed, 1)
+            await call({"id": 5, "type": "new", "game": "c", "moves": state["moves"][:-1]})
+            await call({"id": 6, "type": "play", "game": "c", "column": state["moves"][-1]})
+            self.assertEqual(engine_server.unflushed, 0)
+            with GameArchive(path) as archive:
+                self.assertEqual(len(archive), 3 * count - 1)
+            await call({"id": 7, "type": "new", "game": "d", "moves": state["moves"][:-1]})
+            await call({"id": 8, "type": "play", "game": "d", "column": state["moves"][-1]})
+            writer.close()
+            await engine_server.close()
+        with GameArchive(path) as archive:
+            self.assertEqual(list(archive), [state["moves"]] * 6)
+            self.assertEqual(state["result"], "first")
+        os.remove(path)
+        os.rmdir(directory)
+
+class TestGame(unittest.TestCase):
+
+    def test_result(self):
+        """A game knows its winner and refuses moves after the end
+        """
+        game = Game([3, 4, 3, 4, 3, 4])
+        self.assertIsNone(game.state()["result"])
+        game.play(3)
+        self.assertEqual(game.state()["result"], "first")
+        with self.assertRaises(ValueError):
+            game.play(0)
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+import unittest
+import search
+from bitboard import Position
+from limits import CHECK_INTERVAL, SearchTimeout
+from solver import SOLVED_KEY, Solver, win_score
+from stats import SearchStats
+from transposition import TranspositionTable, MAX_DEPTH, entry_depth
+
+def brute_force(position):
+    """Exact score of a position by searching every move without pruning"""
+    if position.is_draw():
+        return 0
+    for col in position.valid_moves():
+        if position.is_winning_move(col):
+            return win_score(position.moves)
+    best = -search.INF
+    for col in position.valid_moves():
+        position.play(col)
+        best = max(best, -brute_force(position))
+        position.undo(col)
+    return best
+
+def random_position(rng, empty_cells):
+    """Plays random moves that do not win until the given number of cells is empty"""
+    position = Position()
+    while position.moves < 42 - empty_cells:
+        columns = [col for col in position.valid_moves() if not position.is_winning_move(col)]
+        if not columns:
+            return None
+        position.play(rng.choice(columns))
+    return position
+
+class TestSolver(unittest.TestCase):
+
+    def test_solve_matches_brute_force(self):
+        """Null-window searches find the same exact scores as a full search
+        """
+        rng = random.Random(4)
+        solver = Solver(TranspositionTable(1))
+        checked = 0
+        while checked < 20:
+            position = random_position(rng, 8)
+            if position is None:
+                continue
+            self.assertEqual(solver.solve(position), brute_force(position))
+            checked += 1
+
+    def test_best_move_prefers_faster_win(self):
+        """A win with the next move scores higher than any slower win
+        """
+        position = Position.from_moves([3, 4, 3, 4, 3, 4])
+        column, score = Solver().best_move(position)
+        self.assertEqual(column, 3)
+        self.assertEqual(score, win_score(6))
+        self.assertEqual(Solver().best_move(Position.from_moves([0] * 6 + [1] * 6 + [2] * 6
+                                                                + [4] * 6 + [3] * 6 + [5] * 6
+                                                                + [6] * 6)), (None, 0))
+
+    def test_solved_bounds_are_stored(self):
+        """Solved positions are stored in the table with the maximum depth
+        """
+        position = random_position(random.Random(1), 10)
+        table = TranspositionTable(1)
+        Solver(table).solve(position)
+        self.assertEqual(entry_depth(table.probe(position.canonical_hash()[0] ^ SOLVED_KEY)),
+                         MAX_DEPTH)
+
+    def test_timeout_falls_back_to_search(self):
+        """A solver past its deadline is aborted and iterative deepening still answers
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        with self.assertRaises(SearchTimeout):
+            Solver().best_move(position, time.monotonic())
+        stats = SearchStats()
+        column = search.iterative_deepening(position, -search.INF, search.INF, True, 0.4,
+                                            solver_threshold=42, stats=stats)
+        self.assertTrue(position.can_play(column))
+        self.assertEqual(stats.source, "search")
+        # The search gets the time the solver left over, not just the first iteration
+        self.assertGreater(stats.iterations[-1]["depth"], 3)
+        self.assertLess(stats.seconds, 0.4 + 0.2)
+
+    def test_stop_and_node_budget_abort_the_solver(self):
+        """Without a time limit the stop event and the node budget still end the solver
+        """
+        position = Position.from_moves([3, 3, 2, 4])
+        stop = threading.Event()
+        stop.set()
+        with self.assertRaises(SearchTimeout):
+            Solver().best_move(position, stop=stop)
+        solver = Solver()
+        with self.assertRaises(SearchTimeout):
+            solver.best_move(position, max_nodes=3 * CHECK_INTERVAL)
+        self.assertLessEqual(solver.nodes, 3 * CHECK_INTERVAL)
+        stats = SearchStats()
+        column = search.iterative_deepening(position, -search.INF, search.INF, True, search.INF,
+                                            solver_threshold=42, stats=stats,
+                                            max_nodes=5 * CHECK_INTERVAL)
+        self.assertTrue(position.can_play(column))
+        self.assertEqual(stats.source, "search")
+        self.assertLessEqual(stats.nodes, 6 * CHECK_INTERVAL)
+
+    def test_search_reads_solved_positions(self):
+        """A search sharing the table of the solver finds the proven loss without searching it
+        """
+        position = random_position(random.Random(3), 12)
+        plain = search.Search(TranspositionTable(1))
+        self.assertGreater(plain.minimax(position, 2, -search.INF, search.INF, True, 0),
+                           -search.WIN_SCORE)
+        table = TranspositionTable(1)
+        _, score = Solver(table).best_move(position)
+        self.assertLess(score, 0)
+        searcher = search.Search(table, solved_cells=12)
+        self.assertEqual(searcher.minimax(position, 2, -search.INF, search.INF, True, 0),
+                         -search.WIN_SCORE)
+        self.assertLess(searcher.nodes, plain.nodes)
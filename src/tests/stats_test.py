@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+import search
+from bitboard import Position
+from stats import SearchStats, JsonLinesTrace, principal_variation
+from transposition import TranspositionTable
+
+class TestStats(unittest.TestCase):
+
+    def test_deepen_fills_stats(self):
+        """Every completed iteration is recorded and the totals add up
+        """
+        stats = SearchStats()
+        position = Position.from_moves([3, 3, 2, 4])
+        table = TranspositionTable(1)
+        column, depth, _ = search.deepen(position, -search.INF, search.INF, True, table,
+                                         search.INF, max_depth=6, stats=stats)
+        self.assertEqual([record["depth"] for record in stats.iterations], [3, 4, 5, 6])
+        self.assertEqual(sum(record["nodes"] for record in stats.iterations), stats.nodes)
+        self.assertEqual(stats.principal_variation[0], column)
+        self.assertEqual(len(stats.principal_variation), depth)
+        self.assertGreater(stats.leaves, 0)
+        self.assertGreater(stats.branching_factor, 1)
+        for rate in (stats.cutoff_rate, stats.first_move_cutoff_rate, stats.tt_hit_rate):
+            self.assertTrue(0 < rate <= 1)
+
+    def test_principal_variation_restores_position(self):
+        """Following the table moves leaves the position as it was
+        """
+        position = Position.from_moves([3, 3])
+        table = TranspositionTable(1)
+        search.minimax(position, 5, -search.INF, search.INF, True, table)
+        before = (position.current, position.mask, position.hash)
+        self.assertEqual(len(principal_variation(position, table, 5)), 5)
+        self.assertEqual((position.current, position.mask, position.hash), before)
+
+    def test_trace_writes_json_lines(self):
+        """The trace sink writes one JSON object per move with the source of the move
+        """
+        output = io.StringIO()
+        trace = JsonLinesTrace(output)
+        search.iterative_deepening(Position(), -search.INF, search.INF, True, 1, trace=trace)
+        search.iterative_deepening(Position.from_moves([3, 3, 2, 4]), -search.INF, search.INF,
+                                   True, 0.2, trace=trace)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([record["source"] for record in records], ["book", "search"])
+        self.assertEqual(records[0]["move"], 3)
+        self.assertEqual(records[1]["moves"], 4)
+        self.assertGreater(records[1]["nodes_per_second"], 0)
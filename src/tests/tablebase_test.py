@@ -0,0 +1,122 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import search
+import tablebase
+from bitboard import Position
+from solver import Solver
+from stats import SearchStats
+from tablebase import Tablebase, canonical, generate_tablebase, load_tablebase
+from transposition import TranspositionTable
+
+ROOT = [int(col) for col in "4614000066436405553015436462"]
+EMPTY_CELLS = 12
+
+def covered_positions(position):
+    """Lists the positions below a root that the tablebase has to contain"""
+    found = []
+    if position.own_winning_cells() & position.possible():
+        return found
+    for col in position.valid_moves():
+        position.play(col)
+        if not position.is_draw():
+            if 42 - position.moves <= EMPTY_CELLS:
+                found.append(position.copy())
+            found.extend(covered_positions(position))
+        position.undo(col)
+    return found
+
+class TestTablebase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "tablebase.bin")
+        self.root = Position.from_moves(ROOT)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    def test_canonical_keys(self):
+        """Keys mirror like the keys of positions
+        """
+        rng = random.Random(3)
+        for _ in range(50):
+            position = Position()
+            for _ in range(rng.randrange(42)):
+                position.play(rng.choice(position.valid_moves()))
+            self.assertEqual(canonical(position.key()), position.canonical_key()[0])
+
+    def test_scores_match_solver(self):
+        """Every position reachable from the root is stored with its exact solver score
+        """
+        count = generate_tablebase(self.path, [self.root], EMPTY_CELLS)
+        table = Tablebase(self.path)
+        positions = covered_positions(self.root)
+        self.assertEqual(len({position.canonical_key()[0] for position in positions}), count)
+        solver = Solver(TranspositionTable(1))
+        for position in positions[::7]:
+            self.assertEqual(table.probe(position), solver.solve(position))
+        self.assertIsNone(table.probe(self.root))
+        self.assertIsNone(table.probe(Position.from_moves([0] * 6 + [1] * 6 + [2] * 6
+                                                          + [4] * 6 + [3] * 6)))
+        table.close()
+        self.assertIsNone(load_tablebase(os.path.join(self.directory, "missing.bin")))
+
+    def test_parallel_and_resumed_generation(self):
+        """Processes and an interrupted generation write the same file as one process
+        """
+        count = generate_tablebase(self.path, [self.root], EMPTY_CELLS, chunk_size=50)
+        expected = self.read(self.path)
+        parallel = os.path.join(self.directory, "parallel.bin")
+        generate_tablebase(parallel, [self.root], EMPTY_CELLS, workers=2, chunk_size=50)
+        self.assertEqual(self.read(parallel), expected)
+
+        resumed = os.path.join(self.directory, "resumed.bin")
+        solve_key = tablebase.solve_key
+        calls = []
+        def interrupted(*arguments):
+            calls.append(arguments)
+            if len(calls) > 400:
+                raise KeyboardInterrupt()
+            return solve_key(*arguments)
+        with mock.patch("tablebase.solve_key", interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                generate_tablebase(resumed, [self.root], EMPTY_CELLS, chunk_size=50)
+        self.assertTrue(os.path.isdir(resumed + ".work"))
+        with self.assertRaises(ValueError):
+            generate_tablebase(resumed, [self.root], EMPTY_CELLS - 1)
+        with mock.patch("tablebase.solve_key", side_effect=solve_key) as solved:
+            generate_tablebase(resumed, [self.root], EMPTY_CELLS, chunk_size=50)
+        self.assertEqual(self.read(resumed), expected)
+        self.assertLess(solved.call_count, count - 300)
+        self.assertFalse(os.path.exists(resumed + ".work"))
+
+    def test_searches_stop_at_tablebase(self):
+        """Solver and search read covered positions instead of searching below them
+        """
+        generate_tablebase(self.path, [self.root], EMPTY_CELLS)
+        table = Tablebase(self.path)
+        plain, probing = Solver(), Solver(tablebase=table)
+        self.assertEqual(probing.solve(self.root.copy()), plain.solve(self.root.copy()))
+        self.assertLess(probing.nodes, plain.nodes / 2)
+
+        stats = SearchStats()
+        search.deepen(self.root, -search.INF, search.INF, True, TranspositionTable(1),
+                      search.INF, max_depth=4, stats=stats, tablebase=table)
+        self.assertGreater(stats.tablebase_hits, 0)
+
+        position = covered_positions(self.root)[0]
+        column, score = table.best_move(position)
+        self.assertEqual(score, Solver().best_move(position)[1])
+        stats = SearchStats()
+        self.assertEqual(search.iterative_deepening(position, -search.INF, search.INF, True, 10,
+                                                    stats=stats, tablebase=table), column)
+        self.assertEqual(stats.source, "tablebase")
+        table.close()
@@ -0,0 +1,64 @@
+import unittest
+from bitboard import Position
+from transposition import (TranspositionTable, EXACT, LOWER, UPPER, entry_score,
+                           entry_depth, entry_flag, entry_move, entry_generation)
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_store_and_probe(self):
+        """Stored entries keep their score, depth, bound type and move
+        """
+        table = TranspositionTable(size_mb=1)
+        self.assertIsNone(table.probe(12345))
+        table.store(12345, -37, 6, LOWER, 4)
+        entry = table.probe(12345)
+        self.assertEqual(entry_score(entry), -37)
+        self.assertEqual(entry_depth(entry), 6)
+        self.assertEqual(entry_flag(entry), LOWER)
+        self.assertEqual(entry_move(entry), 4)
+        table.store(54321, 0, 1, UPPER, None)
+        self.assertIsNone(entry_move(table.probe(54321)))
+
+    def test_size_follows_memory_budget(self):
+        """The number of slots is the largest power of two fitting the budget
+        """
+        self.assertEqual(len(TranspositionTable(size_mb=1)), 1 << 16)
+        self.assertEqual(len(TranspositionTable(size_mb=1.5)), 1 << 16)
+
+    def test_depth_preferred_replacement(self):
+        """A shallower search does not replace a deeper entry in the same slot
+        """
+        table = TranspositionTable(size_mb=1)
+        other_key = 1 + len(table)
+        table.store(1, 10, 8, EXACT, 3)
+        table.store(other_key, 20, 2, EXACT, 2)
+        self.assertIsNone(table.probe(other_key))
+        self.assertEqual(entry_score(table.probe(1)), 10)
+        table.store(other_key, 30, 9, EXACT, 2)
+        self.assertIsNone(table.probe(1))
+        self.assertEqual(entry_score(table.probe(other_key)), 30)
+
+    def test_older_generation_is_replaced_first(self):
+        """Entries of an earlier search give way to any new position in their slot
+        """
+        table = TranspositionTable(size_mb=1)
+        other_key = 1 + len(table)
+        table.store(1, 10, 8, EXACT, 3)
+        table.new_search()
+        self.assertEqual(entry_generation(table.probe(1)), 0)
+        table.store(other_key, 20, 2, EXACT, 2)
+        self.assertIsNone(table.probe(1))
+        self.assertEqual(entry_generation(table.probe(other_key)), 1)
+        table.store(1, 10, 1, EXACT, 3)
+        self.assertIsNone(table.probe(1))
+
+    def test_zobrist_hash_matches_transpositions(self):
+        """Move orders reaching the same position give the same hash
+        """
+        first = Position.from_moves([3, 2, 4, 2])
+        second = Position.from_moves([4, 2, 3, 2])
+        self.assertEqual(first.hash, second.hash)
+        self.assertEqual(first.hash, first.compute_hash())
+        self.assertNotEqual(first.hash, Position.from_moves([3, 2, 2, 4]).hash)
+        board = first.to_board(1, 2)
+        self.assertEqual(Position.from_board(board, 1).hash, first.hash)
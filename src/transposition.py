@@ -0,0 +1,155 @@
+from array import array
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+ENTRY_BYTES = 16
+MAX_DEPTH = 255
+
+MOVE_MASK = 0xF
+FLAG_SHIFT = 4
+DEPTH_SHIFT = 6
+GENERATION_SHIFT = 14
+GENERATION_MASK = 0xFF
+SCORE_SHIFT = 22
+SCORE_OFFSET = 1 << 19
+
+
+def pack_entry(score, depth, flag, move, generation=0):
+    """Packs the fields of a table entry into a single integer
+
+    Args:
+        score (int): score of the position
+        depth (int): depth the score was searched to
+        flag (int): EXACT, LOWER or UPPER depending on the type of the score
+        move (int): best column of the position or None
+        generation (int): search the entry was stored by, see TranspositionTable.new_search
+
+    Returns:
+        int: packed entry
+    """
+    return ((score + SCORE_OFFSET) << SCORE_SHIFT | generation << GENERATION_SHIFT
+            | min(depth, MAX_DEPTH) << DEPTH_SHIFT | flag << FLAG_SHIFT
+            | (0 if move is None else move + 1))
+
+
+def entry_score(entry):
+    """Returns the score stored in a packed entry"""
+    return (entry >> SCORE_SHIFT) - SCORE_OFFSET
+
+
+def entry_depth(entry):
+    """Returns the search depth stored in a packed entry"""
+    return (entry >> DEPTH_SHIFT) & MAX_DEPTH
+
+
+def entry_generation(entry):
+    """Returns the generation stored in a packed entry"""
+    return (entry >> GENERATION_SHIFT) & GENERATION_MASK
+
+
+def entry_flag(entry):
+    """Returns the bound type stored in a packed entry"""
+    return (entry >> FLAG_SHIFT) & 3
+
+
+def entry_move(entry):
+    """Returns the best move stored in a packed entry or None"""
+    move = entry & MOVE_MASK
+    return move - 1 if move else None
+
+
+def table_slots(size_mb):
+    """Counts how many slots fit into a memory budget
+
+    Args:
+        size_mb (float): memory budget of the table in megabytes
+
+    Returns:
+        int: largest power of two of slots that fits the budget
+    """
+    slots = 1
+    while slots * 2 * ENTRY_BYTES <= size_mb * (1 << 20):
+        slots *= 2
+    return slots
+
+
+class TranspositionTable:
+    """Fixed-size transposition table keyed by Zobrist hashes
+
+    Every slot takes two 64-bit words: the key xored with the packed entry
+    and the packed entry itself. Storing the key that way lets probe reject
+    slots whose words do not belong together, which also keeps the table
+    safe when processes sharing it write the same slot at the same time.
+
+    Entries are tagged with the generation of the search that stored them.
+    A table kept over many moves calls new_search before every move, and an
+    entry of an earlier generation is replaced by any new position while an
+    entry of the current generation is only overwritten by a search that is
+    at least as deep. Old entries are still found by probe until they are
+    replaced.
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        """
+        Args:
+            size_mb (float): memory budget of the table in megabytes
+            buffer (object): writable buffer of 2 * table_slots(size_mb) 64-bit
+                integers to store the table in, such as shared memory
+        """
+        slots = table_slots(size_mb)
+        self.mask = slots - 1
+        self.generation = 0
+        if buffer is None:
+            self.slots = array("q", bytes(slots * ENTRY_BYTES))
+        else:
+            self.slots = memoryview(buffer).cast("B").cast("q")
+            if len(self.slots) != 2 * slots:
+                raise ValueError("buffer does not match the size of the table")
+
+    def __len__(self):
+        return self.mask + 1
+
+    def probe(self, key):
+        """Looks up a position from the table
+
+        Args:
+            key (int): Zobrist hash of the position
+
+        Returns:
+            int: packed entry or None if the position is not stored
+        """
+        index = (key & self.mask) << 1
+        entry = self.slots[index + 1]
+        if entry and self.slots[index] ^ entry == key:
+            return entry
+        return None
+
+    def store(self, key, score, depth, flag, move):
+        """Stores a searched position into the table
+
+        Args:
+            key (int): Zobrist hash of the position
+            score (int): score of the position
+            depth (int): depth the score was searched to
+            flag (int): EXACT, LOWER or UPPER depending on the type of the score
+            move (int): best column of the position or None
+        """
+        index = (key & self.mask) << 1
+        slots = self.slots
+        old = slots[index + 1]
+        if (old and slots[index] ^ old != key and entry_depth(old) > depth
+                and entry_generation(old) == self.generation):
+            return
+        entry = pack_entry(score, depth, flag, move, self.generation)
+        slots[index] = key ^ entry
+        slots[index + 1] = entry
+
+    def new_search(self):
+        """Starts a new generation, making the stored entries the first to be replaced"""
+        self.generation = (self.generation + 1) & GENERATION_MASK
+
+    def clear(self):
+        """Removes every entry from the table"""
+        self.slots[:] = array("q", bytes(len(self.slots) * 8))
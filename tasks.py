@@ -1,8 +1,9 @@
 from invoke import task
 
 @task
-def start(ctx):
-    ctx.run("python3 src/game.py", pty=True)
+def start(ctx, engine="alphabeta", rows=6, columns=7, connect=4):
+    ctx.run(f"python3 src/game.py --engine {engine} --rows {rows} --columns {columns} "
+            f"--connect {connect}", pty=True)
 
 @task
 def test(ctx):
@@ -15,4 +16,39 @@ def coverage(ctx):
 
 @task
 def pylint(ctx):
-    ctx.run("pylint src", pty=True)
\ No newline at end of file
+    ctx.run("pylint src", pty=True)
+
+@task
+def book(ctx, plies=4, depth=10):
+    ctx.run(f"python3 src/book.py --plies {plies} --depth {depth}", pty=True)
+
+@task
+def tablebase(ctx, roots, empty_cells=8, workers=0):
+    workers_flag = f" --workers {workers}" if workers else ""
+    ctx.run(f"python3 src/tablebase.py {roots} --empty-cells {empty_cells}{workers_flag}",
+            pty=True)
+
+@task
+def bench(ctx, update_baseline=False):
+    flag = " --update-baseline" if update_baseline else ""
+    ctx.run(f"python3 src/bench.py search{flag}", pty=True)
+
+@task
+def arena(ctx, first="", second="", games=100, workers=0):
+    workers_flag = f" --workers {workers}" if workers else ""
+    ctx.run(f'python3 src/arena.py --first "{first}" --second "{second}" --games {games}'
+            f"{workers_flag}", pty=True)
+
+@task
+def analyze(ctx, input, output, depth=8, checkpoint=""):
+    checkpoint_flag = f" --checkpoint {checkpoint}" if checkpoint else ""
+    ctx.run(f"python3 src/analyze.py {input} {output} --depth {depth}{checkpoint_flag}", pty=True)
+
+@task
+def serve(ctx, port=8765, workers=0, engine="alphabeta"):
+    workers_flag = f" --workers {workers}" if workers else ""
+    ctx.run(f"python3 src/server.py --port {port}{workers_flag} --engine {engine}", pty=True)
+
+@task
+def engine(ctx, engine="alphabeta"):
+    ctx.run(f"python3 src/protocol.py --engine {engine}", pty=True)